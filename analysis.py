@@ -0,0 +1,296 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from os import environ as env
+
+
+class AnalysisQueueFull(Exception):
+    pass
+
+
+# Only this window of each upload is decoded and analysed
+ANALYSIS_OFFSET = float(env.get("ANALYSIS_OFFSET", 0))
+ANALYSIS_DURATION = float(env.get("ANALYSIS_DURATION", 22))
+# Plenty for chroma: the top CQT bin (C8, 4186 Hz) is still below Nyquist
+ANALYSIS_SAMPLE_RATE = int(env.get("ANALYSIS_SAMPLE_RATE", 11025))
+
+# (chroma backend, harmonic filter) of each quality tier, see key_finder.compute_chroma.
+# benchmarks/bench_chroma_tiers.py: balanced matches accurate (the original full HPSS)
+# on every signal at a ninth of the cost; fast is cheaper still but much less accurate
+QUALITY_TIERS = {
+    "fast": ("stft", "none"),
+    "balanced": ("cqt", "median"),
+    "accurate": ("cqt", "hpss"),
+}
+ANALYSIS_TIER = env.get("ANALYSIS_TIER", "balanced")
+
+if ANALYSIS_TIER not in QUALITY_TIERS:
+    raise ValueError("Unsupported ANALYSIS_TIER: %s" % ANALYSIS_TIER)
+
+# Bump whenever the analysis changes, so persisted results of the old one aren't reused
+ANALYSIS_VERSION = 1
+
+# Streaming detection re-scores after every chunk and stops early on a stable key
+STREAM_CHUNK_SECONDS = float(env.get("ANALYSIS_STREAM_CHUNK_SECONDS", 2))
+STREAM_MARGIN = float(env.get("ANALYSIS_STREAM_MARGIN", 0.1))
+STREAM_PATIENCE = int(env.get("ANALYSIS_STREAM_PATIENCE", 3))
+STREAM_MIN_SECONDS = float(env.get("ANALYSIS_STREAM_MIN_SECONDS", 4))
+
+
+def result_cache_key(digest: str, suffix: str, streaming: bool, tier: str):
+    """Identifies a result by the upload's content hash and every setting that can change it."""
+    params = [ANALYSIS_VERSION, suffix, *QUALITY_TIERS[tier], ANALYSIS_SAMPLE_RATE, ANALYSIS_OFFSET, ANALYSIS_DURATION]
+
+    if streaming:
+        params += ["stream", STREAM_CHUNK_SECONDS, STREAM_MARGIN, STREAM_PATIENCE, STREAM_MIN_SECONDS]
+
+    return digest + ":" + ":".join(map(str, params))
+
+
+def load_audio(data: bytes, suffix: str, sr=22050, offset=0.0, duration=None):
+    """
+    Decodes an upload from memory, or from a per-request temp file for formats soundfile
+    can't stream. Only `duration` seconds from `offset` are decoded and resampled.
+    """
+    import librosa
+
+    try:
+        return librosa.load(io.BytesIO(data), sr=sr, offset=offset, duration=duration)
+    except Exception:
+        with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+            f.write(data)
+            f.flush()
+            return librosa.load(f.name, sr=sr, offset=offset, duration=duration)
+
+
+def fragment_result(fragment):
+    return {
+        "key": fragment.get_max_key(),
+        "correlation": float(fragment.bestcorr),
+        "altkey": fragment.altkey,
+        "altcorrelation": None if fragment.altbestcorr is None else float(fragment.altbestcorr),
+    }
+
+
+def analyse_recording(data: bytes, suffix: str, tier: str = ANALYSIS_TIER):
+    """
+    Detects the key of an uploaded recording. Runs in an analysis worker process.
+    Decoding, harmonic filtering and chroma only ever see the analysed window, not the whole file.
+    """
+    from key_finder import Tonal_Fragment
+
+    backend, harmonic = QUALITY_TIERS[tier]
+    y, sr = load_audio(
+        data, suffix, sr=ANALYSIS_SAMPLE_RATE, offset=ANALYSIS_OFFSET, duration=ANALYSIS_DURATION
+    )
+
+    return fragment_result(Tonal_Fragment(y, sr, backend=backend, harmonic=harmonic))
+
+
+def streaming_fragment(sr=ANALYSIS_SAMPLE_RATE, tier=ANALYSIS_TIER):
+    from key_finder import Streaming_Tonal_Fragment
+
+    backend, harmonic = QUALITY_TIERS[tier]
+
+    return Streaming_Tonal_Fragment(
+        sr,
+        margin=STREAM_MARGIN,
+        patience=STREAM_PATIENCE,
+        min_seconds=STREAM_MIN_SECONDS,
+        max_seconds=ANALYSIS_DURATION,
+        backend=backend,
+        harmonic=harmonic,
+    )
+
+
+def iter_audio_chunks(data: bytes, suffix: str, sr, chunk_seconds, offset=0.0):
+    """
+    Yields the upload as mono chunks of `chunk_seconds` at `sr`, decoding lazily so a
+    consumer that stops early never decodes the rest of the file.
+    """
+    import librosa
+    import soundfile
+
+    try:
+        source = soundfile.SoundFile(io.BytesIO(data))
+    except Exception:
+        # Not streamable by soundfile: decode the analysed window in one go instead
+        y, sr = load_audio(data, suffix, sr=sr, offset=offset, duration=ANALYSIS_DURATION)
+        step = int(chunk_seconds * sr)
+        for start in range(0, len(y), step):
+            yield y[start:start + step]
+        return
+
+    with source:
+        source.seek(min(int(offset * source.samplerate), source.frames))
+        for block in source.blocks(blocksize=int(chunk_seconds * source.samplerate), dtype="float32"):
+            if block.ndim > 1:
+                block = block.mean(axis=1)
+            if source.samplerate != sr:
+                block = librosa.resample(block, orig_sr=source.samplerate, target_sr=sr)
+            yield block
+
+
+def analyse_recording_streaming(data: bytes, suffix: str, tier: str = ANALYSIS_TIER):
+    """
+    Detects the key chunk by chunk and stops as soon as it is stable, so clear recordings
+    are done after a few seconds of audio. Runs in an analysis worker process.
+    """
+    fragment = streaming_fragment(tier=tier)
+
+    for chunk in iter_audio_chunks(
+        data, suffix, ANALYSIS_SAMPLE_RATE, STREAM_CHUNK_SECONDS, offset=ANALYSIS_OFFSET
+    ):
+        if fragment.feed(chunk):
+            break
+
+    return fragment.result()
+
+
+def chunk_chroma(samples, sr, tier):
+    """Worker-side half of StreamingAnalysis: resamples one chunk and sums its chroma."""
+    import librosa
+    from key_finder import chunk_chroma
+
+    if sr != ANALYSIS_SAMPLE_RATE:
+        samples = librosa.resample(samples, orig_sr=sr, target_sr=ANALYSIS_SAMPLE_RATE)
+
+    return chunk_chroma(samples, ANALYSIS_SAMPLE_RATE, *QUALITY_TIERS[tier])
+
+
+class StreamingAnalysis(object):
+    """
+    Key detection over audio that arrives piece by piece, e.g. from a WebSocket. Chroma
+    is computed on the engine's process pool; the running sums and scores stay here.
+    """
+
+    def __init__(self, engine, sr, tier=ANALYSIS_TIER):
+        self.engine = engine
+        self.sr = sr
+        self.tier = tier
+        self.fragment = streaming_fragment(tier=tier)
+        self._buffer = []
+        self._buffered = 0
+
+    async def feed(self, samples):
+        """Buffers samples and scores every whole chunk. Returns True once detection is done."""
+        self._buffer.append(samples)
+        self._buffered += len(samples)
+
+        chunk_length = int(STREAM_CHUNK_SECONDS * self.sr)
+        while self._buffered >= chunk_length and not self.fragment.done:
+            await self._score(chunk_length)
+
+        return self.fragment.done
+
+    async def finish(self):
+        """Scores whatever is left in the buffer and returns the result."""
+        if self._buffered and not self.fragment.done:
+            await self._score(self._buffered)
+        return self.fragment.result()
+
+    async def _score(self, length):
+        import numpy as np
+
+        samples = np.concatenate(self._buffer)
+        chunk, rest = samples[:length], samples[length:]
+        self._buffer = [rest]
+        self._buffered = len(rest)
+
+        chroma = await self.engine.submit(chunk_chroma, chunk, self.sr, self.tier)
+        self.fragment.add_chroma(chroma, len(chunk) / self.sr)
+
+
+class AnalysisEngine(object):
+    """
+    Runs CPU-heavy audio analysis on a process pool so it never blocks the event loop.
+    At most max_pending jobs are accepted (running or queued); beyond that submit()
+    raises AnalysisQueueFull so callers can push back instead of piling up work.
+
+    Jobs wait here for a free worker rather than in the pool's own queue, where they
+    can no longer be cancelled. A job counts as pending until the pool is done with it,
+    not until its caller stops waiting: cancelling the caller drops a queued job, but
+    one already running in a worker process runs to the end.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = None
+        self._idle_workers = asyncio.Semaphore(workers)
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn, as forking a process with live event loop and pool threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _release(self):
+        self._idle_workers.release()
+        self.pending -= 1
+
+    def _release_from(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # The loop closed while the job was still running; nothing is waiting on it
+            pass
+
+    async def submit(self, fn, *args, salvage=None):
+        """
+        Runs fn(*args) on the pool and returns its result. If the caller is cancelled
+        after the job started, the job can't be stopped; its result, if it succeeds,
+        is then passed to salvage(result) instead of being lost.
+        """
+        if self.pending >= self.max_pending:
+            raise AnalysisQueueFull()
+
+        loop = asyncio.get_running_loop()
+
+        self.pending += 1
+        try:
+            await self._idle_workers.acquire()
+        except BaseException:
+            self.pending -= 1
+            raise
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+
+        # The pool calls back from its own thread once the job is done or cancelled
+        future.add_done_callback(lambda _: self._release_from(loop))
+
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.cancel() and salvage is not None:
+                asyncio.wrap_future(future).add_done_callback(lambda done: _salvage(done, salvage))
+            raise
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _salvage(done, salvage):
+    if not done.cancelled() and done.exception() is None:
+        salvage(done.result())
+
+
+def create_engine():
+    workers = int(env.get("ANALYSIS_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+    return AnalysisEngine(
+        workers=workers,
+        max_pending=int(env.get("ANALYSIS_MAX_PENDING", workers * 4)),
+    )
@@ -0,0 +1,82 @@
+"""
+Building the chord diagram lists from the startup catalog against the old per-chord
+split_chord and quadratic dedup, on the chords of the tab in song.json and on that
+tab repeated into a long one.
+
+    python benchmarks/bench_chord_diagrams.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from diagrams import get_chord_diagrams  # noqa: E402
+from song import Song  # noqa: E402
+from tokenizer import compile_tab  # noqa: E402
+
+
+def split_chord(chord):
+    """The previous main.split_chord, verbatim apart from comments."""
+    BASE_CHORDS = sorted(
+        ["C", "Csharp", "Db", "D", "Dsharp", "Eb", "E", "F", "Fsharp", "G", "Gb", "Gsharp", "Ab", "A", "Asharp", "B", "Bb"],
+        key=len,
+        reverse=True
+    )
+    chord = chord.split('/')[0]
+    chord = chord.replace('#', 'sharp')
+    base_chord = None
+    chord_type = 'major'
+    for base in BASE_CHORDS:
+        if chord.startswith(base):
+            base_chord = base
+            chord_type = chord[len(base):]
+            break
+    if chord_type in ['m', 'min']:
+        chord_type = 'minor'
+    elif chord_type in ['', 'maj', 'M']:
+        chord_type = 'major'
+    base_chord = base_chord.replace("Csharp", "D").replace("Dsharp", "Eb").replace("Fsharp", "G").replace("Gsharp", "Ab").replace("Asharp", "Bb").replace("Db", "Csharp").replace("Gb", "Fsharp")
+    return base_chord, chord_type
+
+
+def get_chord_diagrams_quadratic(chords):
+    """The previous main.get_chord_diagrams."""
+    song_images = []
+    for chord in chords:
+        chord_name, chord_type = split_chord(chord)
+        chord_url = f"https://tombatossals.github.io/react-chords/media/guitar/chords/{chord_name}/{chord_type}/1.svg"
+        song_images.append({"name": chord, "url": chord_url})
+
+    song_images = [i for n, i in enumerate(song_images) if i not in song_images[n + 1:]]
+
+    ukulele_images = [
+        {"name": chord["name"], "url": chord["url"].replace("guitar", "ukulele", 1)}
+        for chord in song_images
+    ]
+    return song_images, ukulele_images
+
+
+def bench(name, chords, number):
+    old = min(timeit.repeat(lambda: get_chord_diagrams_quadratic(chords), number=number, repeat=5)) / number
+    new = min(timeit.repeat(lambda: get_chord_diagrams(chords), number=number, repeat=5)) / number
+
+    print(f"{name:<28} {len(chords):>7} {old * 1e6:12.1f} {new * 1e6:12.1f} {old / new:8.1f}x")
+
+
+def main():
+    with open(ROOT / "song.json") as f:
+        song = Song.from_json(f.read())
+
+    # song.json has no section headers, so take every chord in the tab
+    chords = [token.value for token in compile_tab(song.content).chords()]
+
+    print(f"{'tab':<28} {'chords':>7} {'old us':>12} {'catalog us':>12} {'speedup':>9}")
+    bench("song.json", chords, 200)
+    bench("song.json x 20", chords * 20, 10)
+    bench("song.json x 100", chords * 100, 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Accuracy against latency of every chroma backend and harmonic filter, on synthetic
+tonal signals in all 24 keys: a plain progression, the same with drums and noise,
+and a detuned one.
+
+    python benchmarks/bench_chroma_tiers.py
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from analysis import ANALYSIS_DURATION, ANALYSIS_SAMPLE_RATE, QUALITY_TIERS  # noqa: E402
+from key_finder import chroma_backends, compute_chroma, harmonic_filters, key_correlations, keys  # noqa: E402
+
+SAMPLE_RATE = ANALYSIS_SAMPLE_RATE
+SECONDS = ANALYSIS_DURATION
+BEAT = 0.5
+MAJOR_SCALE = [0, 2, 4, 5, 7, 9, 11]
+MINOR_SCALE = [0, 2, 3, 5, 7, 8, 10]
+
+
+def instrument(midi, seconds, cents=0.0):
+    """A decaying tone with six harmonics, so chroma sees overtones like it would on a guitar."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    frequency = 440 * 2 ** ((midi - 69 + cents / 100) / 12)
+    partials = sum(np.sin(2 * np.pi * frequency * k * t) / k for k in range(1, 7) if frequency * k < SAMPLE_RATE / 2)
+    return partials * np.exp(-t * 1.5)
+
+
+def drums(length, rng):
+    """Kick on every beat, snare on the off-beats and hi-hats on eighths."""
+    y = np.zeros(length)
+    beat = int(BEAT * SAMPLE_RATE)
+    t = np.arange(beat // 2) / SAMPLE_RATE
+    kick = np.sin(2 * np.pi * (150 - 100 * t / t[-1]) * t) * np.exp(-t * 20)
+    snare = rng.normal(0, 1, len(t)) * np.exp(-t * 25)
+    hat = np.diff(rng.normal(0, 1, len(t) // 4 + 1)) * np.exp(-t[: len(t) // 4] * 80)
+
+    for start in range(0, length - beat, beat):
+        y[start:start + len(kick)] += kick
+        y[start + beat // 2:start + beat // 2 + len(snare)] += snare * 0.4
+        y[start + beat // 4:start + beat // 4 + len(hat)] += hat * 0.2
+    return y
+
+
+def progression(tonic, minor, style, seed):
+    rng = np.random.default_rng(seed)
+    scale = MINOR_SCALE if minor else MAJOR_SCALE
+    # (degree, third) of each chord; the minor V is major, as in the harmonic minor
+    chords = [(0, 3), (5, 3), (7, 4), (0, 3)] if minor else [(0, 4), (5, 4), (7, 4), (0, 4)]
+    cents = 30.0 if style == "detuned" else 0.0
+
+    bars = []
+    for i in range(int(SECONDS / (4 * BEAT)) + 1):
+        degree, third = chords[i % 4]
+        root = 48 + tonic + degree
+        bar = sum(instrument(m, 4 * BEAT, cents) for m in (root, root + third, root + 7)) * 0.15
+        for beat in range(4):
+            start = int(beat * BEAT * SAMPLE_RATE)
+            note = instrument(72 + tonic + scale[rng.integers(7)], BEAT, cents) * 0.25
+            bar[start:start + len(note)] += note
+        bars.append(bar)
+
+    y = np.concatenate(bars)[: int(SECONDS * SAMPLE_RATE)]
+    if style == "band":
+        y = y + drums(len(y), rng) * 0.5 + rng.normal(0, 0.1, len(y))
+    return y.astype(np.float32)
+
+
+def main():
+    signals = [
+        (keys[tonic + 12 * minor], progression(tonic, minor, style, seed=tonic + 12 * minor))
+        for style in ("plain", "band", "detuned")
+        for minor in (False, True)
+        for tonic in range(12)
+    ]
+
+    # Warm up numba and the FFT plans
+    for backend in chroma_backends:
+        for harmonic in harmonic_filters:
+            compute_chroma(signals[0][1][:SAMPLE_RATE], SAMPLE_RATE, backend, harmonic)
+
+    tiers = {settings: tier for tier, settings in QUALITY_TIERS.items()}
+    print(f"{len(signals)} signals of {SECONDS:g} s at {SAMPLE_RATE} Hz")
+    print(f"{'backend':>8} {'harmonic':>9} {'accuracy':>9} {'ms/signal':>10}  tier")
+
+    for backend in chroma_backends:
+        for harmonic in harmonic_filters:
+            correct = 0
+            started = time.perf_counter()
+            for key, y in signals:
+                correlations = key_correlations(compute_chroma(y, SAMPLE_RATE, backend, harmonic).sum(axis=1))
+                correct += keys[int(correlations.argmax())] == key
+            elapsed = (time.perf_counter() - started) / len(signals)
+
+            print(
+                f"{backend:>8} {harmonic:>9} {correct / len(signals):9.1%} {elapsed * 1000:10.0f}"
+                f"  {tiers.get((backend, harmonic), '')}"
+            )
+
+
+if __name__ == "__main__":
+    main()
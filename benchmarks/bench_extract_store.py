@@ -0,0 +1,41 @@
+"""
+Compares the targeted js-store extractor with the BeautifulSoup path.
+
+    python benchmarks/bench_extract_store.py
+"""
+import json
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from helpers import extract_store_fast, extract_store_soup  # noqa: E402
+from scripts.stub_server import build_tab_page  # noqa: E402
+
+
+def bench(name, page, number):
+    fast = extract_store_fast(page)
+    soup = extract_store_soup(page)
+    assert fast == soup, f"{name}: extractors disagree"
+    assert json.loads(fast)
+
+    print(f"{name} ({len(page) / 1024:.0f} KB page, {len(fast) / 1024:.0f} KB store)")
+
+    results = {}
+    for label, extractor in [("soup", extract_store_soup), ("fast", extract_store_fast)]:
+        seconds = min(timeit.repeat(lambda: extractor(page), number=number, repeat=3)) / number
+        results[label] = seconds
+        print(f"  {label:5} {seconds * 1000:9.3f} ms")
+
+    print(f"  speedup {results['soup'] / results['fast']:.1f}x")
+
+
+def main():
+    bench("test.html", (ROOT / "test.html").read_text(), number=20)
+    bench("song.json page", build_tab_page(json.loads((ROOT / "song.json").read_text())), number=5)
+
+
+if __name__ == "__main__":
+    main()
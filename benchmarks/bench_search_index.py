@@ -0,0 +1,82 @@
+"""
+Lookup latency of the local search index, filled with synthetic tabs named from a
+small vocabulary plus the real ones in test.html and song.json: exact names, word
+prefixes, misspellings, tab ids and misses (which go upstream in the API).
+
+    python benchmarks/bench_search_index.py [--tabs 100000]
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fetcher import UG_TABS_PREFIX  # noqa: E402
+from helpers import search_page_links  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+from song import Song  # noqa: E402
+
+WORDS = (
+    "love night heart fire rain blue summer river dream light road home moon girl time "
+    "wild gold city ocean angel dance shadow stone sweet broken morning highway wonder "
+    "paper silver thunder garden winter hollow feather lonely golden yellow ghost"
+).split()
+TYPES = ("chords", "tabs", "ukulele", "bass", "guitar-pro")
+
+QUERIES = [
+    ("exact", "watermelon sugar"),
+    ("artist + title", "harry styles watermelon"),
+    ("prefix", "waterm"),
+    ("prefix, two words", "john may neo"),
+    ("misspelt", "watermelom sugr"),
+    ("misspelt artist", "hary stiles watermellon"),
+    ("tab id", "2895911"),
+    ("miss", "qzxv plorkt"),
+]
+
+
+def synthetic_links(count, rng):
+    for tab_id in range(10_000_000, 10_000_000 + count):
+        artist = "-".join(rng.sample(WORDS, 2))
+        title = "-".join(rng.sample(WORDS, rng.randint(1, 3)))
+        yield f"{UG_TABS_PREFIX}{artist}/{title}-{rng.choice(TYPES)}-{tab_id}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tabs", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(str(Path(tmp) / "search_index.db"))
+
+        started = time.perf_counter()
+        index.add_links(list(synthetic_links(args.tabs, random.Random(0))))
+        index.add_links(search_page_links((ROOT / "test.html").read_text()))
+        with open(ROOT / "song.json") as f:
+            index.add_song(Song.from_json(f.read()))
+        print(f"indexed {index.count()} tabs in {time.perf_counter() - started:.1f}s\n")
+
+        print(f"{'query':<20} {'term':<26} {'results':>7} {'median ms':>10} {'p99 ms':>8}")
+        for name, term in QUERIES:
+            times = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                results = index.lookup(term)
+                times.append((time.perf_counter() - started) * 1e3)
+
+            times.sort()
+            p99 = times[int(len(times) * 0.99) - 1]
+            print(f"{name:<20} {term!r:<26} {len(results):>7} {statistics.median(times):10.2f} {p99:8.2f}")
+
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
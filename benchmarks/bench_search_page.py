@@ -0,0 +1,38 @@
+"""
+Parsing the search page in test.html: the previous regex over the whole page
+(links only), against the structured results search_page_results decodes from
+the page's js-store.
+
+    python benchmarks/bench_search_page.py
+"""
+import re
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from helpers import search_page_results  # noqa: E402
+
+
+def links_regex(page):
+    """The previous helpers._search, after the fetch."""
+    links = re.findall(r"https://tabs.ultimate-guitar.com/tab/.*?;", page)
+    return [i.replace("&quot;", "") for i in links]
+
+
+def main():
+    page = (ROOT / "test.html").read_text()
+
+    print(f"{'parser':<34} {'results':>7} {'us':>10}")
+    for name, parse in (
+        ("regex over the page (links only)", links_regex),
+        ("search_page_results", search_page_results),
+    ):
+        seconds = min(timeit.repeat(lambda: parse(page), number=200, repeat=5)) / 200
+        print(f"{name:<34} {len(parse(page)):>7} {seconds * 1e6:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Startup time and resident memory of the processes the service runs, each measured
+in a fresh interpreter: the chord/search API, the API with the audio stack imported
+eagerly as it used to be, and analysis workers idle and after their first job.
+
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Each snippet runs in its own interpreter; the harness times it and reads peak RSS
+HARNESS = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+FIRST_JOB = """
+import io
+import numpy as np
+import soundfile as sf
+import analysis
+t = np.arange(5 * 22050) / 22050
+buffer = io.BytesIO()
+sf.write(buffer, np.sin(2 * np.pi * 440 * t), 22050, format="WAV")
+analysis.analyse_recording(buffer.getvalue(), ".wav")
+"""
+
+# What a spawned pool worker imports when the server was started as `python main.py`
+SPAWNED_FROM_SCRIPT = """
+import runpy
+runpy.run_path("main.py", run_name="__mp_main__")
+import analysis
+"""
+
+# The old main.py and key_finder imported all of this at the top
+EAGER_AUDIO_STACK = """
+import librosa, librosa.display, librosa.feature, librosa.effects
+import matplotlib.pyplot
+import main
+"""
+
+SCENARIOS = [
+    ("chord/search API (import main)", "import main"),
+    ("API with eager audio stack", EAGER_AUDIO_STACK),
+    ("analysis worker, idle", "import analysis"),
+    ("worker spawned from python main.py", SPAWNED_FROM_SCRIPT),
+    ("analysis worker, first job", FIRST_JOB),
+]
+
+
+def measure(code):
+    env = dict(os.environ, DATABASE_BACKEND="sqlite", SQLITE_PATH="file::memory:?cache=shared")
+    script = HARNESS.format(root=str(ROOT), code=code)
+
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    total = time.perf_counter() - started
+
+    result = json.loads(output.strip().splitlines()[-1])
+    result["total_seconds"] = total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'process':<34} {'import s':>9} {'process s':>10} {'RSS MB':>8}   (median of {args.runs})")
+    for name, code in SCENARIOS:
+        runs = [measure(code) for _ in range(args.runs)]
+        print(
+            f"{name:<34} {statistics.median(r['seconds'] for r in runs):9.2f}"
+            f" {statistics.median(r['total_seconds'] for r in runs):10.2f}"
+            f" {statistics.median(r['max_rss_kb'] for r in runs) / 1024:8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+One-shot key detection over the full analysis window against streaming detection with
+early termination, on synthetic chord progressions in known keys.
+
+    python benchmarks/bench_streaming_key.py
+"""
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from analysis import analyse_recording, analyse_recording_streaming  # noqa: E402
+
+SAMPLE_RATE = 22050
+MAJOR_SCALE = [0, 2, 4, 5, 7, 9, 11]
+MINOR_SCALE = [0, 2, 3, 5, 7, 8, 10]
+
+
+def tone(midi, seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return np.sin(2 * np.pi * 440 * 2 ** ((midi - 69) / 12) * t)
+
+
+def progression(tonic, minor, seconds, seed=0):
+    """I-IV-V-I (i-iv-V-i in minor) with a random melody from the scale, as a WAV."""
+    rng = np.random.default_rng(seed)
+    scale = MINOR_SCALE if minor else MAJOR_SCALE
+    # (degree, third) of each chord; the minor V is major, as in the harmonic minor
+    chords = [(0, 3), (5, 3), (7, 4), (0, 3)] if minor else [(0, 4), (5, 4), (7, 4), (0, 4)]
+
+    notes = []
+    for i in range(int(seconds * 2)):
+        degree, third = chords[(i // 4) % 4]
+        root = 48 + tonic + degree
+        chord = sum(tone(m, 0.5) for m in (root, root + third, root + 7)) * 0.2
+        notes.append(chord + tone(72 + tonic + scale[rng.integers(7)], 0.5) * 0.3)
+
+    y = np.concatenate(notes)
+    y = (y + rng.normal(0, 0.05, len(y))).astype(np.float32)
+
+    buffer = io.BytesIO()
+    sf.write(buffer, y, SAMPLE_RATE, format="WAV")
+    return buffer.getvalue()
+
+
+def main():
+    # Warm up numba so the first measurement isn't a JIT compile
+    warmup = progression(0, False, 5)
+    analyse_recording(warmup, ".wav")
+    analyse_recording_streaming(warmup, ".wav")
+
+    print(f"{'key':>4} {'one-shot':>14} {'streaming':>14} {'audio used':>11} {'confidence':>11}")
+    for name, tonic, minor in [("C", 0, False), ("A", 9, False), ("Bb", 10, False), ("Em", 4, True), ("F#m", 6, True)]:
+        data = progression(tonic, minor, 60)
+
+        started = time.perf_counter()
+        full = analyse_recording(data, ".wav")
+        full_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        streamed = analyse_recording_streaming(data, ".wav")
+        streamed_elapsed = time.perf_counter() - started
+
+        print(
+            f"{name:>4} {full['key']:>4} {full_elapsed:7.2f} s {streamed['key']:>4} {streamed_elapsed:7.2f} s"
+            f" {streamed['seconds']:9.1f} s {streamed['confidence']:11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Throughput of the offset-based transposition rewriter against the old str.replace loop,
+on the tab in song.json and on a synthetic 10k-chord tab. The tab is tokenized once up
+front, as get_chords has already compiled it for extract_chords by the time it transposes.
+
+    python benchmarks/bench_transpose_rewrite.py
+"""
+import json
+import random
+import re
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from helpers import replace_chords_with_transposed  # noqa: E402
+from tokenizer import compile_tab  # noqa: E402
+
+NOTES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+FLATS = {"Db": "C#", "Eb": "D#", "Gb": "F#", "Ab": "G#", "Bb": "A#"}
+ROOT_REGEX = re.compile(r"^[A-G][#b]?")
+
+
+def shift(chord, steps=2):
+    match = ROOT_REGEX.match(chord)
+    if match is None:
+        return chord
+    root = FLATS.get(match.group(), match.group())
+    return NOTES[(NOTES.index(root) + steps) % 12] + chord[match.end():]
+
+
+def replace_loop(text, original_progressions, transposed_progressions):
+    """The previous implementation: three full-text str.replace calls per chord."""
+    for section, chords in original_progressions.items():
+        for idx, chord in enumerate(chords):
+            transposed_chord = transposed_progressions[section][idx]
+            text = text.replace(f"[ch]{chord}[/ch]", f"[ch]{transposed_chord}[/ch]")
+            text = text.replace(f"\n{chord}", f"\n{transposed_chord}")
+            text = text.replace(f" {chord}", f" {transposed_chord}")
+    return text
+
+
+def synthetic_tab(chord_count, chords_per_line=4):
+    random.seed(7)
+    names = [note + quality for note in NOTES for quality in ("", "m", "7", "maj7", "sus2")]
+    lines = []
+    for i in range(chord_count // chords_per_line):
+        if i % 8 == 0:
+            lines.append(f"[Verse {i // 8 + 1}]")
+        chords = "   ".join(f"[ch]{random.choice(names)}[/ch]" for _ in range(chords_per_line))
+        lines.append(f"[tab]{chords}\nla la la la la la la la[/tab]")
+    return "\n".join(lines)
+
+
+def bench(name, text, number):
+    tab = compile_tab(text)
+    # song.json has no section headers, so treat all its chords as one section
+    chords = [token.value for token in tab.chords()]
+    original = {"all": chords}
+    transposed = {"all": [shift(chord) for chord in chords]}
+
+    print(f"{name}: {len(text) / 1024:.0f} KB, {len(chords)} chords")
+    results = {}
+    for label, rewrite in [("str.replace", replace_loop), ("offsets", replace_chords_with_transposed)]:
+        seconds = min(timeit.repeat(lambda: rewrite(text, original, transposed), number=number, repeat=3)) / number
+        results[label] = seconds
+        print(f"  {label:12} {seconds * 1000:9.3f} ms  {len(chords) / seconds:12,.0f} chords/s")
+
+    print(f"  speedup {results['str.replace'] / results['offsets']:.1f}x")
+
+
+def main():
+    store = json.loads((ROOT / "song.json").read_text())
+    bench("song.json", store["store"]["page"]["data"]["tab_view"]["wiki_tab"]["content"], number=50)
+    bench("synthetic", synthetic_tab(10000), number=3)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Wall time and peak memory of windowed key detection against the original
+decode-everything path, for 30 s, 3 min and 10 min synthetic recordings.
+
+    python benchmarks/bench_windowed_analysis.py
+"""
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from analysis import analyse_recording, fragment_result, load_audio  # noqa: E402
+from key_finder import Tonal_Fragment  # noqa: E402
+
+SAMPLE_RATE = 44100
+
+
+def analyse_recording_full(data, suffix):
+    """The original path: decode the whole file at 22050 Hz, HPSS all of it, then keep the first 22 s."""
+    import librosa
+
+    y, sr = load_audio(data, suffix)
+    y_harmonic, y_percussive = librosa.effects.hpss(y)
+
+    return fragment_result(Tonal_Fragment(y_harmonic, sr, tend=22))
+
+
+def synthetic_recording(seconds, seed=0):
+    """An A major triad with a little noise, as a 44.1 kHz WAV."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    y = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.18, 329.63)) * 0.2
+    y = (y + rng.normal(0, 0.05, len(t))).astype(np.float32)
+
+    buffer = io.BytesIO()
+    sf.write(buffer, y, SAMPLE_RATE, format="WAV")
+    return buffer.getvalue()
+
+
+def measure(analyse, data):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = analyse(data, ".wav")
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    # Warm up numba and the resampler so the first measurement isn't a JIT compile
+    warmup = synthetic_recording(5)
+    analyse_recording(warmup, ".wav")
+    analyse_recording_full(warmup, ".wav")
+
+    print(f"{'input':>8} {'path':>9} {'key':>4} {'wall s':>8} {'peak MB':>9}")
+    for seconds, label in [(30, "30 s"), (180, "3 min"), (600, "10 min")]:
+        data = synthetic_recording(seconds)
+        rows = {}
+        for name, analyse in [("full", analyse_recording_full), ("windowed", analyse_recording)]:
+            result, elapsed, peak = measure(analyse, data)
+            rows[name] = (elapsed, peak)
+            print(f"{label:>8} {name:>9} {result['key']:>4} {elapsed:8.2f} {peak / 2**20:9.1f}")
+
+        print(
+            f"{'':>8} {'gain':>9} {'':>4} {rows['full'][0] / rows['windowed'][0]:7.1f}x"
+            f" {rows['full'][1] / rows['windowed'][1]:8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
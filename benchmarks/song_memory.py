@@ -0,0 +1,57 @@
+"""
+Reports the memory kept alive per cached song, full store dict vs Song record,
+using song.json as the reference document.
+
+    python benchmarks/song_memory.py
+"""
+import gc
+import json
+import pickle
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from song import Song  # noqa: E402
+
+
+def retained(build, raw, copies=20):
+    """Bytes still allocated per object once `copies` results of build(raw) are held."""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+
+    held = [build(raw) for _ in range(copies)]
+
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(held) == copies
+    return (after - before) / copies
+
+
+def main():
+    raw = json.dumps(json.loads((ROOT / "song.json").read_text()), separators=(",", ":"))
+    print(f"song.json store: {len(raw) / 1024:.1f} KB of JSON")
+
+    rows = []
+    for label, build in [("json.loads dict", json.loads), ("Song record", Song.from_json)]:
+        kept = retained(build, raw)
+        seconds = min(timeit.repeat(lambda: build(raw), number=20, repeat=3)) / 20
+        pickled = len(pickle.dumps(build(raw), protocol=pickle.HIGHEST_PROTOCOL))
+        rows.append((label, kept))
+        print(
+            f"  {label:16} retained {kept / 1024:8.1f} KB  "
+            f"pickled {pickled / 1024:7.1f} KB  decode {seconds * 1000:6.2f} ms"
+        )
+
+    saved = rows[0][1] - rows[1][1]
+    print(f"  saved per cached song: {saved / 1024:.1f} KB ({rows[0][1] / rows[1][1]:.0f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def pickled_size(value):
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class TieredCache(object):
+    """
+    LRU cache bounded by the total size of its values, with an optional on-disk tier.
+
+    Entries are fresh for `ttl` seconds and may then be served stale for another
+    `stale_ttl` seconds while get_or_fetch refreshes them in the background.
+
+    The disk tier is read and written on its own threads, never on the event loop:
+    get() only looks at memory, lookup() and get_or_fetch() also await the disk, and
+    set() writes to disk in the background.
+    """
+
+    def __init__(self, max_bytes, ttl, stale_ttl=0, disk_path=None, sizeof=pickled_size):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.disk_path = disk_path
+        self.sizeof = sizeof
+
+        # key -> (value, size, stored_at)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._refreshing = {}
+        self._disk_executor = None
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_path:
+            os.makedirs(self.disk_path, exist_ok=True)
+            self._disk_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-disk")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """Whether the memory tier holds a fresh or stale value for key."""
+        return self.get(key, count=False)[1] is not None
+
+    def _state(self, stored_at):
+        age = time.time() - stored_at
+        if age < self.ttl:
+            return "fresh"
+        if age < self.ttl + self.stale_ttl:
+            return "stale"
+        return None
+
+    def _disk_file(self, key):
+        return os.path.join(self.disk_path, hashlib.sha1(str(key).encode()).hexdigest() + ".pickle")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_file(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _write_disk(self, key, value, stored_at):
+        path = self._disk_file(key)
+        # Writes run on several threads, so each gets its own temporary file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        with open(tmp_path, "wb") as f:
+            pickle.dump((value, stored_at), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp_path, path)
+
+    def _store(self, key, value, stored_at):
+        size = self.sizeof(value)
+
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+
+        # Values larger than the whole memory tier only live on disk
+        if size > self.max_bytes:
+            return
+
+        self._entries[key] = (value, size, stored_at)
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _get_memory(self, key):
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None, None
+
+        value, _, stored_at = entry
+        state = self._state(stored_at)
+
+        if state is None:
+            self._bytes -= self._entries.pop(key)[1]
+            return None, None
+
+        self._entries.move_to_end(key)
+        return value, state
+
+    def _count(self, state, disk=False):
+        if state is None:
+            self.misses += 1
+            return
+
+        self.hits += 1
+        if disk:
+            self.disk_hits += 1
+        if state == "stale":
+            self.stale_hits += 1
+
+    def get(self, key, count=True):
+        """Returns (value, state) from the memory tier; state is "fresh", "stale" or None on a miss."""
+        value, state = self._get_memory(key)
+
+        if count:
+            self._count(state)
+
+        return value, state
+
+    async def lookup(self, key):
+        """Like get(), but falls back to the disk tier, read off the event loop."""
+        value, state = self._get_memory(key)
+
+        if state is None and self.disk_path:
+            loop = asyncio.get_running_loop()
+            stored = await loop.run_in_executor(self._disk_executor, self._read_disk, key)
+
+            if stored is not None:
+                stored_value, stored_at = stored
+                state = self._state(stored_at)
+
+                if state is not None:
+                    value = stored_value
+                    self._store(key, value, stored_at)
+                    self._count(state, disk=True)
+                    return value, state
+
+        self._count(state)
+        return value, state
+
+    def _in_background(self, work, *args):
+        """Runs disk work on the disk threads, or inline when there is no event loop to spare."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            work(*args)
+            return
+
+        self._disk_executor.submit(work, *args)
+
+    def set(self, key, value):
+        stored_at = time.time()
+        self._store(key, value, stored_at)
+
+        if self.disk_path:
+            self._in_background(self._write_disk, key, value, stored_at)
+
+    def _remove_disk(self, key):
+        try:
+            os.remove(self._disk_file(key))
+        except OSError:
+            pass
+
+    def delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+        if self.disk_path:
+            self._in_background(self._remove_disk, key)
+
+    async def _refresh(self, key, fetch):
+        try:
+            value = await fetch()
+            if value is not None:
+                self.set(key, value)
+        except Exception:
+            # Keep serving the stale copy; the next stale hit retries the refresh
+            pass
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_fetch(self, key, fetch):
+        """
+        Returns the cached value for key, awaiting fetch() on a miss.
+        Stale values are returned immediately and refreshed in the background.
+        None results are not cached.
+        """
+        value, state = await self.lookup(key)
+
+        if state == "stale" and key not in self._refreshing:
+            self._refreshing[key] = asyncio.ensure_future(self._refresh(key, fetch))
+
+        if state is not None:
+            return value
+
+        value = await fetch()
+
+        if value is not None:
+            self.set(key, value)
+
+        return value
+
+    async def cancel_refreshes(self):
+        """Cancels the background refreshes of stale entries and waits for them to stop."""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # A refresh cancelled before it started never removes itself
+        self._refreshing.clear()
+
+    def close(self):
+        """Waits for pending disk writes."""
+        if self._disk_executor is not None:
+            self._disk_executor.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,176 @@
+import numpy as np
+
+from transpose import Chord, get_accidental, get_all_keys, key_regex, pitch_classes, transpose_chord
+
+# Shape families the difficulty tables distinguish; other chords count as the nearest one
+SHAPE_CLASSES = ("", "m", "7", "m7", "maj7", "sus", "dim", "aug")
+_class_index = {shape: i for i, shape in enumerate(SHAPE_CLASSES)}
+
+# How hard each open-position shape is to play, from 1 (beginner open chord) up.
+# Shapes not listed cost the family's default, usually a barre chord.
+# family: (default, {root: difficulty})
+GUITAR_SHAPES = {
+    "": (4, {"C": 1, "A": 1, "G": 1, "E": 1, "D": 1, "F": 3, "B": 4}),
+    "m": (4, {"Am": 1, "Em": 1, "Dm": 1, "Bm": 3, "F#m": 3}),
+    "7": (4, {"A7": 1, "D7": 1, "E7": 1, "G7": 1, "C7": 2, "B7": 2}),
+    "m7": (4, {"Am7": 1, "Em7": 1, "Dm7": 1, "Bm7": 2}),
+    "maj7": (4, {"Cmaj7": 1, "Fmaj7": 2, "Amaj7": 2, "Dmaj7": 2, "Emaj7": 2, "Gmaj7": 2}),
+    "sus": (4, {"Asus": 1, "Dsus": 1, "Esus": 1, "Csus": 2, "Gsus": 2}),
+    "dim": (4, {}),
+    "aug": (4, {}),
+}
+
+UKULELE_SHAPES = {
+    "": (4, {"C": 1, "F": 1, "A": 1, "G": 2, "D": 2, "Bb": 3}),
+    "m": (4, {"Am": 1, "Dm": 2, "Gm": 2, "Em": 3, "Bm": 3, "Cm": 3}),
+    "7": (4, {"A7": 1, "C7": 1, "G7": 2, "D7": 2, "E7": 2, "B7": 3, "F7": 3}),
+    "m7": (4, {"Am7": 1, "Em7": 1, "Dm7": 2, "Gm7": 2, "Bm7": 2}),
+    "maj7": (4, {"Cmaj7": 1, "Fmaj7": 2, "Gmaj7": 2, "Amaj7": 2, "Dmaj7": 2}),
+    "sus": (4, {"Asus": 1, "Csus": 1, "Gsus": 2, "Dsus": 2}),
+    # the movable four-finger dim and aug shapes are the same everywhere on the neck
+    "dim": (3, {}),
+    "aug": (3, {}),
+}
+
+
+def difficulty_table(shapes):
+    """(len(SHAPE_CLASSES), 12) array: difficulty of each shape family on each root, C = 0."""
+    table = np.empty((len(SHAPE_CLASSES), 12))
+
+    for shape, (default, difficulties) in shapes.items():
+        row = table[_class_index[shape]]
+        row[:] = default
+        for name, difficulty in difficulties.items():
+            row[pitch_classes[key_regex.match(name).group()]] = difficulty
+
+    return table
+
+
+difficulty_tables = {
+    "guitar": difficulty_table(GUITAR_SHAPES),
+    "ukulele": difficulty_table(UKULELE_SHAPES),
+}
+
+MAX_CAPO = 11
+# Every fret of capo costs a little, and past the 7th fret the neck gets too cramped to bother
+CAPO_COST = np.array([0.05 * capo + (2 if capo > 7 else 0) for capo in range(MAX_CAPO + 1)])
+
+
+def shape_class(chord):
+    """The difficulty-table family of a parsed Chord."""
+    if chord.quality == "m":
+        return "m7" if chord.extensions.startswith("7") else "m"
+    if chord.quality:
+        return chord.quality
+
+    extensions = chord.extensions
+    if extensions.startswith(("maj7", "M7", "maj9", "M9")):
+        return "maj7"
+    if extensions.startswith(("7", "9", "11", "13")):
+        return "7"
+    return ""
+
+
+def song_vector(chords):
+    """
+    Reduces a chord sequence to parallel arrays of root pitch class, shape family and how
+    often each distinct chord is played. Names that are not chords are left out.
+    """
+    counts = {}
+    for name in chords:
+        counts[name] = counts.get(name, 0) + 1
+
+    roots, classes, weights = [], [], []
+    for name, count in counts.items():
+        try:
+            chord = Chord.parse(name)
+        except Exception:
+            continue
+        roots.append(chord.root)
+        classes.append(_class_index[shape_class(chord)])
+        weights.append(count)
+
+    return np.array(roots, dtype=int), np.array(classes, dtype=int), np.array(weights, dtype=float)
+
+
+def key_names(minor):
+    """Key names indexed by the pitch class of their tonic, spelled like get_all_keys."""
+    names = [None] * 12
+    for name in get_all_keys(minor):
+        names[pitch_classes[key_regex.match(name).group()]] = name
+    return names
+
+
+def score_capo_options(chords, steps, instrument="guitar"):
+    """
+    Mean shape difficulty of playing chords moved up by each of `steps` semitones with
+    the capo on each fret, plus the capo's own cost. One gather over the difficulty
+    table scores every combination: the result has shape (len(steps), MAX_CAPO + 1).
+    """
+    roots, classes, weights = song_vector(chords)
+    steps = np.asarray(steps, dtype=int)
+    capos = np.arange(MAX_CAPO + 1)
+
+    if not len(weights):
+        return np.tile(CAPO_COST, (len(steps), 1))
+
+    # (N, T, C) root of the shape fingered for chord n in target t with capo c
+    shape_roots = (roots[:, None, None] + steps[None, :, None] - capos[None, None, :]) % 12
+    difficulty = difficulty_tables[instrument][classes[:, None, None], shape_roots]
+
+    return np.tensordot(weights, difficulty, axes=1) / weights.sum() + CAPO_COST
+
+
+def move_chord(name, steps, accidental):
+    """name moved up steps semitones; a chord that doesn't move keeps its spelling."""
+    return transpose_chord(name, steps, accidental) if steps % 12 else name
+
+
+def rank_capo_options(chords, from_key, to_keys=None, instrument="guitar", limit=5, labels=None):
+    """
+    Ranks the ways to play chords (written in from_key) in each of to_keys, by default
+    every key of the same mode, from easiest to hardest. Each option names the key it
+    sounds in, the capo fret, the key of the shapes played and the shape for every chord,
+    keyed by the chord as it sounds in that key, or by labels[chord] when given, e.g.
+    the names a response actually shows.
+    """
+    if instrument not in difficulty_tables:
+        raise ValueError("Unknown instrument: %s" % instrument)
+
+    minor = Chord.parse(from_key).quality == "m"
+    names = key_names(minor)
+    from_pitch = pitch_classes[key_regex.match(from_key).group()]
+
+    if to_keys is None:
+        to_keys = [names[(from_pitch + step) % 12] for step in range(12)]
+
+    steps = [(pitch_classes[key_regex.match(key).group()] - from_pitch) % 12 for key in to_keys]
+    chords = list(chords)
+
+    scores = score_capo_options(chords, steps, instrument)
+    # stable, so ties go to the earlier key and the lower capo
+    ranked = np.argsort(scores, axis=None, kind="stable")[:limit]
+
+    options = []
+    for target, capo in zip(*np.unravel_index(ranked, scores.shape)):
+        step, capo = steps[target], int(capo)
+        shape_key = names[(from_pitch + step - capo) % 12]
+        sounding_accidental = get_accidental(to_keys[target])
+        shape_accidental = get_accidental(shape_key)
+
+        options.append(
+            {
+                "key": to_keys[target],
+                "capo": capo,
+                "shape_key": shape_key,
+                "difficulty": round(float(scores[target, capo]), 2),
+                "chords": {
+                    (labels[name] if labels is not None else move_chord(name, step, sounding_accidental)):
+                        move_chord(name, step - capo, shape_accidental)
+                    for name in dict.fromkeys(chords)
+                    if key_regex.match(name)
+                },
+            }
+        )
+
+    return options
@@ -0,0 +1,95 @@
+from transpose import chord_regex, pitch_classes
+
+# https://tombatossals.github.io/react-chords/media/guitar/chords/Ab/minor/1.svg
+DIAGRAM_URL = "https://tombatossals.github.io/react-chords/media/{instrument}/chords/{root}/{suffix}/1.svg"
+
+# How the diagram catalog names each pitch class (C = 0) on each instrument
+DIAGRAM_ROOTS = {
+    "guitar": ("C", "Csharp", "D", "Eb", "E", "F", "Fsharp", "G", "Ab", "A", "Bb", "B"),
+    "ukulele": ("C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B"),
+}
+
+# Chord suffixes as written in tabs -> the catalog's name for them
+SUFFIX_ALIASES = {
+    "": "major", "maj": "major", "M": "major",
+    "m": "minor", "min": "minor", "-": "minor",
+    "5": "5", "6": "6", "6/9": "69", "69": "69", "7": "7", "9": "9", "11": "11", "13": "13",
+    "maj7": "maj7", "M7": "maj7", "Maj7": "maj7", "maj9": "maj9", "M9": "maj9",
+    "m6": "m6", "m7": "m7", "min7": "m7", "-7": "m7", "m9": "m9", "m11": "m11",
+    "m7b5": "m7b5", "m7-5": "m7b5",
+    "mmaj7": "mmaj7", "mM7": "mmaj7", "m(maj7)": "mmaj7",
+    "dim": "dim", "o": "dim", "dim7": "dim7", "o7": "dim7",
+    "aug": "aug", "+": "aug", "aug7": "aug7", "7#5": "aug7",
+    "sus": "sus4", "sus4": "sus4", "sus2": "sus2", "2": "sus2", "7sus4": "7sus4",
+    "add9": "add9", "add2": "add9", "madd9": "madd9",
+    "7b5": "7b5", "7b9": "7b9",
+}
+
+# Suffixes each instrument's catalog has diagrams for
+DIAGRAM_SUFFIXES = {
+    "guitar": frozenset(SUFFIX_ALIASES.values()),
+    "ukulele": frozenset(
+        ("major", "minor", "5", "6", "7", "9", "maj7", "m6", "m7", "m7b5", "dim", "dim7",
+         "aug", "sus2", "sus4", "7sus4", "add9")
+    ),
+}
+
+
+def diagram_url(instrument, pitch_class, suffix):
+    """The diagram for the chord on `instrument`, or None when the catalog has none."""
+    if suffix not in DIAGRAM_SUFFIXES[instrument]:
+        return None
+    return DIAGRAM_URL.format(instrument=instrument, root=DIAGRAM_ROOTS[instrument][pitch_class], suffix=suffix)
+
+
+def build_catalog():
+    """
+    Maps every root spelling plus every known suffix ("C#m7", "Dbm7", ...) to its
+    (guitar url, ukulele url). Built once at import; lookups are then a single dict get.
+    """
+    catalog = {}
+
+    for root, pitch_class in pitch_classes.items():
+        for written, suffix in SUFFIX_ALIASES.items():
+            catalog[root + written] = (
+                diagram_url("guitar", pitch_class, suffix),
+                diagram_url("ukulele", pitch_class, suffix),
+            )
+
+    return catalog
+
+
+diagram_catalog = build_catalog()
+
+# (guitar url, ukulele url) of chords the catalog has no diagram for, like unusual extensions
+NO_DIAGRAM = (None, None)
+
+
+def chord_diagram_urls(chord):
+    """(guitar url, ukulele url) of a chord name; a slash bass is played but not drawn."""
+    urls = diagram_catalog.get(chord)
+    if urls is not None:
+        return urls
+
+    match = chord_regex.fullmatch(chord)
+    if match is None:
+        return NO_DIAGRAM
+
+    root, suffix, bass = match.groups()
+    return diagram_catalog.get(root + suffix, NO_DIAGRAM)
+
+
+def get_chord_diagrams(chords):
+    """
+    Returns the guitar and ukulele diagram lists for a sequence of chord names, one
+    {name, url} entry per distinct chord in order of first appearance. url is None for
+    chords there is no diagram of.
+    """
+    guitar, ukulele = [], []
+
+    for chord in dict.fromkeys(chords):
+        guitar_url, ukulele_url = chord_diagram_urls(chord)
+        guitar.append({"name": chord, "url": guitar_url})
+        ukulele.append({"name": chord, "url": ukulele_url})
+
+    return guitar, ukulele
@@ -0,0 +1,78 @@
+import asyncio
+from os import environ as env
+from urllib.parse import urlsplit
+
+import httpx
+
+# Upstream locations, overridable so the API can run against a local stub server
+UG_TABS_PREFIX = "https://tabs.ultimate-guitar.com/tab/"
+SEARCH_URL = env.get("UG_SEARCH_URL", "https://www.ultimate-guitar.com/search.php")
+TABS_URL = env.get("UG_TABS_URL", UG_TABS_PREFIX)
+
+MAX_CONNECTIONS = int(env.get("FETCH_MAX_CONNECTIONS", 100))
+MAX_KEEPALIVE_CONNECTIONS = int(env.get("FETCH_MAX_KEEPALIVE_CONNECTIONS", 20))
+KEEPALIVE_EXPIRY = float(env.get("FETCH_KEEPALIVE_EXPIRY", 30))
+PER_HOST_LIMIT = int(env.get("FETCH_PER_HOST_LIMIT", 10))
+TIMEOUT = float(env.get("FETCH_TIMEOUT", 10))
+CONNECT_TIMEOUT = float(env.get("FETCH_CONNECT_TIMEOUT", 5))
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0 Safari/537.36"
+}
+
+_client = None
+_host_limits = {}
+
+
+def get_client():
+    """Returns the shared keep-alive client, creating it on first use."""
+    global _client
+
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            follow_redirects=True,
+            timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+
+    return _client
+
+
+async def close_client():
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+    _host_limits.clear()
+
+
+def _host_limit(host):
+    limit = _host_limits.get(host)
+
+    if limit is None:
+        limit = _host_limits[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+
+    return limit
+
+
+def tab_url(url: str):
+    """Maps a canonical tabs.ultimate-guitar.com link onto the configured tabs host."""
+    if url.startswith(UG_TABS_PREFIX):
+        return TABS_URL + url[len(UG_TABS_PREFIX):]
+
+    return url
+
+
+async def fetch_text(url: str):
+    """GETs a page through the shared pool, at most PER_HOST_LIMIT at a time per host."""
+    async with _host_limit(urlsplit(url).netloc):
+        response = await get_client().get(url)
+
+    return response.text
@@ -1,29 +1,107 @@
-import requests
 from bs4 import BeautifulSoup
+import html
 import re
-import json
+from fetcher import SEARCH_URL, fetch_text, tab_url
+from search_index import create_search_index, link_result
+from singleflight import SingleFlight
+from song import Song, rank_results, search_results_from_json
+from tokenizer import compile_tab
+from transpose import key_regex
+from capo import rank_capo_options
 
-def search(term):
+# Concurrent identical lookups share one upstream round trip
+search_flight = SingleFlight()
+song_flight = SingleFlight()
+
+# Every search page and tab page fetched is added to it; None when turned off
+search_index = create_search_index()
+
+SEARCH_RESULTS = 5
+
+
+async def search(term):
+    """
+    The best SEARCH_RESULTS tabs for term as {id, url, artist, song, type, rating,
+    votes} dicts, chords first and best rated first.
+    """
+    results, upstream = await search_with_source(term)
+
+    return results
+
+
+async def search_with_source(term):
+    """search(), and whether the results came from upstream rather than the local index."""
+    results, upstream = await search_flight.do(term, lambda: _search(term))
+
+    return list(results), upstream
+
+
+async def _search(term):
+    """
+    Answers from the local index when it has a full page of results for term, or had
+    term answered upstream lately. Otherwise its results may just be the few matching
+    tabs fetched so far, so the search goes upstream.
+    """
+    if search_index is not None:
+        results = await search_index.run(search_index.lookup, term, SEARCH_RESULTS)
+        if results and (len(results) >= SEARCH_RESULTS or await search_index.run(search_index.answered, term)):
+            return results, False
+
+    results = await search_upstream(term)
+
+    return results[0:SEARCH_RESULTS], True
+
+
+def search_page_links(text):
+    """Every tab link on an Ultimate Guitar search page, in page order."""
+    links = re.findall(r"https://tabs.ultimate-guitar.com/tab/.*?;", text)
+
+    return [i.replace("&quot;", "") for i in links]
+
+
+def search_page_results(text):
+    """
+    The tab results held in a search page's js-store, in page order. Empty when the page
+    has no store or no results in it.
+    """
+    data = extract_store_fast(text)
+
+    return search_results_from_json(data) if data is not None else []
+
+
+async def search_upstream(term):
+    """Every tab result of Ultimate Guitar's search page for term, ranked."""
     escaped_term = term.replace(" ", "+")
 
-    url ="https://www.ultimate-guitar.com/search.php?search_type=title&order=&value=" + escaped_term
+    url = SEARCH_URL + "?search_type=title&order=&value=" + escaped_term
+
+    text = await fetch_text(url)
+    results = search_page_results(text)
 
-    resp = requests.get(url)
-    links = re.findall(r"https://tabs.ultimate-guitar.com/tab/.*?;", resp.text)
+    if results:
+        if search_index is not None:
+            await search_index.run(search_index.add_results, results, term)
 
-    links = [i.replace("&quot;", "") for i in links][0:5]
+        return rank_results(results)
 
-    return links
+    # No store: fall back to the links in the markup, unrated and named after their
+    # slugs, which the index only takes for tabs it doesn't know yet
+    links = search_page_links(text)
 
-def get_song_key(song_name: str):
+    if search_index is not None:
+        await search_index.run(search_index.add_links, links, term)
+
+    return [result for result in map(link_result, links) if result is not None]
+
+async def get_song_key(song_name: str):
     query = song_name + "site:songbpm.com"
-    result = search(query)
+    result = await search(query)
 
-    result = next(result)
+    result = result[0]["url"]
 
-    answer = requests.get(result)
+    answer = await fetch_text(result)
 
-    soup = BeautifulSoup(answer.content, "html.parser")
+    soup = BeautifulSoup(answer, "html.parser")
 
     # get this class class="mt-1 text-3xl font-semibold text-gray-900"
     data = soup.find("dd", {"class": "mt-1 text-3xl font-semibold text-gray-900"})
@@ -31,75 +109,125 @@ def get_song_key(song_name: str):
 
     return data
 
-def get_song_data(song_name: str, result_num: str = ""):
+async def get_song_data(song_name: str, result_num: str = ""):
+    return await song_flight.do(
+        result_num or song_name, lambda: _get_song_data(song_name, result_num)
+    )
+
+
+async def get_tab(tab_id, url: str):
+    """The Song at a known tab link, sharing any fetch of the same tab already under way."""
+    return await song_flight.do(str(tab_id), lambda: _get_tab(url))
+
+
+async def _get_song_data(song_name: str, result_num: str = ""):
     query = song_name
 
     without_number = ' '.join(query.split("-")[0: -1])
 
-    result = search(without_number)
+    song_url = None
+    if search_index is not None and result_num:
+        song_url = await search_index.run(search_index.url_for, result_num)
+
+    if song_url is None:
+        # Tabs the index doesn't know by id aren't among its search results either
+        result = await search_upstream(without_number)
 
-    song_url = [i for i in result if result_num in i]
+        # Match on the tab id; a name without one matches on the link as before
+        song_url = [
+            i["url"] for i in result
+            if str(i["id"]) == result_num or (not result_num.isdigit() and result_num in i["url"])
+        ]
 
-    if len(song_url) == 0:
+        if len(song_url) == 0:
+            return None
+
+        song_url = song_url[0]
+
+    return await _get_tab(song_url)
+
+
+async def _get_tab(song_url: str):
+    answer = await fetch_text(tab_url(song_url))
+
+    song = Song.from_json(extract_store(answer))
+
+    if search_index is not None:
+        await search_index.run(search_index.add_song, song)
+
+    return song
+
+
+def extract_store_fast(page: str):
+    """
+    Slices the data-content attribute of the js-store div straight out of the page
+    and unescapes it, without building a DOM. Returns None if the markup is unexpected.
+    """
+    class_idx = page.find('class="js-store"')
+    if class_idx == -1:
         return None
-    
-    song_url = song_url[0]
 
-    answer = requests.get(song_url)
+    tag_start = page.rfind("<", 0, class_idx)
+    attr_idx = page.find(' data-content="', tag_start)
 
-    soup = BeautifulSoup(answer.text, "html.parser")
+    # The attribute has to belong to the js-store tag itself
+    if attr_idx == -1 or ">" in page[tag_start:attr_idx]:
+        return None
 
-    data = soup.find("div", {"class": "js-store"})
+    value_start = attr_idx + len(' data-content="')
+    value_end = page.find('"', value_start)
+    if value_end == -1:
+        return None
 
-    # Get only the data-content attribute
-    data = data["data-content"]
+    data = page[value_start:value_end]
+
+    if "&" in data:
+        data = unescape_attribute(data)
 
-    return json.loads(data)
+    return data
 
 
-def extract_chords(text):
-    # Extract section headers that are not chords (not in ch tag), without the \n and brackets
-    sections = re.findall(r"(?<!\[ch\])(\[[^\]]*\])", text)
-    new_sections = [
-        section
-        for section in sections
-        if section not in ["[tab]", "[/tab]", "[ch]", "[/ch]"]
-    ]
-
-    final_sections = {}
-    start_idx = 0
-
-    for i in range(len(new_sections)):
-        section = new_sections[i]
-        start_idx = text.find(
-            section, start_idx
-        )  # Update the starting index based on the last search
-
-        if i < len(new_sections) - 1:
-            next_section = new_sections[i + 1]
-            end_idx = text.find(next_section, start_idx)
-        else:
-            end_idx = len(text)
+def unescape_attribute(value: str):
+    """html.unescape, with str.replace fast paths for the entities UG actually emits."""
+    unescaped = value
+    for entity, char in (("&quot;", '"'), ("&#039;", "'"), ("&lt;", "<"), ("&gt;", ">")):
+        unescaped = unescaped.replace(entity, char)
+
+    # Anything other than &amp; left over needs the full entity table
+    if unescaped.count("&") != unescaped.count("&amp;"):
+        return html.unescape(value)
+
+    return unescaped.replace("&amp;", "&")
+
+
+def extract_store_soup(page: str):
+    soup = BeautifulSoup(page, "html.parser")
 
-        chords = re.findall(r"\[ch\](.*?)\[/ch\]", text[start_idx:end_idx])
+    data = soup.find("div", {"class": "js-store"})
+
+    # Get only the data-content attribute
+    return data["data-content"]
 
-        # If no chords found, use a regex to identify the chords like A, Am, G, C, A#m7, B7sus4, etc, not in ch tags this time.
-        if len(chords) == 0:
-            # use this regex \b[CDEFGAB](?:#{1,2}|b{1,2})?(?:maj7?|min7?|sus2?)\b/g
-            chords = re.findall(
-                r"\b[CDEFGAB](?:#{1,2}|b{1,2})?(?:maj7?|min7?|sus2?)\b",
-                text[start_idx:end_idx],
-            )
 
-        section_name = section.replace("[", "").replace("]", "")
+def extract_store(page: str):
+    """Returns the raw JSON held in the page's js-store div."""
+    data = extract_store_fast(page)
 
-        final_sections[section_name] = chords
-        start_idx = end_idx  # Update the starting index for the next iteration
+    if data is None:
+        data = extract_store_soup(page)
 
-    return final_sections
+    return data
+
+
+def extract_chords(text):
+    """
+    Returns {section name: [chords]} for the song text. Sections use their [ch] chords,
+    or bare chords like Asus2 when a section has none. Text before the first header is ignored.
+    """
+    return compile_tab(text).progressions()
 
 
-def get_song_chords(song_name: str):
+async def get_song_chords(song_name: str):
     got_results = False
     current_try = 1
 
@@ -111,12 +239,10 @@ def get_song_chords(song_name: str):
         # Number at the end of songname
         song_name_number = song_name.split("-")[-1]
 
-        data = get_song_data(song_name, song_name_number)
+        data = await get_song_data(song_name, song_name_number)
 
         # Extract the song's chord progressions
-        progressions = extract_chords(
-            data["store"]["page"]["data"]["tab_view"]["wiki_tab"]["content"]
-        )
+        progressions = extract_chords(data.content)
 
         is_empty_value = False
 
@@ -141,73 +267,38 @@ def replace_chords_with_transposed(
 ):
     """Replace original chords in the song text with transposed chords."""
 
-    # Loop through sections and replace the chords
+    # Pair each original chord with its transposition, section by section
+    replacements = {}
     for section, chords in original_progressions.items():
         for idx, chord in enumerate(chords):
-            # Replace all occurrences of the original chord with the transposed chord in the section
-            transposed_chord = transposed_progressions[section][idx]
-            text = text.replace(f"[ch]{chord}[/ch]", f"[ch]{transposed_chord}[/ch]")
-
-            # Also handle cases where chords are mentioned without the [ch] tags
-            # Note: This might unintentionally replace other words if they match chord names.
-            # Ideally, you'd have a more robust way of distinguishing chords from other text.
-            text = text.replace(f"\n{chord}", f"\n{transposed_chord}")
-            text = text.replace(f" {chord}", f" {transposed_chord}")
-
-    return text
-
-def split_chord(chord):
-    """Splits a chord into its root and quality."""
-    if chord[-3:] == 'dim':
-        return chord[:-3], 'dim'
-    if chord[-1] == 'm':
-        return chord[:-1], 'm'
-    return chord, ''
-
-def transpose_to_easy_key(song_structure):
-    """TODO: A WAY TO TRANSPOSE TO EASY CHORDS WITH CAPO"""
-    # Define transposition table
-    chords = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-    
-    easy_keys = {
-        'G': ['G', 'Am', 'Bm', 'C', 'D', 'Em', 'F#dim'],
-        'C': ['C', 'Dm', 'Em', 'F', 'G', 'Am', 'Bdim']
+            replacements[chord] = transposed_progressions[section][idx]
+
+    # Only [ch] chords and recognised bare chords are rewritten, so lyrics that
+    # happen to spell a chord name are left alone and no chord is transposed twice
+    return compile_tab(text).rewrite(replacements)
+
+def transpose_to_easy_key(song_structure, key=None, instrument="guitar"):
+    """
+    Finds the easiest way to play a song in `key` (by default its own key, taken from the
+    first chord) with a capo. Returns the capo position and the song structure rewritten
+    in the chord shapes to finger with the capo on.
+    """
+    chords = [chord for section_chords in song_structure.values() for chord in section_chords]
+    original_key = next((chord for chord in chords if key_regex.match(chord)), None)
+
+    if original_key is None:
+        return 0, {section: list(section_chords) for section, section_chords in song_structure.items()}
+
+    key = key or original_key
+    # Keyed by the chords as written, so each one looks up its own shape
+    best = rank_capo_options(
+        chords, original_key, [key], instrument, limit=1, labels={chord: chord for chord in chords}
+    )[0]
+    shapes = best["chords"]
+
+    new_song_structure = {
+        section: [shapes.get(chord, chord) for chord in section_chords]
+        for section, section_chords in song_structure.items()
     }
 
-    # Function to determine number of steps to transpose from chord1 to chord2
-    def steps_between_chords(chord1, chord2):
-        root1, _ = split_chord(chord1)
-        root2, _ = split_chord(chord2)
-        index1 = chords.index(root1)
-        index2 = chords.index(root2)
-        return (index2 - index1) % 12
-    
-    # Determine best key to transpose to
-    best_key = None
-    fewest_steps = float('inf')
-    capo_position = 0
-
-    for key, key_chords in easy_keys.items():
-        total_steps = 0
-        for section, section_chords in song_structure.items():
-            for chord in section_chords:
-                min_steps = min([steps_between_chords(chord, key_chord) for key_chord in key_chords])
-                total_steps += min_steps
-        if total_steps < fewest_steps:
-            best_key = key
-            fewest_steps = total_steps
-
-    # Now transpose the song to the best key
-    new_song_structure = {}
-    for section, section_chords in song_structure.items():
-        new_song_structure[section] = []
-        for chord in section_chords:
-            root, quality = split_chord(chord)
-            steps_to_key = steps_between_chords(chord, best_key)
-            new_chord_index = (chords.index(root) + steps_to_key) % 12
-            new_chord = chords[new_chord_index] + quality
-            new_song_structure[section].append(new_chord)
-
-    capo_position = steps_between_chords('C', best_key)
-
-    return capo_position, new_song_structure
+    return best["capo"], new_song_structure
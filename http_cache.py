@@ -0,0 +1,37 @@
+import hashlib
+
+from fastapi.responses import Response
+
+# Part of every ETag; bump it whenever a response body changes shape, so clients and
+# CDNs don't keep revalidating bodies in the old format
+RESPONSE_VERSION = 2
+
+
+def content_version(text):
+    """A short, stable digest of a tab's content, which changes whenever the tab does."""
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def make_etag(*parts):
+    """
+    Builds a weak ETag from the values a response is derived from. Weak, because the
+    same body may be sent gzipped or not.
+    """
+    digest = hashlib.sha1(repr((RESPONSE_VERSION,) + parts).encode()).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against etag, per RFC 9110."""
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def not_modified(etag, cache_control):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
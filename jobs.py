@@ -0,0 +1,134 @@
+import asyncio
+import time
+import uuid
+from os import environ as env
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job(object):
+    __slots__ = ("id", "status", "result", "error", "created_at", "finished_at", "task")
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.task = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class InProcessJobQueue(object):
+    """
+    Runs background jobs as tasks on the worker's own event loop, with no external broker.
+    At most `concurrency` jobs run at once and each gets `timeout` seconds. Finished jobs
+    are kept for `retention` seconds so clients can poll their results.
+
+    Cancelling a job, or its timing out, cancels the coroutine running it; it is up to
+    that coroutine to release what it holds, like a queued analysis.
+    """
+
+    def __init__(self, concurrency, timeout, max_jobs=1000, retention=60 * 60):
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        self.retention = retention
+
+        self._limit = asyncio.Semaphore(concurrency)
+        self._jobs = {}
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > self.retention:
+                del self._jobs[job_id]
+
+    def submit(self, work):
+        """Schedules work(), a coroutine function, and returns its Job immediately."""
+        self._prune()
+
+        if len(self._jobs) >= self.max_jobs:
+            raise JobQueueFull()
+
+        job = Job()
+        job.task = asyncio.ensure_future(self._run(job, work))
+        self._jobs[job.id] = job
+
+        return job
+
+    async def _run(self, job, work):
+        try:
+            async with self._limit:
+                job.status = RUNNING
+                job.result = await asyncio.wait_for(work(), self.timeout)
+                job.status = SUCCEEDED
+        except asyncio.TimeoutError:
+            job.status = TIMED_OUT
+            job.error = f"Job did not finish within {self.timeout:g} seconds"
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e) or e.__class__.__name__
+        finally:
+            job.finished_at = time.time()
+            job.task = None
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job. Returns False if it already finished."""
+        job = self._jobs.get(job_id)
+
+        if job is None or job.status in FINISHED:
+            return False
+
+        job.task.cancel()
+        return True
+
+    async def shutdown(self):
+        """Cancels every queued or running job and waits for them to stop."""
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def create_job_queue():
+    """
+    The job queue JOB_BACKEND names. The only one is inprocess, whose jobs are visible
+    only to the worker process that accepted them, so run async uploads on one worker.
+    """
+    backend = env.get("JOB_BACKEND", "inprocess")
+
+    if backend != "inprocess":
+        raise ValueError("Unsupported JOB_BACKEND: %s" % backend)
+
+    return InProcessJobQueue(
+        concurrency=int(env.get("JOB_CONCURRENCY", 4)),
+        timeout=float(env.get("JOB_TIMEOUT", 120)),
+        max_jobs=int(env.get("JOB_MAX_JOBS", 1000)),
+        retention=float(env.get("JOB_RETENTION", 60 * 60)),
+    )
@@ -1,15 +1,235 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import librosa
-import librosa.display
+
+# librosa, scipy and matplotlib are imported where they are used, so that the key scoring
+# (and Streaming_Tonal_Fragment.add_chroma) costs only numpy to import, e.g. in the API process
+
+pitches = ['C','C#','D','D#','E','F','F#','G','G#','A','A#','B']
+# names of all major and minor keys, in the order of the rows of key_profiles
+keys = [pitches[i] + '' for i in range(12)] + [pitches[i] + 'm' for i in range(12)]
+
+# use of the Krumhansl-Schmuckler key-finding algorithm, which compares the chroma
+# data to typical profiles of major and minor keys:
+maj_profile = [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88]
+min_profile = [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
+
+# row i holds the profile of keys[i], i.e. the major or minor profile rotated to start on its tonic
+key_profiles = np.array(
+    [np.roll(maj_profile, i) for i in range(12)] + [np.roll(min_profile, i) for i in range(12)]
+)
+# centred and scaled to unit length, so correlating is a single matrix product
+_centred_profiles = key_profiles - key_profiles.mean(axis=1, keepdims=True)
+_unit_profiles = _centred_profiles / np.linalg.norm(_centred_profiles, axis=1, keepdims=True)
+
+
+def key_correlations(chroma):
+    """
+    Pearson correlation of 12-bin chroma vectors with every key profile, rounded to 3 places.
+    chroma has shape (12,) or (n, 12); the result has shape (24,) or (n, 24), ordered like keys.
+    """
+    chroma = np.asarray(chroma, dtype=float)
+    centred = chroma - chroma.mean(axis=-1, keepdims=True)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        unit = centred / np.linalg.norm(centred, axis=-1, keepdims=True)
+
+    return np.round(unit @ _unit_profiles.T, 3)
+
+
+def pick_keys(correlations):
+    """
+    For (n, 24) correlations returns the index of the best key and of the alternative key
+    (the last other key within 90% of the best, or -1 when there is none) for every row.
+    """
+    correlations = np.atleast_2d(correlations)
+    best = correlations.argmax(axis=1)
+    bestcorr = correlations[np.arange(len(correlations)), best][:, None]
+
+    close = (correlations > bestcorr * 0.9) & (correlations != bestcorr)
+    # last matching column, as the alternative has always been the last close key in keys order
+    alt = np.where(close.any(axis=1), 23 - close[:, ::-1].argmax(axis=1), -1)
+
+    return best, alt
+
+
+def score_chroma(chroma_batch):
+    """
+    Scores many chroma vectors (or summed fragments) at once.
+    Returns a list of {key, bestcorr, altkey, altbestcorr} dicts, one per row.
+    """
+    correlations = key_correlations(np.atleast_2d(chroma_batch))
+    best, alt = pick_keys(correlations)
+
+    return [
+        {
+            'key': keys[b],
+            'bestcorr': float(row[b]),
+            'altkey': keys[a] if a >= 0 else None,
+            'altbestcorr': float(row[a]) if a >= 0 else None,
+        }
+        for row, b, a in zip(correlations, best, alt)
+    ]
+
+
+def sliding_window_keys(chromagram, window, hop):
+    """Scores every `window`-frame slice of a (12, frames) chromagram, `hop` frames apart."""
+    totals = np.concatenate([np.zeros((12, 1)), np.cumsum(chromagram, axis=1)], axis=1)
+    starts = np.arange(0, max(chromagram.shape[1] - window, 0) + 1, hop)
+    ends = np.minimum(starts + window, chromagram.shape[1])
+
+    return score_chroma((totals[:, ends] - totals[:, starts]).T)
+
+
+def key_margin(correlations):
+    """How far the best key's correlation is ahead of the runner-up's."""
+    top = np.sort(np.asarray(correlations))[-2:]
+    return float(top[1] - top[0])
+
+
+# chroma backends turn audio into a (12, frames) chromagram. spectrum_filter, if given, is applied
+# to the magnitude spectrogram before it is folded into pitch classes
+def stft_chroma(y, sr, spectrum_filter=None):
+    import librosa
+
+    S = np.abs(librosa.stft(y)) ** 2
+    if spectrum_filter is not None:
+        S = spectrum_filter(S)
+    return librosa.feature.chroma_stft(S=S, sr=sr)
+
+
+def cqt_chroma(y, sr, spectrum_filter=None):
+    import librosa
+
+    if spectrum_filter is None:
+        return librosa.feature.chroma_cqt(y=y, sr=sr, bins_per_octave=24)
+    C = np.abs(librosa.cqt(y, sr=sr, bins_per_octave=24, n_bins=7 * 24))
+    return librosa.feature.chroma_cqt(C=spectrum_filter(C), sr=sr, bins_per_octave=24)
+
+
+chroma_backends = {'stft': stft_chroma, 'cqt': cqt_chroma}
+
+
+def median_harmonic(S, width=17):
+    """
+    Cheap stand-in for HPSS: a median filter along time keeps sustained (harmonic) energy and
+    suppresses short percussive bursts, without HPSS's vertical filter, masks and inverse STFT.
+    """
+    import scipy.ndimage
+
+    return scipy.ndimage.median_filter(S, size=(1, width))
+
+
+# harmonic filters: 'hpss' separates the harmonic part of the audio first, as the original
+# analysis did; 'median' filters the spectrogram instead; 'none' uses the audio as it is
+harmonic_filters = ('hpss', 'median', 'none')
+
+
+def compute_chroma(y, sr, backend='cqt', harmonic='hpss'):
+    """Chromagram of y with the given chroma backend and harmonic filter."""
+    if backend not in chroma_backends:
+        raise ValueError('Unknown chroma backend: %s' % backend)
+    if harmonic not in harmonic_filters:
+        raise ValueError('Unknown harmonic filter: %s' % harmonic)
+
+    if harmonic == 'hpss':
+        import librosa
+
+        y = librosa.effects.harmonic(y)
+
+    return chroma_backends[backend](y, sr, median_harmonic if harmonic == 'median' else None)
+
+
+def chunk_chroma(samples, sr, backend='cqt', harmonic='hpss'):
+    """Summed chroma of the harmonic part of one chunk of audio, as 12 values."""
+    return compute_chroma(samples, sr, backend, harmonic).sum(axis=1)
+
+
+# streaming counterpart of Tonal_Fragment: audio arrives in chunks and the key is re-scored from the
+# running chroma sums after each one. detection is done once the same key has led the runner-up by
+# at least `margin` for `patience` chunks in a row (and at least `min_seconds` were heard), or once
+# `max_seconds` of audio were used, whichever comes first.
+class Streaming_Tonal_Fragment(object):
+    def __init__(self, sr, margin=0.1, patience=3, min_seconds=4.0, max_seconds=22.0,
+                 backend='cqt', harmonic='hpss'):
+        self.sr = sr
+        self.backend = backend
+        self.harmonic = harmonic
+        self.margin = margin
+        self.patience = patience
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+
+        self.chroma_vals = np.zeros(12)
+        self.seconds = 0.0
+        self.stable_chunks = 0
+        self.done = False
+
+        self.key = None
+        self.bestcorr = None
+        self.altkey = None
+        self.altbestcorr = None
+        self.confidence = 0.0
+
+    def feed(self, samples):
+        """Analyses the next chunk of mono audio, sampled at self.sr."""
+        if len(samples):
+            chroma_vals = chunk_chroma(samples, self.sr, self.backend, self.harmonic)
+            self.add_chroma(chroma_vals, len(samples) / self.sr)
+        return self.done
+
+    def add_chroma(self, chroma_vals, seconds):
+        """Adds the summed chroma of a chunk analysed elsewhere, e.g. on a worker process."""
+        self.chroma_vals = self.chroma_vals + np.asarray(chroma_vals, dtype=float)
+        self.seconds += seconds
+
+        correlations = key_correlations(self.chroma_vals)
+        best, alt = pick_keys(correlations)
+        previous_key = self.key
+
+        self.key = keys[best[0]]
+        self.bestcorr = float(correlations[best[0]])
+        self.altkey = keys[alt[0]] if alt[0] >= 0 else None
+        self.altbestcorr = float(correlations[alt[0]]) if alt[0] >= 0 else None
+        self.confidence = key_margin(correlations)
+
+        # silence correlates with nothing, so it never counts towards a stable key
+        if np.isnan(self.bestcorr) or self.confidence < self.margin:
+            self.stable_chunks = 0
+        elif self.key != previous_key:
+            self.stable_chunks = 1
+        else:
+            self.stable_chunks += 1
+
+        self.done = self.seconds >= self.max_seconds or (
+            self.seconds >= self.min_seconds and self.stable_chunks >= self.patience
+        )
+        return self.done
+
+    def result(self):
+        if self.key is None or np.isnan(self.bestcorr):
+            return {'key': None, 'correlation': None, 'altkey': None, 'altcorrelation': None,
+                    'confidence': 0.0, 'seconds': round(self.seconds, 2)}
+
+        return {
+            'key': self.key,
+            'correlation': self.bestcorr,
+            'altkey': self.altkey,
+            'altcorrelation': self.altbestcorr,
+            'confidence': round(self.confidence, 3),
+            'seconds': round(self.seconds, 2),
+        }
+
 
 # class that uses the librosa library to analyze the key that an mp3 is in
 # arguments:
 #     waveform: an mp3 file loaded by librosa, ideally separated out from any percussive sources
 #     sr: sampling rate of the mp3, which can be obtained when the file is read with librosa
 #     tstart and tend: the range in seconds of the file to be analyzed; default to the beginning and end of file if not specified
+#     backend and harmonic: the chroma backend and harmonic filter, see compute_chroma; by default the
+#         waveform is used as given, with CQT chroma
 class Tonal_Fragment(object):
-    def __init__(self, waveform, sr, tstart=None, tend=None):
+    def __init__(self, waveform, sr, tstart=None, tend=None, backend='cqt', harmonic='none'):
+        import librosa
+
         self.waveform = waveform
         self.sr = sr
         self.tstart = tstart
@@ -20,50 +240,47 @@ class Tonal_Fragment(object):
         if self.tend is not None:
             self.tend = librosa.time_to_samples(self.tend, sr=self.sr)
         self.y_segment = self.waveform[self.tstart:self.tend]
-        self.chromograph = librosa.feature.chroma_cqt(y=self.y_segment, sr=self.sr, bins_per_octave=24)
+        self.chromograph = compute_chroma(self.y_segment, self.sr, backend, harmonic)
         
         # chroma_vals is the amount of each pitch class present in this time interval
-        self.chroma_vals = []
-        for i in range(12):
-            self.chroma_vals.append(np.sum(self.chromograph[i]))
-        pitches = ['C','C#','D','D#','E','F','F#','G','G#','A','A#','B']
+        self._score(self.chromograph.sum(axis=1))
+
+    @classmethod
+    def from_chroma(cls, chroma_vals):
+        """Builds a fragment straight from 12 summed chroma values, skipping the audio analysis."""
+        fragment = cls.__new__(cls)
+        fragment.waveform = None
+        fragment.sr = None
+        fragment._score(np.asarray(chroma_vals, dtype=float))
+        return fragment
+
+    def _score(self, chroma_vals):
+        self.chroma_vals = list(chroma_vals)
         # dictionary relating pitch names to the associated intensity in the song
         self.keyfreqs = {pitches[i]: self.chroma_vals[i] for i in range(12)} 
-        
-        keys = [pitches[i] + '' for i in range(12)] + [pitches[i] + 'm' for i in range(12)]
-
-        # use of the Krumhansl-Schmuckler key-finding algorithm, which compares the chroma
-        # data above to typical profiles of major and minor keys:
-        maj_profile = [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88]
-        min_profile = [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
 
-        # finds correlations between the amount of each pitch class in the time interval and the above profiles,
+        # finds correlations between the amount of each pitch class in the time interval and the key profiles,
         # starting on each of the 12 pitches. then creates dict of the musical keys (major/minor) to the correlation
-        self.min_key_corrs = []
-        self.maj_key_corrs = []
-        for i in range(12):
-            key_test = [self.keyfreqs.get(pitches[(i + m)%12]) for m in range(12)]
-            # correlation coefficients (strengths of correlation for each key)
-            self.maj_key_corrs.append(round(np.corrcoef(maj_profile, key_test)[1,0], 3))
-            self.min_key_corrs.append(round(np.corrcoef(min_profile, key_test)[1,0], 3))
-
-        # names of all major and minor keys
-        self.key_dict = {**{keys[i]: self.maj_key_corrs[i] for i in range(12)}, 
-                         **{keys[i+12]: self.min_key_corrs[i] for i in range(12)}}
-        
+        correlations = key_correlations(chroma_vals)
+        self.maj_key_corrs = correlations[:12].tolist()
+        self.min_key_corrs = correlations[12:].tolist()
+
+        self.key_dict = dict(zip(keys, correlations.tolist()))
+
+        best, alt = pick_keys(correlations)
+
         # this attribute represents the key determined by the algorithm
-        self.key = max(self.key_dict, key=self.key_dict.get)
-        self.bestcorr = max(self.key_dict.values())
+        self.key = keys[best[0]]
+        self.bestcorr = self.key_dict[self.key]
         
         # this attribute represents the second-best key determined by the algorithm,
         # if the correlation is close to that of the actual key determined
         self.altkey = None
         self.altbestcorr = None
 
-        for key, corr in self.key_dict.items():
-            if corr > self.bestcorr*0.9 and corr != self.bestcorr:
-                self.altkey = key
-                self.altbestcorr = corr
+        if alt[0] >= 0:
+            self.altkey = keys[alt[0]]
+            self.altbestcorr = self.key_dict[self.altkey]
                 
     # prints the relative prominence of each pitch class            
     def print_chroma(self):
@@ -87,6 +304,10 @@ class Tonal_Fragment(object):
     
     # prints a chromagram of the file, showing the intensity of each pitch class over time
     def chromagram(self, title=None):
+        import librosa
+        import librosa.display
+        import matplotlib.pyplot as plt
+
         C = librosa.feature.chroma_cqt(y=self.waveform, sr=self.sr, bins_per_octave=24)
         plt.figure(figsize=(12,4))
         librosa.display.specshow(C, sr=self.sr, x_axis='time', y_axis='chroma', vmin=0, vmax=1)
@@ -1,28 +1,129 @@
-import librosa
-from key_finder import Tonal_Fragment
-from helpers import get_song_chords, get_song_data, replace_chords_with_transposed
-from transpose import transpose_progressions
-from fastapi import FastAPI, UploadFile, Query
-from fastapi.responses import JSONResponse
-import pymysql
+from helpers import get_song_chords, get_song_data, get_tab, replace_chords_with_transposed
+from transpose import Chord, get_all_keys, is_key, key_regex, transpose_progressions, transpose_to_keys
+from capo import rank_capo_options
+from diagrams import get_chord_diagrams
+from tokenizer import compile_tab
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import json
+from typing import List
+import numpy as np
+from fastapi import FastAPI, UploadFile, Query, Request, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from os import environ as env
-from helpers import search
+from helpers import search_index, search_with_source
 from helpers import extract_chords
+from fetcher import UG_TABS_PREFIX, close_client
+from cache import TieredCache
+from singleflight import SingleFlight
+from song import CHORD_TYPES
+from storage import create_storage
+from user_keys import InvalidationLog, UserKeyCache
+from analysis import (
+    ANALYSIS_TIER,
+    QUALITY_TIERS,
+    AnalysisQueueFull,
+    StreamingAnalysis,
+    analyse_recording,
+    analyse_recording_streaming,
+    create_engine,
+    result_cache_key,
+)
+from jobs import SUCCEEDED, JobQueueFull, create_job_queue
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from http_cache import content_version, etag_matches, make_etag, not_modified
 
 load_dotenv()
 
-app = FastAPI()
-connection = pymysql.connect(
-    host=env.get("MYSQL_HOST"),
-    user=env.get("MYSQL_USER"),
-    password=env.get("MYSQL_PASSWORD"),
-    db=env.get("MYSQL_DATABASE"),
-    port=int(env.get("MYSQL_PORT")),
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+
+    # Background work goes first, so none of it runs on against a closed client or pool
+    tasks = list(prefetches.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await song_cache.cancel_refreshes()
+    await job_queue.shutdown()
+
+    await close_client()
+    storage.close()
+    analysis_engine.shutdown()
+    song_cache.close()
+    analysis_results.close()
+    if search_index is not None:
+        search_index.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+SETLIST_MAX_SONGS = int(env.get("SETLIST_MAX_SONGS", 100))
+SETLIST_CONCURRENCY = int(env.get("SETLIST_CONCURRENCY", 8))
+# How many capo positions /get_chords?capo=true suggests per instrument
+CAPO_OPTIONS = int(env.get("CAPO_OPTIONS", 3))
+
+# A song's chords depend on the user's key, which can change at any time, so by default
+# caches (and a CDN) must revalidate them; the ETag makes that a bodiless 304
+CHORDS_CACHE_CONTROL = env.get("CHORDS_CACHE_CONTROL", "public, no-cache")
+SEARCH_CACHE_CONTROL = env.get("SEARCH_CACHE_CONTROL", "public, max-age=300, stale-while-revalidate=3600")
+# How many of a search's top chord results are fetched into song_cache before they're clicked
+SEARCH_PREFETCH = int(env.get("SEARCH_PREFETCH", 2))
+
+# Connections are opened lazily, on the first query
+storage = create_storage()
+
+# Workers on one host share USER_KEY_INVALIDATION_LOG; elsewhere the TTL bounds staleness.
+# It is unset by default, so with several workers one that didn't take a user's upload
+# serves their old key for up to USER_KEY_CACHE_TTL seconds.
+user_keys = UserKeyCache(
+    storage,
+    max_entries=int(env.get("USER_KEY_CACHE_SIZE", 10000)),
+    ttl=float(env.get("USER_KEY_CACHE_TTL", 5 * 60)),
+    invalidation_log=(
+        InvalidationLog(
+            env["USER_KEY_INVALIDATION_LOG"],
+            max_bytes=int(env.get("USER_KEY_INVALIDATION_LOG_MAX_BYTES", 1024 * 1024)),
+        )
+        if env.get("USER_KEY_INVALIDATION_LOG")
+        else None
+    ),
+)
+
+# Key detection runs on its own process pool, ANALYSIS_WORKERS wide
+analysis_engine = create_engine()
+
+# Key detection results keyed by the upload's content hash and the analysis settings
+analysis_results = TieredCache(
+    max_bytes=int(env.get("ANALYSIS_CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+    ttl=float(env.get("ANALYSIS_CACHE_TTL", 30 * 24 * 60 * 60)),
+    disk_path=env.get("ANALYSIS_CACHE_DIR"),
+)
+# Identical uploads arriving together are analysed once; once every upload waiting on
+# an analysis has been cancelled or timed out, a still-queued analysis is dropped
+analysis_flight = SingleFlight(cancel_abandoned=True)
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Background key detection for /user_recording?mode=async
+job_queue = create_job_queue()
+
+UPLOAD_MODES = ("sync", "async", "stream")
+
+# Song records keyed by the numeric tab id at the end of the song slug
+song_cache = TieredCache(
+    max_bytes=int(env.get("SONG_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+    ttl=float(env.get("SONG_CACHE_TTL", 60 * 60)),
+    stale_ttl=float(env.get("SONG_CACHE_STALE_TTL", 24 * 60 * 60)),
+    disk_path=env.get("SONG_CACHE_DIR"),
 )
 
-cursor = connection.cursor()
+# tab id -> background fetch into song_cache started by a search
+prefetches = {}
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,106 +131,121 @@ app.add_middleware(
     allow_credentials=False
 )
 
+# Chords and diagram lists compress several times over; tiny bodies aren't worth it
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=int(env.get("GZIP_MINIMUM_SIZE", 1024)),
+    compresslevel=int(env.get("GZIP_LEVEL", 6)),
+)
+
+
+async def fetch_song(song_name: str):
+    song_name_number = song_name.split("-")[-1]
 
-def split_chord(chord):
-    # Define a list of base chords, sorted by length in descending order so that chords with the longer names are matched first
-    BASE_CHORDS = sorted(
-        ["C", "Csharp","Db", "D", "Dsharp", "Eb", "E", "F", "Fsharp", "G", "Gb" ,"Gsharp", "Ab", "A", "Asharp", "B", "Bb"],
-        key=len,
-        reverse=True
+    return await song_cache.get_or_fetch(
+        song_name_number, lambda: get_song_data(song_name, song_name_number)
     )
 
-    # Handle the slash chords by taking only the part before the slash
-    chord = chord.split('/')[0]
 
-    # Replace '#' with 'sharp' in the chord name
-    chord = chord.replace('#', 'sharp')
+def prefetch_songs(results):
+    """Starts fetching the top chord results into song_cache, unless they're there or on their way."""
+    top_chords = [result for result in results if result["type"] in CHORD_TYPES][:SEARCH_PREFETCH]
 
-    # Find the base chord and the chord type
-    base_chord = None
-    chord_type = 'major'
+    for result in top_chords:
+        key = str(result["id"])
+        if key not in prefetches and key not in song_cache:
+            prefetches[key] = asyncio.ensure_future(prefetch_song(key, result["url"]))
 
-    # Loop through each base chord to find the base chord in the input chord
-    for base in BASE_CHORDS:
-        if chord.startswith(base):
-            base_chord = base
-            # Anything after the base chord is considered the chord type
-            chord_type = chord[len(base):]
-            break
 
-    # Assign chord type based on the suffix
-    if chord_type in ['m', 'min']:
-        chord_type = 'minor'
-    elif chord_type in ['', 'maj', 'M']:
-        chord_type = 'major'
+async def prefetch_song(key, url):
+    try:
+        await song_cache.get_or_fetch(key, lambda: get_tab(key, url))
+    except Exception:
+        # The click fetches it again, and reports the error if there still is one
+        pass
+    finally:
+        prefetches.pop(key, None)
 
-    # Other chord types like diminished, augmented, etc., could be added here
-    base_chord = base_chord.replace("Csharp", "D").replace("Dsharp", "Eb").replace("Fsharp", "G").replace("Gsharp", "Ab").replace("Asharp", "Bb").replace("Db", "Csharp").replace("Gb", "Fsharp")
 
-    return base_chord, chord_type
+def find_original_key(progressions):
+    for section, chords in progressions.items():
+        if len(chords) > 0:
+            return chords[0]
 
-@app.get("/get_chords")
-async def get_chords(song_name: str = Query(...), username: str = Query(...)):
-    # Ensure the uploaded file is not empty
-    key = None
+    return None
 
-    cursor.execute(f"SELECT user_key FROM user WHERE email='{username}'")
 
-    if not cursor.rowcount == 0:
-        key = cursor.fetchone()[0]
+def progression_chords(progressions):
+    return [chord for chords in progressions.values() for chord in chords]
 
-    song_name_number = song_name.split("-")[-1]
-    song = get_song_data(song_name, song_name_number)
 
+def capo_options(chords, original_key, key, shown_chords):
+    """
+    The easiest capo positions for playing chords in `key`, for guitar and ukulele.
+    shown_chords are the names the response writes for chords, in the same order, and
+    key each option's shapes so clients can look up the chords they display.
+    """
+    if original_key_error(original_key) is not None:
+        return {"guitar": [], "ukulele": []}
 
-    if song is None:
-        return JSONResponse(
-            content={"error": "Song not found. Please try again with a different song."},
-            status_code=400,
-        )
+    labels = dict(zip(chords, shown_chords))
 
-    original_chords = song["store"]["page"]["data"]["tab_view"]["wiki_tab"]["content"]
-   
+    return {
+        instrument: rank_capo_options(chords, original_key, [key], instrument, limit=CAPO_OPTIONS, labels=labels)
+        for instrument in ("guitar", "ukulele")
+    }
 
-    final_chords = original_chords
 
-    progressions = extract_chords(original_chords)
+SONG_NOT_FOUND = {"error": "Song not found. Please try again with a different song."}
 
-    if len(progressions.keys()) == 0:
-        return JSONResponse(
-            content={"error": "Song not found. Please try again with a different song."},
-            status_code=400,
-        )
 
-    original_key = None
+def original_key_error(original_key):
+    """
+    The 400 body for a song that can't be transposed, or None if it can. The first chord
+    sets the key, so a song with no chords, or opening on "N.C.", can't be.
+    """
+    if original_key is None:
+        return SONG_NOT_FOUND
 
+    if not key_regex.match(original_key):
+        return {"error": f"Could not work out the song's key from its first chord {original_key!r}"}
 
-    for section, chords in progressions.items():
-        if len(chords) > 0:
-            original_key = chords[0]
-            break
- 
-    capo_position = 0
-    if 'capo' in song["store"]["page"]["data"]["tab_view"]["meta"]:
-        capo_position = song["store"]["page"]["data"]["tab_view"]["meta"]["capo"]
+    return None
 
-    try:
-        song_name = song["store"]["page"]["data"]["tab_view"]["versions"][0]['song_name']
-        artist_name = song["store"]["page"]["data"]["tab_view"]["versions"][0]['artist_name']
-    except IndexError:
-        song_name = song["store"]["page"]["data"]["tab"]["song_name"]
-        artist_name = song["store"]["page"]["data"]["tab"]["artist_name"]
 
-    # https://tombatossals.github.io/react-chords/media/guitar/chords/Ab/minor/1.svg
-    # Get the URL of all the chord images
-    # IF the chord ends with m, then it is a minor chord. So, remove the m from the chord name and add minor to the URL
-    # Otherwise, add major to the URL
-    # it can also be sus, and anhy other signature
+async def build_song_chords(song_name: str, key, with_capo_options: bool = False):
+    """Fetches a song and writes it in `key`. Returns the /get_chords body and status code."""
+    song = await fetch_song(song_name)
 
-    song_images = []
+    if song is None:
+        return SONG_NOT_FOUND, 400
 
+    return song_chords(song, key, with_capo_options)
+
+
+def song_chords(song, key, with_capo_options: bool = False):
+    """
+    Writes a fetched song in `key`. Returns the /get_chords body and status code.
+    with_capo_options adds the easiest ways to play it with a capo ("play G shapes, capo 3").
+    """
+    original_chords = song.content
+   
+
+    final_chords = original_chords
+
+    progressions = extract_chords(original_chords)
+
+    if len(progressions.keys()) == 0:
+        return SONG_NOT_FOUND, 400
+
+    original_key = find_original_key(progressions)
+    original_chords_played = progression_chords(progressions)
 
     if key:
+        error = original_key_error(original_key)
+        if error is not None:
+            return error, 400
+
         transposed_chords = transpose_progressions(
             progressions, original_key, key
         )
@@ -140,75 +256,293 @@ async def get_chords(song_name: str = Query(...), username: str = Query(...)):
 
         final_chords = updated_chords
 
+        # The diagrams follow the chords written into the transposed text
+        progressions = transposed_chords
+
+    guitar_diagrams, ukulele_diagrams = get_chord_diagrams(progression_chords(progressions))
+
+    content = {
+        "chords": final_chords,
+        "original_key": original_key,
+        "transposed_key": key,
+        "capo_position": song.capo,
+        "song_name": song.song_name,
+        "artist_name": song.artist_name,
+        "guitar_chord_diagrams": guitar_diagrams,
+        "ukulele_chord_diagrams": ukulele_diagrams,
+    }
+
+    if with_capo_options:
+        content["capo_options"] = capo_options(
+            original_chords_played, original_key, key or original_key, progression_chords(progressions)
+        )
 
-    progressions = extract_chords(final_chords)
-    for section, chords in progressions.items():
-        for chord in chords:
+    return content, 200
 
-            chord_name, chord_type = split_chord(chord)
-            
-            chord_url = f"https://tombatossals.github.io/react-chords/media/guitar/chords/{chord_name}/{chord_type}/1.svg"
-            
-            object = {
-                "name": chord,
-                "url": chord_url
-            }   
 
-            song_images.append(object)
+@app.get("/get_chords")
+async def get_chords(
+    request: Request, song_name: str = Query(...), username: str = Query(...), capo: bool = Query(False)
+):
+    key = await user_keys.get(username)
+    song = await fetch_song(song_name)
 
-    
-    # Get the unique values of song_images list
-    song_images = [i for n, i in enumerate(song_images) if i not in song_images[n + 1:]]
+    if song is None:
+        return JSONResponse(content=SONG_NOT_FOUND, status_code=400)
+
+    # Everything the body depends on, so a matching If-None-Match skips the transposition
+    etag = make_etag(song.tab_id, content_version(song.content), key, "capo" if capo else "chords")
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, CHORDS_CACHE_CONTROL)
+
+    content, status_code = song_chords(song, key, with_capo_options=capo)
+
+    if status_code != 200:
+        return JSONResponse(content=content, status_code=status_code)
+
+    return JSONResponse(
+        content=content,
+        status_code=status_code,
+        headers={"ETag": etag, "Cache-Control": CHORDS_CACHE_CONTROL},
+    )
+
+
+@app.get("/get_setlist_chords")
+async def get_setlist_chords(song_names: List[str] = Query(...), username: str = Query(...)):
+    """
+    Fetches and transposes a whole setlist concurrently, streaming one NDJSON line per
+    song as it completes. Each line carries the song's index in song_names, the requested
+    slug, a status code and either the /get_chords body or an error, so one bad song
+    never fails the batch.
+    """
+    if len(song_names) > SETLIST_MAX_SONGS:
+        return JSONResponse(
+            content={"error": f"A setlist can have at most {SETLIST_MAX_SONGS} songs"},
+            status_code=400,
+        )
+
+    key = await user_keys.get(username)
+
+    limit = asyncio.Semaphore(SETLIST_CONCURRENCY)
+
+    async def process(index, song_name):
+        async with limit:
+            try:
+                content, status_code = await build_song_chords(song_name, key)
+            except Exception as e:
+                content, status_code = {"error": f"Could not load song: {e}"}, 500
+
+        return {"index": index, "requested_song": song_name, "status_code": status_code, **content}
+
+    async def stream():
+        tasks = [asyncio.ensure_future(process(i, name)) for i, name in enumerate(song_names)]
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # The client went away: stop working on the rest of the setlist
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/get_chords_all_keys")
+async def get_chords_all_keys(song_name: str = Query(...), keys: List[str] = Query(None)):
+    """
+    Returns the song written out in every key (or just `keys`) from a single fetch.
+    Diagrams are listed once for all keys; each key names the chords it uses.
+    """
+    song = await fetch_song(song_name)
+
+    if song is None:
+        return JSONResponse(content=SONG_NOT_FOUND, status_code=400)
+
+    tab = compile_tab(song.content)
+    progressions = tab.progressions()
+    original_key = find_original_key(progressions)
+
+    error = original_key_error(original_key)
+    if error is not None:
+        return JSONResponse(content=error, status_code=400)
+
+    if keys:
+        invalid_keys = [key for key in keys if not is_key(key)]
+        if invalid_keys:
+            return JSONResponse(
+                content={"error": f"Invalid key requested: {', '.join(invalid_keys)}"},
+                status_code=400,
+            )
+    else:
+        try:
+            minor = Chord.parse(original_key).quality == "m"
+        except Exception:
+            minor = False
+
+        keys = get_all_keys(minor=minor)
+
+    replacements = transpose_to_keys(progression_chords(progressions), original_key, keys)
+
+    songs = {}
+    all_chords = []
+
+    for key, key_replacements in zip(keys, replacements):
+        chord_names = list(dict.fromkeys(key_replacements[chord] for chord in progression_chords(progressions)))
+        all_chords.extend(chord_names)
+
+        songs[key] = {
+            "chords": tab.rewrite(key_replacements),
+            "transposed_key": key,
+            "chord_names": chord_names,
+        }
+
+    guitar_diagrams, ukulele_diagrams = get_chord_diagrams(all_chords)
 
     return JSONResponse(
         content={
-            "chords": final_chords,
             "original_key": original_key,
-            "transposed_key": key,
-            "capo_position": capo_position,
-            "song_name": song_name,
-            "artist_name": artist_name,
-            "guitar_chord_diagrams": song_images,
-            "ukulele_chord_diagrams": [
-                {
-                    "name": chord["name"],
-                    "url": chord["url"].replace("guitar", "ukulele", 1),
-                }
-                for chord in song_images
-            ]
+            "capo_position": song.capo,
+            "song_name": song.song_name,
+            "artist_name": song.artist_name,
+            "keys": songs,
+            "guitar_chord_diagrams": guitar_diagrams,
+            "ukulele_chord_diagrams": ukulele_diagrams,
         },
         status_code=200,
     )
 
 
 @app.get("/search_results")
-async def search_results(song_name: str = Query(...)):
-    results = search(
-        song_name
+async def search_results(request: Request, song_name: str = Query(...)):
+    results, upstream = await search_with_source(song_name)
+
+    # Only upstream answers start prefetches: the index answers repeated and partial
+    # queries, like each keystroke in a search box, which would otherwise fetch on every one
+    if upstream:
+        prefetch_songs(results)
+
+    new_results = [
+        {
+            "index": i,
+            "artist": result["artist"],
+            "song": result["song"],
+            "url": result["url"].replace(UG_TABS_PREFIX, ""),
+            "id": str(result["id"]),
+            "type": result["type"],
+            "rating": result["rating"],
+            "votes": result["votes"],
+        }
+        for i, result in enumerate(results)
+    ]
+
+    etag = make_etag("search", song_name, new_results)
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, SEARCH_CACHE_CONTROL)
+
+    return JSONResponse(
+        content={"results": new_results},
+        status_code=200,
+        headers={"ETag": etag, "Cache-Control": SEARCH_CACHE_CONTROL},
     )
 
-    results = list(results)
-
-    new_results = []
-
-    for i, result in enumerate(results):
-        result = result.replace("https://tabs.ultimate-guitar.com/tab/", "")
-        result = result.split("/")
-        new_results.append(
-            {
-                "index": i,
-                "artist": result[0],
-                "song": result[1].replace("-", " ").title(),
-                "url": results[i].replace("https://tabs.ultimate-guitar.com/tab/", ""),
-                "id": result[1].split("-")[-1],
-            }
+
+@app.get("/cache_stats")
+async def cache_stats():
+    return JSONResponse(
+        content={
+            "songs": song_cache.stats(),
+            "user_keys": user_keys.stats(),
+            "analysis": analysis_results.stats(),
+            "search_index": {"tabs": await search_index.run(search_index.count)} if search_index else None,
+        },
+        status_code=200,
+    )
+
+
+def stream_summary(result):
+    return {"key": result["key"], "confidence": result["confidence"], "seconds": result["seconds"]}
+
+
+async def read_upload(file: UploadFile):
+    """Reads an upload in chunks, hashing it on the way in. Returns (data, sha256 hex digest)."""
+    digest = hashlib.sha256()
+    chunks = []
+
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        chunks.append(chunk)
+
+    return b"".join(chunks), digest.hexdigest()
+
+
+async def detect_user_key(
+    data: bytes,
+    suffix: str,
+    user_email: str,
+    streaming: bool = False,
+    tier: str = ANALYSIS_TIER,
+    digest: str = None,
+):
+    """
+    Analyses a recording on the process pool and stores the detected key for the user.
+    Streaming detection stops as soon as the key is stable and also reports how sure it
+    is and how many seconds of audio it needed. Recordings seen before, by content hash,
+    are answered from analysis_results without being analysed again.
+    """
+    analyse = analyse_recording_streaming if streaming else analyse_recording
+
+    if digest is None:
+        digest = hashlib.sha256(data).hexdigest()
+    cache_key = result_cache_key(digest, suffix, streaming, tier)
+
+    def analyse_upload():
+        # An analysis that can't be stopped any more is still cached for the next upload
+        return analysis_engine.submit(
+            analyse, data, suffix, tier, salvage=lambda result: analysis_results.set(cache_key, result)
         )
 
-    return JSONResponse(content={"results": new_results}, status_code=200)
+    result = await analysis_results.get_or_fetch(
+        cache_key, lambda: analysis_flight.do(cache_key, analyse_upload)
+    )
+
+    if result["key"] is None:
+        raise ValueError("No key could be detected in the recording")
+
+    await user_keys.set(user_email, result["key"])
+
+    if streaming:
+        return stream_summary(result)
+
+    return {"key": result["key"]}
 
 
 @app.post("/user_recording")
-async def upload_song(file: UploadFile = UploadFile(...), user_email: str = Query(...)):
+async def upload_song(
+    file: UploadFile = UploadFile(...),
+    user_email: str = Query(...),
+    mode: str = Query("sync"),
+    tier: str = Query(ANALYSIS_TIER),
+):
+    """
+    Detects the key of a recording and stores it for the user. mode=sync answers with
+    the key, mode=stream also with how sure it is, and mode=async answers 202 with a job
+    to poll at /jobs/{job_id}.
+
+    Jobs live in the worker process that accepted them (JOB_BACKEND=inprocess is the
+    only backend), so mode=async needs a single worker, or sticky routing of a client's
+    /jobs requests to the same worker; elsewhere polls answer 404.
+    """
+    if mode not in UPLOAD_MODES:
+        return JSONResponse(
+            content={"error": "mode must be one of " + ", ".join(UPLOAD_MODES)}, status_code=400
+        )
+
     # Ensure the uploaded file is not empty
     if not file.filename:
         return JSONResponse(content={"error": "No file provided"}, status_code=400)
@@ -219,73 +553,174 @@ async def upload_song(file: UploadFile = UploadFile(...), user_email: str = Quer
             content={"error": "Only mp3 files are supported"}, status_code=400
         )
     
-    with open("recording.wav", "wb") as buffer:
-        buffer.write(file.file.read())
-
-    y, sr = librosa.load('recording.wav')
-    y_harmonic, y_percussive = librosa.effects.hpss(y)
-    unebarque_fsharp_maj = Tonal_Fragment(y_harmonic, sr, tend=22)
+    if tier not in QUALITY_TIERS:
+        return JSONResponse(
+            content={"error": "tier must be one of " + ", ".join(QUALITY_TIERS)}, status_code=400
+        )
 
+    # Each upload is analysed from its own buffer, so concurrent uploads can't clobber each other
+    data, digest = await read_upload(file)
+    suffix = "." + file.filename.rsplit(".", 1)[-1]
 
-    cursor.execute(
-        f"SELECT user_key FROM user WHERE email='{user_email}'"
+    busy = JSONResponse(
+        content={"error": "Too many recordings are being analysed, please try again shortly"},
+        status_code=503,
+        headers={"Retry-After": "5"},
     )
-    result = cursor.fetchone()
 
-    if result is None:
-        cursor.execute(
-            f"INSERT INTO user (email, user_key) VALUES ('{user_email}', '{unebarque_fsharp_maj.get_max_key()}')"
-        )
-    else:
-        cursor.execute(
-            f"UPDATE user SET user_key='{unebarque_fsharp_maj.get_max_key()}' WHERE email='{user_email}'"
+    if mode == "async":
+        try:
+            job = job_queue.submit(lambda: detect_user_key(data, suffix, user_email, tier=tier, digest=digest))
+        except JobQueueFull:
+            return busy
+
+        return JSONResponse(content=job.to_dict(), status_code=202)
+
+    try:
+        result = await detect_user_key(
+            data, suffix, user_email, streaming=mode == "stream", tier=tier, digest=digest
         )
+    except AnalysisQueueFull:
+        return busy
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=422)
+
+    return JSONResponse(content=result, status_code=200)
+
+
+@app.websocket("/user_recording/stream")
+async def stream_recording(
+    websocket: WebSocket,
+    user_email: str = Query(...),
+    sample_rate: int = Query(...),
+    tier: str = Query(ANALYSIS_TIER),
+):
+    """
+    Detects the user's key while they are still recording. The client sends mono
+    little-endian float32 PCM at sample_rate in binary messages, and "end" when it stops;
+    after every analysed chunk it gets {key, confidence, seconds, done}. Once the key is
+    stable the server stores it, sends the final result with done=true and closes.
+    """
+    await websocket.accept()
+
+    if not 8000 <= sample_rate <= 192000:
+        await websocket.close(code=1008, reason="Unsupported sample rate")
+        return
+
+    if tier not in QUALITY_TIERS:
+        await websocket.close(code=1008, reason="Unsupported tier")
+        return
+
+    analysis = StreamingAnalysis(analysis_engine, sample_rate, tier)
 
-    connection.commit()
+    try:
+        while True:
+            message = await websocket.receive()
 
-    return JSONResponse(
-        content={"key": unebarque_fsharp_maj.get_max_key()}, status_code=200
-    )
+            if message["type"] == "websocket.disconnect":
+                return
+
+            if message.get("text") == "end":
+                break
+
+            if message.get("bytes"):
+                # 1007: the data isn't float32 samples
+                if len(message["bytes"]) % 4:
+                    await websocket.close(code=1007, reason="Audio frames must hold whole float32 samples")
+                    return
+
+                seconds = analysis.fragment.seconds
+                done = await analysis.feed(np.frombuffer(message["bytes"], dtype="<f4"))
+
+                if done:
+                    break
+
+                if analysis.fragment.seconds != seconds:
+                    await websocket.send_json({**stream_summary(analysis.fragment.result()), "done": False})
+
+        result = await analysis.finish()
+    except AnalysisQueueFull:
+        # 1013: try again later
+        await websocket.close(code=1013, reason="Too many recordings are being analysed")
+        return
+
+    if result["key"] is not None:
+        await user_keys.set(user_email, result["key"])
+
+    await websocket.send_json({**stream_summary(result), "done": True})
+    await websocket.close()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+
+    if job is None:
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+
+    return JSONResponse(content=job.to_dict(), status_code=200)
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = job_queue.get(job_id)
+
+    if job is None:
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+
+    if job.status == SUCCEEDED:
+        return JSONResponse(content=job.result, status_code=200)
+
+    if job.finished_at is None:
+        # Not done yet, poll again later
+        return JSONResponse(content=job.to_dict(), status_code=202)
+
+    return JSONResponse(content=job.to_dict(), status_code=409)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = job_queue.get(job_id)
+
+    if job is None:
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+
+    if not job_queue.cancel(job_id):
+        return JSONResponse(content={"error": "Job already finished"}, status_code=409)
+
+    return JSONResponse(content={"job_id": job_id, "cancelled": True}, status_code=200)
 
 
 @app.get("/get_user_key")
 async def get_user_key(user_email: str):
-    cursor.execute(f"SELECT user_key FROM user WHERE email='{user_email}'")
+    key = await user_keys.get(user_email)
 
-    if cursor.rowcount == 0:
+    if key is None:
         return JSONResponse(content={"error": "User not found"}, status_code=400)
 
-    return JSONResponse(content={"key": cursor.fetchone()[0]}, status_code=200)
+    return JSONResponse(content={"key": key}, status_code=200)
 
 
 @app.get("/save_song")
 async def save_song(song_url: str, song_name: str, user_email: str):
-    cursor.execute(f"SELECT user_key FROM user WHERE email='{user_email}'")
+    key = await user_keys.get(user_email)
 
-    if cursor.rowcount == 0:
+    if key is None:
         return JSONResponse(content={"error": "User not found"}, status_code=400)
 
-    key = cursor.fetchone()[0]
-
     # Insert the song into the database if it doesn't already exist
-    cursor.execute(f"SELECT * FROM songs WHERE song_url='{song_url}' AND email='{user_email}'")
-
-    if cursor.rowcount == 0:
-        cursor.execute(f"INSERT INTO songs (song_name, song_url, email) VALUES ('{song_name}', '{song_url}', '{user_email}')")
-        connection.commit()
+    await storage.save_song(song_name, song_url, user_email)
 
     return JSONResponse(content={"key": key}, status_code=200)
 
 
 @app.get("/get_saved_songs")
 async def get_saved_songs(user_email: str):
-    cursor.execute(f"SELECT * FROM songs WHERE email='{user_email}'")
+    songs = await storage.get_saved_songs(user_email)
 
-    if cursor.rowcount == 0:
+    if len(songs) == 0:
         return JSONResponse(content={"error": "User not found"}, status_code=400)
 
-    songs = cursor.fetchall()
-
     songs = [
         {
             "song_name": song[0],
@@ -0,0 +1,74 @@
+"""
+Fills the local search index from saved pages, without going upstream: Ultimate
+Guitar search pages, tab pages, raw js-store JSON like song.json, or plain lists of
+tab links, one per line. Directories are walked recursively.
+
+    python scripts/ingest_search_index.py test.html song.json crawl/ [--db search_index.db]
+
+The default database is SEARCH_INDEX_PATH, the one the API reads.
+"""
+import argparse
+import re
+import sys
+from os import environ as env
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from helpers import extract_store, search_page_results  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+from song import Song  # noqa: E402
+
+# Tab links wherever they appear, whether in markup, escaped JSON or a plain list
+TAB_LINK = re.compile(r"https://tabs\.ultimate-guitar\.com/tab/[\w%.-]+/[\w%.-]+-\d+")
+
+
+def read_song(path, text):
+    """The tab a tab page or js-store file holds, or None for anything else."""
+    try:
+        if path.suffix == ".json":
+            return Song.from_json(text)
+        if 'class="js-store"' in text:
+            return Song.from_json(extract_store(text))
+    except Exception:
+        return None
+
+    return None
+
+
+def input_files(paths):
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob("*") if p.is_file())
+        else:
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--db", default=env.get("SEARCH_INDEX_PATH", "search_index.db"))
+    args = parser.parse_args()
+
+    index = SearchIndex(args.db)
+    results = links = songs = 0
+
+    for path in input_files(args.paths):
+        text = path.read_text(errors="replace")
+
+        # Search pages first, so their names and ratings win over the bare links. Only a
+        # store's own results are taken as results: tab pages link related tabs too
+        results += index.add_results(search_page_results(text))
+        links += index.add_links(dict.fromkeys(TAB_LINK.findall(text)))
+        songs += index.add_song(read_song(path, text))
+
+    print(
+        f"{results} search results, {links} links and {songs} tab pages from {args.paths};"
+        f" {index.count()} tabs in {args.db}"
+    )
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
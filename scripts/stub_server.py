@@ -0,0 +1,81 @@
+"""
+Local stand-in for Ultimate Guitar, serving the checked-in fixtures.
+
+    python scripts/stub_server.py --port 8001 --delay 0.5
+
+    UG_SEARCH_URL=http://127.0.0.1:8001/search.php \
+    UG_TABS_URL=http://127.0.0.1:8001/tab/ python main.py
+
+/search.php returns test.html and every /tab/... path returns a tab page
+whose js-store holds song.json.
+"""
+import argparse
+import html
+import json
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def build_tab_page(store):
+    data_content = html.escape(json.dumps(store, separators=(",", ":")), quote=True)
+
+    return (
+        "<!doctype html><html><head><title>Stub tab</title></head><body>"
+        f'<div class="js-store" data-content="{data_content}"></div>'
+        "</body></html>"
+    )
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def __init__(self, *args, pages, delay, **kwargs):
+        self.pages = pages
+        self.delay = delay
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+
+        if self.path.startswith("/search.php"):
+            body = self.pages["search"]
+        elif self.path.startswith("/tab/"):
+            body = self.pages["tab"]
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to stall every response")
+    args = parser.parse_args()
+
+    pages = {
+        "search": (ROOT / "test.html").read_bytes(),
+        "tab": build_tab_page(json.loads((ROOT / "song.json").read_text())).encode(),
+    }
+
+    server = ThreadingHTTPServer(
+        (args.host, args.port), partial(StubHandler, pages=pages, delay=args.delay)
+    )
+    print(f"Serving stub Ultimate Guitar on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from os import environ as env
+
+from fetcher import UG_TABS_PREFIX
+from song import result_rank
+
+# Tabs whose names and ratings were last written from upstream this long ago drop out
+# of lookups, so searches for them go upstream again and refresh them
+SEARCH_INDEX_TTL = float(env.get("SEARCH_INDEX_TTL", 7 * 24 * 60 * 60))
+# For this long after a query was answered upstream, the index answers it even with
+# fewer results than a full page
+SEARCH_INDEX_QUERY_TTL = float(env.get("SEARCH_INDEX_QUERY_TTL", 24 * 60 * 60))
+# How often writes delete the expired tabs and queries
+EXPIRE_INTERVAL = 60 * 60
+# How alike (difflib ratio) an unknown query word and a known word must be to swap them
+SEARCH_INDEX_MIN_SIMILARITY = float(env.get("SEARCH_INDEX_MIN_SIMILARITY", 0.75))
+# How many known words sharing trigrams with an unknown one are compared to it
+FUZZY_CANDIDATES = 50
+# How many of the best text matches are ordered by kind and rating for a lookup
+RANKED_CANDIDATES = 50
+
+# The words before the tab id in a UG slug that name the kind of tab, and the type
+# search results give that kind
+TAB_TYPES = {
+    "chords": "Chords",
+    "tabs": "Tabs",
+    "bass": "Bass Tabs",
+    "ukulele": "Ukulele Chords",
+    "guitar-pro": "Pro",
+    "power": "Power",
+    "drums": "Drums",
+    "video": "Video",
+    "official": "Official",
+}
+
+# tabs holds one row per tab and tab_words indexes its names by word, with prefixes.
+# words is the vocabulary of those names, indexed by trigram to correct misspellings.
+# The triggers keep the FTS5 tables in step with their content tables.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tabs (
+    tab_id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    song TEXT NOT NULL,
+    type TEXT NOT NULL,
+    rating REAL NOT NULL DEFAULT 0,
+    votes INTEGER NOT NULL DEFAULT 0,
+    hits INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS tab_words USING fts5(
+    artist, song, type, tab_id,
+    content='tabs', content_rowid='tab_id', prefix='2 3 4', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS tabs_insert AFTER INSERT ON tabs BEGIN
+    INSERT INTO tab_words (rowid, artist, song, type, tab_id)
+        VALUES (new.tab_id, new.artist, new.song, new.type, new.tab_id);
+END;
+CREATE TRIGGER IF NOT EXISTS tabs_delete AFTER DELETE ON tabs BEGIN
+    INSERT INTO tab_words (tab_words, rowid, artist, song, type, tab_id)
+        VALUES ('delete', old.tab_id, old.artist, old.song, old.type, old.tab_id);
+END;
+CREATE TRIGGER IF NOT EXISTS tabs_update AFTER UPDATE OF artist, song, type ON tabs
+WHEN old.artist IS NOT new.artist OR old.song IS NOT new.song OR old.type IS NOT new.type BEGIN
+    INSERT INTO tab_words (tab_words, rowid, artist, song, type, tab_id)
+        VALUES ('delete', old.tab_id, old.artist, old.song, old.type, old.tab_id);
+    INSERT INTO tab_words (rowid, artist, song, type, tab_id)
+        VALUES (new.tab_id, new.artist, new.song, new.type, new.tab_id);
+END;
+CREATE INDEX IF NOT EXISTS tabs_updated ON tabs (updated);
+CREATE TABLE IF NOT EXISTS words (word TEXT NOT NULL UNIQUE);
+CREATE VIRTUAL TABLE IF NOT EXISTS word_trigrams USING fts5(
+    word, content='words', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS words_insert AFTER INSERT ON words BEGIN
+    INSERT INTO word_trigrams (rowid, word) VALUES (new.rowid, new.word);
+END;
+CREATE TABLE IF NOT EXISTS queries (query TEXT PRIMARY KEY, answered REAL NOT NULL);
+"""
+
+# Names taken from a link's slug never overwrite the ones a search result or tab page gave.
+# A tab page has no rating, so fetching a known tab leaves its age alone
+INSERT_LINK = """
+INSERT INTO tabs (tab_id, url, artist, song, type, updated) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (tab_id) DO NOTHING
+"""
+UPSERT_RESULT = """
+INSERT INTO tabs (tab_id, url, artist, song, type, rating, votes, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (tab_id) DO UPDATE SET
+    url=excluded.url, artist=excluded.artist, song=excluded.song, type=excluded.type,
+    rating=excluded.rating, votes=excluded.votes, updated=excluded.updated
+"""
+UPSERT_SONG = """
+INSERT INTO tabs (tab_id, url, artist, song, type, hits, updated) VALUES (?, ?, ?, ?, ?, 1, ?)
+ON CONFLICT (tab_id) DO UPDATE SET
+    url=excluded.url, artist=excluded.artist, song=excluded.song, hits=hits + 1
+"""
+INSERT_WORD = "INSERT OR IGNORE INTO words (word) VALUES (?)"
+SELECT_URL = "SELECT url FROM tabs WHERE tab_id=?"
+COUNT_TABS = "SELECT count(*) FROM tabs"
+UPSERT_QUERY = """
+INSERT INTO queries (query, answered) VALUES (?, ?)
+ON CONFLICT (query) DO UPDATE SET answered=excluded.answered
+"""
+SELECT_ANSWERED = "SELECT 1 FROM queries WHERE query=? AND answered >= ?"
+DELETE_EXPIRED_TABS = "DELETE FROM tabs WHERE updated < ?"
+DELETE_EXPIRED_QUERIES = "DELETE FROM queries WHERE answered < ?"
+
+# bm25 weights artist, song, type, tab_id. Scores within 0.1 of each other count as
+# equally good matches, which are then ordered like search results
+SELECT_WORDS = """
+SELECT round(bm25(tab_words, 2.0, 3.0, 0.5, 10.0), 1) AS relevance, tabs.hits,
+    tabs.tab_id, tabs.url, tabs.artist, tabs.song, tabs.type, tabs.rating, tabs.votes
+FROM tab_words JOIN tabs ON tabs.tab_id = tab_words.rowid
+WHERE tab_words MATCH ? AND tabs.updated >= ?
+ORDER BY relevance, tabs.hits DESC, tabs.tab_id
+LIMIT ?
+"""
+RESULT_COLUMNS = ("id", "url", "artist", "song", "type", "rating", "votes")
+# Whether some word of the vocabulary starts with the given one
+SELECT_WORD_PREFIX = "SELECT 1 FROM words WHERE word >= ? AND word < ? LIMIT 1"
+SELECT_SIMILAR_WORDS = """
+SELECT words.word FROM word_trigrams JOIN words ON words.rowid = word_trigrams.rowid
+WHERE word_trigrams MATCH ?
+ORDER BY bm25(word_trigrams)
+LIMIT ?
+"""
+
+_words = re.compile(r"\w+")
+
+
+def link_result(url):
+    """
+    A search result for a tab link like
+    https://tabs.ultimate-guitar.com/tab/harry-styles/watermelon-sugar-chords-2958225,
+    named after its slug and unrated, or None when the link does not end in a tab id.
+    """
+    path = url[len(UG_TABS_PREFIX):] if url.startswith(UG_TABS_PREFIX) else url
+    parts = path.strip("/").split("/")
+    if len(parts) != 2:
+        return None
+
+    artist, slug = parts
+    title, _, tab_id = slug.rpartition("-")
+    if not tab_id.isdigit():
+        return None
+
+    tab_type = ""
+    for type_slug, name in TAB_TYPES.items():
+        if title.endswith("-" + type_slug):
+            title = title[: -len(type_slug) - 1]
+            tab_type = name
+            break
+
+    return {
+        "id": int(tab_id),
+        "url": url,
+        "artist": artist.replace("-", " "),
+        "song": title.replace("-", " "),
+        "type": tab_type,
+        "rating": 0,
+        "votes": 0,
+    }
+
+
+def normalise_query(term):
+    """The query words of term, lowercased and single spaced: "Harry  Styles!" -> "harry styles"."""
+    return " ".join(_words.findall(term.lower()))
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def prefix_query(words):
+    """Every word as a prefix, in any column: "harr"* "wat"*"""
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def trigram_query(grams):
+    return " OR ".join(f'"{gram}"' for gram in sorted(grams))
+
+
+def vocabulary(names):
+    """The distinct words of some (artist, song, type) tuples, as rows for INSERT_WORD."""
+    words = {}
+    for fields in names:
+        for field in fields:
+            words.update(dict.fromkeys(_words.findall(field.lower())))
+
+    return [(word,) for word in words]
+
+
+class SearchIndex(object):
+    """
+    A local full-text index of the tabs seen so far, so searches for known songs don't
+    go upstream. Lookups match every query word as a prefix of a word in the artist,
+    title or tab type, or the tab id, ranked by bm25. When nothing matches that way,
+    query words no name starts with are replaced by the most similar known word, found
+    through the vocabulary's trigrams, and the lookup is tried once more.
+
+    Tabs expire `ttl` seconds after a search result last wrote their names and ratings.
+    Queries answered upstream are remembered for `query_ttl` seconds, so callers can
+    tell a short answer for them from a partial one.
+
+    All statements run on one connection on a single thread, so they never block the
+    event loop and never contend with each other within the process.
+    """
+
+    def __init__(self, path, ttl=SEARCH_INDEX_TTL, query_ttl=SEARCH_INDEX_QUERY_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.query_ttl = query_ttl
+        self._expired_at = 0.0
+        self._connection = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+
+    def _connect(self):
+        with self._lock:
+            if self._connection is None:
+                connection = sqlite3.connect(
+                    self.path, check_same_thread=False, uri=self.path.startswith("file:")
+                )
+                # Several API processes may share the file: readers don't wait on writers
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                connection.execute("PRAGMA busy_timeout=5000")
+                connection.executescript(SCHEMA)
+                self._connection = connection
+
+        return self._connection
+
+    async def run(self, work, *args):
+        """Runs one of the index's methods on the index thread."""
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self._executor, work, *args)
+
+    def _expire(self, connection, now):
+        """Deletes expired tabs and queries, at most every EXPIRE_INTERVAL seconds."""
+        if now - self._expired_at < EXPIRE_INTERVAL:
+            return
+
+        connection.execute(DELETE_EXPIRED_TABS, (now - self.ttl,))
+        connection.execute(DELETE_EXPIRED_QUERIES, (now - self.query_ttl,))
+        self._expired_at = now
+
+    def _answered_upstream(self, connection, query, now):
+        if query is not None:
+            connection.execute(UPSERT_QUERY, (normalise_query(query), now))
+
+    def add_links(self, links, query=None):
+        """
+        Adds the tabs behind bare tab links, named after their slugs. query is the
+        search they answered upstream, if any.
+        """
+        now = time.time()
+        rows = []
+        for url in links:
+            result = link_result(url)
+            if result is not None:
+                rows.append((result["id"], url, result["artist"], result["song"], result["type"], now))
+
+        connection = self._connect()
+        with connection:
+            self._expire(connection, now)
+            connection.executemany(INSERT_LINK, rows)
+            connection.executemany(INSERT_WORD, vocabulary(row[2:5] for row in rows))
+            self._answered_upstream(connection, query, now)
+
+        return len(rows)
+
+    def add_results(self, results, query=None):
+        """
+        Adds or updates the tabs of parsed search results, with their names and ratings.
+        query is the search they answered upstream, if any.
+        """
+        now = time.time()
+        rows = [
+            (int(r["id"]), r["url"], r["artist"], r["song"], r["type"], r["rating"], r["votes"], now)
+            for r in results
+        ]
+
+        connection = self._connect()
+        with connection:
+            self._expire(connection, now)
+            connection.executemany(UPSERT_RESULT, rows)
+            connection.executemany(INSERT_WORD, vocabulary(row[2:5] for row in rows))
+            self._answered_upstream(connection, query, now)
+
+        return len(rows)
+
+    def add_song(self, song):
+        """Adds or renames a fetched tab, under the names its own page gives it."""
+        if song is None or song.tab_id is None or not song.tab_url:
+            return False
+
+        result = link_result(song.tab_url)
+        tab_type = result["type"] if result is not None else ""
+        names = (song.artist_name or "", song.song_name or "", tab_type)
+
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            self._expire(connection, now)
+            connection.execute(UPSERT_SONG, (int(song.tab_id), song.tab_url, *names, now))
+            connection.executemany(INSERT_WORD, vocabulary([names]))
+
+        return True
+
+    def url_for(self, tab_id):
+        """The link of a known tab, or None."""
+        if not str(tab_id).isdigit():
+            return None
+
+        row = self._connect().execute(SELECT_URL, (int(tab_id),)).fetchone()
+        return row[0] if row else None
+
+    def answered(self, term):
+        """Whether term was answered upstream in the last query_ttl seconds."""
+        row = self._connect().execute(
+            SELECT_ANSWERED, (normalise_query(term), time.time() - self.query_ttl)
+        ).fetchone()
+
+        return row is not None
+
+    def lookup(self, term, limit=5):
+        """
+        Search results for the best matches of term among the tabs that haven't expired:
+        the closest text matches, each group of equally close ones ordered by kind of tab
+        and rating.
+        """
+        words = _words.findall(term.lower())
+        if not words:
+            return []
+
+        connection = self._connect()
+
+        links = self._lookup_words(connection, words, limit)
+        if links:
+            return links
+
+        corrected = [self._correct(connection, word) for word in words]
+        if None in corrected or corrected == words:
+            return []
+
+        return self._lookup_words(connection, corrected, limit)
+
+    def _lookup_words(self, connection, words, limit):
+        ranked = []
+        rows = connection.execute(SELECT_WORDS, (prefix_query(words), time.time() - self.ttl, RANKED_CANDIDATES))
+        for relevance, hits, *columns in rows:
+            result = dict(zip(RESULT_COLUMNS, columns))
+            ranked.append(((relevance, result_rank(result), -hits), result))
+
+        ranked.sort(key=lambda item: item[0])
+        return [result for _, result in ranked[:limit]]
+
+    def _correct(self, connection, word):
+        """word if some name has a word starting with it, else the closest known word or None."""
+        if word.isdigit() or connection.execute(SELECT_WORD_PREFIX, (word, word + "\U0010ffff")).fetchone():
+            return word
+
+        grams = trigrams(word)
+        if not grams:
+            return None
+
+        best, best_ratio = None, 0.0
+        for (candidate,) in connection.execute(SELECT_SIMILAR_WORDS, (trigram_query(grams), FUZZY_CANDIDATES)):
+            ratio = SequenceMatcher(None, word, candidate).ratio()
+            if ratio > best_ratio:
+                best, best_ratio = candidate, ratio
+
+        return best if best_ratio >= SEARCH_INDEX_MIN_SIMILARITY else None
+
+    def count(self):
+        return self._connect().execute(COUNT_TABS).fetchone()[0]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def create_search_index():
+    """The SearchIndex at SEARCH_INDEX_PATH, or None when it is set empty to turn the index off."""
+    path = env.get("SEARCH_INDEX_PATH", "search_index.db")
+
+    return SearchIndex(path) if path else None
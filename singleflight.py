@@ -0,0 +1,44 @@
+import asyncio
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls for the same key into one in-flight operation.
+
+    Every caller waiting on a key receives the same result, or the same exception.
+    The operation is shielded so a caller that disconnects does not cancel it for the others.
+    With cancel_abandoned, it is cancelled once every caller waiting on it has been.
+    """
+
+    def __init__(self, cancel_abandoned=False):
+        self.cancel_abandoned = cancel_abandoned
+        self._calls = {}
+        self._waiters = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key, fetch):
+        future = self._calls.get(key)
+
+        if future is None:
+            future = asyncio.ensure_future(fetch())
+            self._calls[key] = future
+            self._waiters[key] = 0
+            future.add_done_callback(lambda _: self._forget(key, future))
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self.cancel_abandoned and self._waiters[key] == 1 and not future.done():
+                future.cancel()
+            raise
+        finally:
+            if self._calls.get(key) is future:
+                self._waiters[key] -= 1
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+            del self._waiters[key]
@@ -0,0 +1,212 @@
+import json
+import re
+from json.decoder import scanstring
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+_string = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_container_token = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\]{}]', re.DOTALL)
+_scalar = re.compile(r"[^,\]}\s]*")
+
+# Paths into the UG store that get_chords reads. True marks a value to decode,
+# int keys select list items; everything else is skipped without being decoded.
+TAB_FIELDS = {"id": True, "song_name": True, "artist_name": True, "tab_url": True}
+STORE_SPEC = {
+    "store": {
+        "page": {
+            "data": {
+                "tab_view": {
+                    "wiki_tab": {"content": True},
+                    "meta": {"capo": True},
+                    "versions": {0: TAB_FIELDS},
+                },
+                "tab": TAB_FIELDS,
+            }
+        }
+    }
+}
+
+# Kinds of tab in the order results are listed, the ones /get_chords reads first
+TAB_TYPE_ORDER = ("Chords", "Ukulele Chords", "Tabs", "Bass Tabs", "Pro", "Power", "Drums", "Video")
+CHORD_TYPES = ("Chords", "Ukulele Chords")
+
+# Ratings are pulled towards RATING_PRIOR as if every tab had RATING_PRIOR_VOTES more
+# votes of it, so a 5.0 from two votes doesn't outrank a 4.9 from two thousand
+RATING_PRIOR = 4.0
+RATING_PRIOR_VOTES = 10
+
+
+class Song(object):
+    """The handful of fields the chord endpoints use from a UG tab page."""
+
+    __slots__ = ("tab_id", "tab_url", "song_name", "artist_name", "capo", "content")
+
+    def __init__(self, tab_id, tab_url, song_name, artist_name, capo, content):
+        self.tab_id = tab_id
+        self.tab_url = tab_url
+        self.song_name = song_name
+        self.artist_name = artist_name
+        self.capo = capo
+        self.content = content
+
+    def __repr__(self):
+        return f"Song({self.tab_id!r}, {self.artist_name!r}, {self.song_name!r})"
+
+    @classmethod
+    def from_store(cls, store):
+        """Builds a Song from an already decoded store dict."""
+        return cls._from_selection(select_json(json.dumps(store), STORE_SPEC))
+
+    @classmethod
+    def from_json(cls, data: str):
+        """Builds a Song from the raw js-store JSON, decoding only STORE_SPEC."""
+        return cls._from_selection(select_json(data, STORE_SPEC))
+
+    @classmethod
+    def _from_selection(cls, selected):
+        data = selected.get("store", {}).get("page", {}).get("data", {})
+        tab_view = data.get("tab_view", {})
+
+        content = tab_view.get("wiki_tab", {}).get("content")
+        if content is None:
+            return None
+
+        tab = data.get("tab", {})
+        versions = tab_view.get("versions", {})
+        names = versions.get(0) or tab
+
+        return cls(
+            tab_id=tab.get("id"),
+            tab_url=tab.get("tab_url"),
+            song_name=names.get("song_name"),
+            artist_name=names.get("artist_name"),
+            capo=tab_view.get("meta", {}).get("capo", 0),
+            content=content,
+        )
+
+
+def _skip_ws(s, idx):
+    return _whitespace.match(s, idx).end()
+
+
+def _skip_value(s, idx):
+    """Returns the index just past the JSON value starting at idx, without decoding it."""
+    char = s[idx]
+
+    if char == '"':
+        return _string.match(s, idx).end()
+
+    if char in "{[":
+        depth = 0
+        for token in _container_token.finditer(s, idx):
+            bracket = token.group()
+            if bracket in ("{", "["):
+                depth += 1
+            elif bracket in ("}", "]"):
+                depth -= 1
+                if depth == 0:
+                    return token.end()
+        raise ValueError("Unterminated JSON container at %d" % idx)
+
+    return _scalar.match(s, idx).end()
+
+
+def _select(s, idx, spec, need_end=True):
+    """
+    Decodes the parts of the value at idx named by spec. Returns (selection, end).
+    With need_end=False scanning stops as soon as everything in spec was found, and end is None.
+    """
+    if spec is True:
+        return _decoder.raw_decode(s, idx)
+
+    char = s[idx]
+
+    if char not in "{[":
+        # A scalar where the spec expected a container: nothing to select
+        return {}, _skip_value(s, idx)
+
+    selected = {}
+    remaining = len(spec)
+    closing = "}" if char == "{" else "]"
+    position = 0
+
+    idx = _skip_ws(s, idx + 1)
+    if s[idx] == closing:
+        return selected, idx + 1
+
+    while True:
+        if char == "{":
+            key, idx = scanstring(s, idx + 1)
+            idx = _skip_ws(s, _skip_ws(s, idx) + 1)
+        else:
+            key = position
+            position += 1
+
+        if key in spec:
+            remaining -= 1
+            last = remaining == 0 and not need_end
+            selected[key], idx = _select(s, idx, spec[key], need_end=not last)
+            if last:
+                return selected, None
+        else:
+            idx = _skip_value(s, idx)
+
+        idx = _skip_ws(s, idx)
+        if s[idx] == closing:
+            return selected, idx + 1
+        idx = _skip_ws(s, idx + 1)
+
+
+def select_json(s: str, spec):
+    """
+    Decodes only the paths of the JSON document s named in spec.
+    Objects and lists along the way come back as dicts holding just the selected keys or indices.
+    """
+    selected, _ = _select(s, _skip_ws(s, 0), spec, need_end=False)
+
+    return selected
+
+
+def search_results_from_json(data: str):
+    """
+    The tab results of a search page's raw js-store JSON, in page order, as
+    {id, url, artist, song, type, rating, votes} dicts. Adverts for official and
+    Pro tabs, which have no tab id or type, are left out.
+
+    The store is decoded whole: a search page's store is mostly its results, so
+    skipping the rest with select_json saves nothing over the C decoder.
+    """
+    store = json.loads(data)
+    results = store.get("store", {}).get("page", {}).get("data", {}).get("results") or []
+
+    return [
+        {
+            "id": result["id"],
+            "url": result["tab_url"],
+            "artist": result.get("artist_name") or "",
+            "song": result.get("song_name") or "",
+            "type": result["type"],
+            "rating": result.get("rating") or 0,
+            "votes": result.get("votes") or 0,
+        }
+        for result in results
+        if result.get("id") and result.get("type") and result.get("tab_url")
+    ]
+
+
+def weighted_rating(rating, votes):
+    return (rating * votes + RATING_PRIOR * RATING_PRIOR_VOTES) / (votes + RATING_PRIOR_VOTES)
+
+
+def result_rank(result):
+    """Sort key of a search result: chords before other kinds of tab, then best rated first."""
+    try:
+        type_rank = TAB_TYPE_ORDER.index(result["type"])
+    except ValueError:
+        type_rank = len(TAB_TYPE_ORDER)
+
+    return type_rank, -weighted_rating(result["rating"], result["votes"])
+
+
+def rank_results(results):
+    return sorted(results, key=result_rank)
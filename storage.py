@@ -0,0 +1,221 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from os import environ as env
+
+import pymysql
+
+# Statements are written with %s placeholders and bound by the driver, never formatted in
+SELECT_USER_KEY = "SELECT user_key FROM user WHERE email=%s"
+INSERT_USER = "INSERT INTO user (email, user_key) VALUES (%s, %s)"
+UPDATE_USER_KEY = "UPDATE user SET user_key=%s WHERE email=%s"
+SELECT_SAVED_SONG = "SELECT 1 FROM songs WHERE song_url=%s AND email=%s"
+INSERT_SONG = "INSERT INTO songs (song_name, song_url, email) VALUES (%s, %s, %s)"
+SELECT_SAVED_SONGS = "SELECT song_name, song_url, email FROM songs WHERE email=%s"
+
+# The tables from archives/mysql_commands.py, created by the SQLite stand-in
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user (email varchar(255) PRIMARY KEY, user_key varchar(25));
+CREATE TABLE IF NOT EXISTS songs (
+    song_name TEXT,
+    song_url TEXT,
+    email varchar(255),
+    FOREIGN KEY (email) REFERENCES user(email)
+);
+"""
+
+
+class MySQLBackend(object):
+    def __init__(self, **params):
+        self.params = params
+
+    def connect(self):
+        return pymysql.connect(**self.params)
+
+    def check(self, connection):
+        # Re-establishes connections the server timed out
+        connection.ping(reconnect=True)
+
+    def prepare(self, statement):
+        return statement
+
+
+class SQLiteBackend(object):
+    """Local stand-in for MySQL, e.g. SQLITE_PATH=file::memory:?cache=shared in tests."""
+
+    def __init__(self, path):
+        self.path = path
+        self._statements = {}
+
+    def connect(self):
+        connection = sqlite3.connect(
+            self.path, check_same_thread=False, uri=self.path.startswith("file:")
+        )
+        connection.executescript(SQLITE_SCHEMA)
+        return connection
+
+    def check(self, connection):
+        pass
+
+    def prepare(self, statement):
+        prepared = self._statements.get(statement)
+        if prepared is None:
+            prepared = self._statements[statement] = statement.replace("%s", "?")
+        return prepared
+
+
+class Storage(object):
+    """
+    A bounded connection pool in front of a backend. Queries run on a thread pool the
+    size of the connection pool, so they never block the event loop, and each query
+    function runs in one transaction on one connection.
+    """
+
+    def __init__(self, backend, pool_size=5):
+        self.backend = backend
+        self.pool_size = pool_size
+
+        self._connections = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="storage")
+
+    def _acquire(self):
+        try:
+            connection = self._connections.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.pool_size
+                if can_open:
+                    self._opened += 1
+
+            if not can_open:
+                connection = self._connections.get()
+            else:
+                try:
+                    return self.backend.connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+
+        try:
+            self.backend.check(connection)
+        except Exception:
+            self._discard(connection)
+            raise
+
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+        with self._lock:
+            self._opened -= 1
+
+    def _run(self, work):
+        connection = self._acquire()
+
+        try:
+            result = work(connection)
+            connection.commit()
+        except Exception:
+            try:
+                connection.rollback()
+                self._connections.put(connection)
+            except Exception:
+                self._discard(connection)
+            raise
+
+        self._connections.put(connection)
+        return result
+
+    async def run(self, work):
+        """Runs work(connection) on a pooled connection and commits it."""
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self._executor, self._run, work)
+
+    def _execute(self, connection, statement, params):
+        cursor = connection.cursor()
+        cursor.execute(self.backend.prepare(statement), params)
+        return cursor
+
+    def _fetchone(self, connection, statement, params):
+        cursor = self._execute(connection, statement, params)
+        try:
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def _fetchall(self, connection, statement, params):
+        cursor = self._execute(connection, statement, params)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    async def get_user_key(self, email):
+        """Returns the user's key, or None if there is no such user."""
+
+        def work(connection):
+            row = self._fetchone(connection, SELECT_USER_KEY, (email,))
+            return row[0] if row else None
+
+        return await self.run(work)
+
+    async def set_user_key(self, email, key):
+        def work(connection):
+            if self._fetchone(connection, SELECT_USER_KEY, (email,)) is None:
+                self._execute(connection, INSERT_USER, (email, key)).close()
+            else:
+                self._execute(connection, UPDATE_USER_KEY, (key, email)).close()
+
+        await self.run(work)
+
+    async def save_song(self, song_name, song_url, email):
+        """Adds the song to the user's saved songs unless it is already there."""
+
+        def work(connection):
+            if self._fetchone(connection, SELECT_SAVED_SONG, (song_url, email)) is None:
+                self._execute(connection, INSERT_SONG, (song_name, song_url, email)).close()
+
+        await self.run(work)
+
+    async def get_saved_songs(self, email):
+        """Returns (song_name, song_url, email) rows."""
+        return await self.run(lambda connection: self._fetchall(connection, SELECT_SAVED_SONGS, (email,)))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+        while True:
+            try:
+                connection = self._connections.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+
+
+def create_storage():
+    """Builds the Storage configured by DATABASE_BACKEND (mysql or sqlite) and friends."""
+    pool_size = int(env.get("DATABASE_POOL_SIZE", 5))
+
+    if env.get("DATABASE_BACKEND", "mysql") == "sqlite":
+        return Storage(SQLiteBackend(env.get("SQLITE_PATH", "autochords.db")), pool_size)
+
+    return Storage(
+        MySQLBackend(
+            host=env.get("MYSQL_HOST"),
+            user=env.get("MYSQL_USER"),
+            password=env.get("MYSQL_PASSWORD"),
+            db=env.get("MYSQL_DATABASE"),
+            port=int(env.get("MYSQL_PORT", 3306)),
+        ),
+        pool_size,
+    )
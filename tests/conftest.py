@@ -0,0 +1,98 @@
+"""
+The API under test runs on the SQLite backend, an in-memory search index and the in-process
+job queue, against the stub Ultimate Guitar from scripts/stub_server.py, so the suite needs
+no MySQL or network.
+
+    python -m pytest tests
+"""
+import itertools
+import json
+import sys
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer
+from os import environ as env
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scripts.stub_server import StubHandler, build_tab_page  # noqa: E402
+
+# The tab every stub tab page holds: song.json with section headers, which its own content lacks
+TAB = (
+    "[Intro]\n[ch]Am[/ch] [ch]G/B[/ch] [ch]Cmaj7[/ch]\n"
+    "[Verse]\n[tab][ch]Am[/ch]   [ch]F[/ch]\nHello there[/tab]\n"
+    "[Chorus]\n[ch]C[/ch] [ch]G[/ch]\n"
+)
+
+# A tab id from the search page the stub serves (test.html)
+SONG_NAME = "harry-styles-watermelon-sugar-2895911"
+
+
+def stub_pages():
+    store = json.loads((ROOT / "song.json").read_text())
+    store["store"]["page"]["data"]["tab_view"]["wiki_tab"]["content"] = TAB
+
+    return {"search": (ROOT / "test.html").read_bytes(), "tab": build_tab_page(store).encode()}
+
+
+# Paths the stub was asked for, so tests can tell what went upstream
+stub_requests = []
+
+
+class RecordingHandler(StubHandler):
+    def do_GET(self):
+        stub_requests.append(self.path)
+        super().do_GET()
+
+
+stub_server = ThreadingHTTPServer(("127.0.0.1", 0), partial(RecordingHandler, pages=stub_pages(), delay=0))
+threading.Thread(target=stub_server.serve_forever, daemon=True).start()
+
+stub_url = f"http://127.0.0.1:{stub_server.server_address[1]}"
+
+# Read at import by main and the modules behind it, so set before any test imports them
+env.update(
+    {
+        "DATABASE_BACKEND": "sqlite",
+        "SQLITE_PATH": "file:autochords-tests?mode=memory&cache=shared",
+        "SEARCH_INDEX_PATH": "file:autochords-search-tests?mode=memory&cache=shared",
+        "UG_SEARCH_URL": stub_url + "/search.php",
+        "UG_TABS_URL": stub_url + "/tab/",
+        "ANALYSIS_WORKERS": "1",
+        "JOB_BACKEND": "inprocess",
+    }
+)
+for name in ("USER_KEY_INVALIDATION_LOG", "SONG_CACHE_DIR", "ANALYSIS_CACHE_DIR"):
+    env.pop(name, None)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+# Tab ids the stub's search page doesn't list, for songs put straight into the cache
+tab_ids = itertools.count(900001)
+
+
+@pytest.fixture
+def cached_song(client):
+    """Returns a function that caches a song with the given content and returns its slug."""
+    import main
+    from song import Song
+
+    def cache(content):
+        tab_id = next(tab_ids)
+        main.song_cache.set(str(tab_id), Song(tab_id, f"{stub_url}/tab/{tab_id}", "Song", "Artist", 0, content))
+        return f"artist-song-chords-{tab_id}"
+
+    return cache
@@ -0,0 +1,84 @@
+import re
+
+from conftest import SONG_NAME, TAB
+from transpose import get_all_keys
+
+
+def shown_chords(chords):
+    return re.findall(r"\[ch\](.*?)\[/ch\]", chords)
+
+
+def test_every_key_from_one_fetch(client):
+    response = client.get("/get_chords_all_keys", params={"song_name": SONG_NAME})
+
+    assert response.status_code == 200
+    body = response.json()
+
+    # The song opens on Am, so it's offered in every minor key
+    assert list(body["keys"]) == get_all_keys(minor=True)
+    assert body["original_key"] == "Am"
+    assert body["keys"]["Am"]["chords"] == TAB
+
+    in_c_minor = body["keys"]["Cm"]
+    assert shown_chords(in_c_minor["chords"]) == ["Cm", "Bb/D", "Ebmaj7", "Cm", "Ab", "Eb", "Bb"]
+    assert in_c_minor["chord_names"] == ["Cm", "Bb/D", "Ebmaj7", "Ab", "Eb", "Bb"]
+    assert in_c_minor["transposed_key"] == "Cm"
+
+
+def test_diagrams_are_listed_once_for_all_keys(client):
+    body = client.get("/get_chords_all_keys", params={"song_name": SONG_NAME}).json()
+
+    names = [diagram["name"] for diagram in body["guitar_chord_diagrams"]]
+    used = {name for song in body["keys"].values() for name in song["chord_names"]}
+
+    assert len(names) == len(set(names))
+    assert set(names) <= used
+
+
+def test_only_the_requested_keys(client):
+    response = client.get("/get_chords_all_keys", params={"song_name": SONG_NAME, "keys": ["Dm", "F#m"]})
+
+    assert response.status_code == 200
+    assert list(response.json()["keys"]) == ["Dm", "F#m"]
+
+
+def test_unknown_keys_are_rejected(client):
+    response = client.get("/get_chords_all_keys", params={"song_name": SONG_NAME, "keys": ["D", "Chello", "H"]})
+
+    assert response.status_code == 400
+    assert response.json()["error"] == "Invalid key requested: Chello, H"
+
+
+def test_a_song_opening_on_no_chord_has_no_key(client, cached_song):
+    song_name = cached_song("[Intro]\n[ch]N.C.[/ch]\n[Verse]\n[ch]Am[/ch] [ch]G[/ch]\n")
+
+    response = client.get("/get_chords_all_keys", params={"song_name": song_name})
+
+    assert response.status_code == 400
+    assert "'N.C.'" in response.json()["error"]
+
+
+def test_a_song_without_chords(client, cached_song):
+    song_name = cached_song("[Verse]\nJust lyrics\n")
+
+    response = client.get("/get_chords_all_keys", params={"song_name": song_name})
+
+    assert response.status_code == 400
+    assert "Song not found" in response.json()["error"]
+
+
+def test_an_unknown_tab(client):
+    response = client.get("/get_chords_all_keys", params={"song_name": "harry-styles-watermelon-sugar-8675309"})
+
+    assert response.status_code == 400
+    assert "Song not found" in response.json()["error"]
+
+
+def test_the_songs_own_key_keeps_its_spelling(client, cached_song):
+    content = "[Verse]\n[ch]A#m[/ch] [ch]Gb[/ch] [ch]F#[/ch]\n"
+    song_name = cached_song(content)
+
+    body = client.get("/get_chords_all_keys", params={"song_name": song_name, "keys": ["Bbm", "Bm"]}).json()
+
+    assert body["keys"]["Bbm"]["chords"] == content
+    assert shown_chords(body["keys"]["Bm"]["chords"]) == ["Bm", "G", "G"]
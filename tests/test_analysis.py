@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from analysis import AnalysisEngine, AnalysisQueueFull
+
+
+def run(engine, scenario):
+    try:
+        return asyncio.run(scenario())
+    finally:
+        engine.shutdown()
+
+
+def test_submit_runs_the_job_on_the_pool():
+    engine = AnalysisEngine(workers=1, max_pending=1)
+
+    async def scenario():
+        return await engine.submit(pow, 2, 10)
+
+    assert run(engine, scenario) == 1024
+    assert engine.pending == 0
+
+
+def test_submit_pushes_back_past_max_pending():
+    engine = AnalysisEngine(workers=1, max_pending=2)
+
+    async def scenario():
+        running = asyncio.ensure_future(engine.submit(time.sleep, 0.5))
+        queued = asyncio.ensure_future(engine.submit(time.sleep, 0.5))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AnalysisQueueFull):
+            await engine.submit(pow, 2, 10)
+
+        await asyncio.gather(running, queued)
+        return await engine.submit(pow, 2, 10)
+
+    assert run(engine, scenario) == 1024
+    assert engine.pending == 0
+
+
+def test_a_cancelled_queued_job_frees_its_place():
+    engine = AnalysisEngine(workers=1, max_pending=2)
+
+    async def scenario():
+        running = asyncio.ensure_future(engine.submit(time.sleep, 0.5))
+        queued = asyncio.ensure_future(engine.submit(time.sleep, 0.5))
+        await asyncio.sleep(0)
+
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert engine.pending == 1
+
+        return await asyncio.gather(running, engine.submit(pow, 2, 10))
+
+    assert run(engine, scenario) == [None, 1024]
+
+
+def test_a_cancelled_running_job_holds_its_place_until_done():
+    engine = AnalysisEngine(workers=1, max_pending=1)
+    salvaged = []
+
+    async def scenario():
+        running = asyncio.ensure_future(engine.submit(time.sleep, 0.5, salvage=salvaged.append))
+        await asyncio.sleep(0.1)
+
+        # The job is already in the pool, so it runs on and its result is salvaged
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+
+        with pytest.raises(AnalysisQueueFull):
+            await engine.submit(pow, 2, 10)
+
+        while engine.pending:
+            await asyncio.sleep(0.05)
+
+        return await engine.submit(pow, 2, 10)
+
+    assert run(engine, scenario) == 1024
+    assert salvaged == [None]
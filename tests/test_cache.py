@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+
+import cache
+from cache import TieredCache
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+def test_entries_go_stale_then_expire(clock):
+    songs = TieredCache(max_bytes=1000, ttl=10, stale_ttl=20, sizeof=len)
+    songs.set("1", "Neon")
+
+    assert songs.get("1") == ("Neon", "fresh")
+
+    clock.now += 15
+    assert songs.get("1") == ("Neon", "stale")
+
+    clock.now += 20
+    assert songs.get("1") == (None, None)
+    assert len(songs) == 0
+    assert songs.stats()["hits"] == 2
+    assert songs.stats()["stale_hits"] == 1
+    assert songs.stats()["misses"] == 1
+
+
+def test_stale_values_are_served_while_they_refresh(clock):
+    songs = TieredCache(max_bytes=1000, ttl=10, stale_ttl=20, sizeof=len)
+    fetches = []
+
+    async def fetch():
+        fetches.append(clock.now)
+        return f"Neon {len(fetches)}"
+
+    async def scenario():
+        assert await songs.get_or_fetch("1", fetch) == "Neon 1"
+        assert await songs.get_or_fetch("1", fetch) == "Neon 1"
+
+        clock.now += 15
+        assert await songs.get_or_fetch("1", fetch) == "Neon 1"
+        await asyncio.gather(*songs._refreshing.values())
+
+        return await songs.get_or_fetch("1", fetch)
+
+    assert asyncio.run(scenario()) == "Neon 2"
+    assert len(fetches) == 2
+
+
+def test_a_failed_refresh_keeps_the_stale_value(clock):
+    songs = TieredCache(max_bytes=1000, ttl=10, stale_ttl=20, sizeof=len)
+    songs.set("1", "Neon")
+    clock.now += 15
+
+    async def fetch():
+        raise RuntimeError("upstream is down")
+
+    async def scenario():
+        assert await songs.get_or_fetch("1", fetch) == "Neon"
+        await asyncio.gather(*songs._refreshing.values())
+
+    asyncio.run(scenario())
+    assert songs.get("1") == ("Neon", "stale")
+    assert not songs._refreshing
+
+
+def test_none_is_not_cached():
+    songs = TieredCache(max_bytes=1000, ttl=10, sizeof=len)
+
+    async def fetch():
+        return None
+
+    assert asyncio.run(songs.get_or_fetch("1", fetch)) is None
+    assert "1" not in songs
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    songs = TieredCache(max_bytes=10, ttl=10, sizeof=len)
+    songs.set("a", "aaaa")
+    songs.set("b", "bbbb")
+    songs.get("a")
+    songs.set("c", "cccc")
+
+    assert "a" in songs and "c" in songs
+    assert "b" not in songs
+    assert songs.stats()["bytes"] == 8
+    assert songs.stats()["evictions"] == 1
+
+    # Larger than the whole memory tier: not kept in memory at all
+    songs.set("d", "d" * 11)
+    assert "d" not in songs
+    assert songs.stats()["bytes"] == 8
+
+
+def test_disk_tier_outlives_the_memory_tier(tmp_path, clock):
+    async def write():
+        songs = TieredCache(max_bytes=1000, ttl=10, disk_path=str(tmp_path), sizeof=len)
+        songs.set("1", "Neon")
+        songs.close()
+
+    asyncio.run(write())
+
+    async def read(key):
+        songs = TieredCache(max_bytes=1000, ttl=10, disk_path=str(tmp_path), sizeof=len)
+        try:
+            # get() never touches the disk; lookup() reads it off the event loop
+            assert songs.get(key) == (None, None)
+            return await songs.lookup(key), songs.stats()["disk_hits"]
+        finally:
+            songs.close()
+
+    assert asyncio.run(read("1")) == (("Neon", "fresh"), 1)
+    assert asyncio.run(read("2")) == ((None, None), 0)
+
+    clock.now += 11
+    assert asyncio.run(read("1")) == ((None, None), 0)
+
+
+def test_delete_removes_both_tiers(tmp_path):
+    songs = TieredCache(max_bytes=1000, ttl=10, disk_path=str(tmp_path), sizeof=len)
+    songs.set("1", "Neon")
+    songs.delete("1")
+
+    assert asyncio.run(songs.lookup("1")) == (None, None)
+    assert list(tmp_path.iterdir()) == []
+    songs.close()
+
+
+def test_cancel_refreshes_stops_background_refreshes(clock):
+    songs = TieredCache(max_bytes=1000, ttl=10, stale_ttl=20, sizeof=len)
+    songs.set("1", "Neon")
+    clock.now += 15
+
+    async def fetch():
+        await asyncio.Event().wait()
+
+    async def scenario():
+        await songs.get_or_fetch("1", fetch)
+        task = songs._refreshing["1"]
+        await songs.cancel_refreshes()
+        return task
+
+    assert asyncio.run(scenario()).cancelled()
+    assert not songs._refreshing
@@ -0,0 +1,122 @@
+import asyncio
+import random
+import re
+
+import numpy as np
+import pytest
+
+import main
+from capo import (
+    CAPO_COST,
+    MAX_CAPO,
+    SHAPE_CLASSES,
+    difficulty_tables,
+    rank_capo_options,
+    score_capo_options,
+    shape_class,
+)
+from conftest import SONG_NAME
+from transpose import Chord
+
+CHORDS = ["C", "Am", "F", "G7", "Em7", "Dmaj7", "Bbsus4", "F#dim", "Caug", "Ebm", "A9", "Bm7b5", "N.C."]
+
+
+def reference_score(chords, step, capo, instrument):
+    """The mean difficulty of one option, chord by chord."""
+    parsed = []
+    for name in chords:
+        try:
+            parsed.append(Chord.parse(name))
+        except Exception:
+            pass
+
+    if not parsed:
+        return CAPO_COST[capo]
+
+    table = difficulty_tables[instrument]
+    total = sum(table[SHAPE_CLASSES.index(shape_class(chord)), (chord.root + step - capo) % 12] for chord in parsed)
+    return total / len(parsed) + CAPO_COST[capo]
+
+
+def test_scores_match_scoring_each_option():
+    rng = random.Random(0)
+
+    for _ in range(200):
+        chords = [rng.choice(CHORDS) for _ in range(rng.randint(0, 12))]
+        steps = rng.sample(range(12), rng.randint(1, 4))
+        instrument = rng.choice(["guitar", "ukulele"])
+
+        scores = score_capo_options(chords, steps, instrument)
+
+        assert scores.shape == (len(steps), MAX_CAPO + 1)
+        for i, step in enumerate(steps):
+            for capo in range(MAX_CAPO + 1):
+                assert scores[i, capo] == pytest.approx(reference_score(chords, step, capo, instrument))
+
+
+def test_the_easiest_option_comes_first():
+    # Eb, Ab and Bb are barre chords; with capo 1 they're open D, G and A shapes
+    options = rank_capo_options(["Eb", "Ab", "Bb", "Eb"], "Eb", ["Eb"], limit=3)
+
+    assert [(option["capo"], option["shape_key"]) for option in options][0] == (1, "D")
+    assert options[0]["chords"] == {"Eb": "D", "Ab": "G", "Bb": "A"}
+    assert [option["difficulty"] for option in options] == sorted(option["difficulty"] for option in options)
+
+
+def test_every_key_of_the_mode_by_default():
+    options = rank_capo_options(["Am", "Dm", "E7"], "Am", limit=None)
+
+    assert len(options) == 12 * (MAX_CAPO + 1)
+    assert {option["key"] for option in options} == {"Am", "Bbm", "Bm", "Cm", "Dbm", "Dm", "Ebm", "Em", "Fm", "F#m", "Gm", "Abm"}
+
+
+def test_labels_name_the_shapes():
+    options = rank_capo_options(["A#", "D#"], "A#", ["Bb"], labels={"A#": "Bb", "D#": "Eb"}, limit=1)
+
+    assert set(options[0]["chords"]) == {"Bb", "Eb"}
+
+
+def test_unknown_instrument():
+    with pytest.raises(ValueError):
+        rank_capo_options(["C"], "C", instrument="banjo")
+
+
+def test_get_chords_with_capo_options(client):
+    response = client.get("/get_chords", params={"song_name": SONG_NAME, "username": "nobody@example.com", "capo": True})
+
+    assert response.status_code == 200
+    body = response.json()
+    shown = set(re.findall(r"\[ch\](.*?)\[/ch\]", body["chords"]))
+
+    for instrument in ("guitar", "ukulele"):
+        options = body["capo_options"][instrument]
+
+        assert len(options) == 3
+        assert all(option["key"] == "Am" for option in options)
+        assert all(set(option["chords"]) == shown for option in options)
+
+
+def test_capo_options_name_the_chords_in_the_users_key(client):
+    asyncio.run(main.storage.set_user_key("capo@example.com", "Bb"))
+
+    response = client.get("/get_chords", params={"song_name": SONG_NAME, "username": "capo@example.com", "capo": True})
+    body = response.json()
+    shown = set(re.findall(r"\[ch\](.*?)\[/ch\]", body["chords"]))
+
+    assert body["transposed_key"] == "Bb"
+    assert all(set(option["chords"]) == shown for option in body["capo_options"]["guitar"])
+
+
+def test_capo_options_for_a_song_without_chords(client, cached_song):
+    song_name = cached_song("[Verse]\nJust lyrics\n")
+
+    response = client.get("/get_chords", params={"song_name": song_name, "username": "nobody@example.com", "capo": True})
+
+    assert response.status_code == 200
+    assert response.json()["capo_options"] == {"guitar": [], "ukulele": []}
+
+
+def test_difficulty_tables_cover_every_root():
+    for table in difficulty_tables.values():
+        assert table.shape == (len(SHAPE_CLASSES), 12)
+        assert np.all(table >= 1)
@@ -0,0 +1,61 @@
+import pytest
+
+from diagrams import (
+    DIAGRAM_SUFFIXES,
+    NO_DIAGRAM,
+    SUFFIX_ALIASES,
+    chord_diagram_urls,
+    diagram_catalog,
+    get_chord_diagrams,
+)
+from transpose import pitch_classes
+
+BASE = "https://tombatossals.github.io/react-chords/media"
+
+
+@pytest.mark.parametrize(
+    "chord, guitar, ukulele",
+    [
+        ("Am", "guitar/chords/A/minor/1.svg", "ukulele/chords/A/minor/1.svg"),
+        ("C#", "guitar/chords/Csharp/major/1.svg", "ukulele/chords/Db/major/1.svg"),
+        ("Db", "guitar/chords/Csharp/major/1.svg", "ukulele/chords/Db/major/1.svg"),
+        ("F#m7", "guitar/chords/Fsharp/m7/1.svg", "ukulele/chords/Gb/m7/1.svg"),
+        ("A#min7", "guitar/chords/Bb/m7/1.svg", "ukulele/chords/Bb/m7/1.svg"),
+        ("GM7", "guitar/chords/G/maj7/1.svg", "ukulele/chords/G/maj7/1.svg"),
+        ("E6/9", "guitar/chords/E/69/1.svg", None),
+        ("Bsus", "guitar/chords/B/sus4/1.svg", "ukulele/chords/B/sus4/1.svg"),
+    ],
+)
+def test_chord_diagram_urls(chord, guitar, ukulele):
+    assert chord_diagram_urls(chord) == (f"{BASE}/{guitar}", ukulele and f"{BASE}/{ukulele}")
+
+
+def test_a_slash_bass_is_not_drawn():
+    assert chord_diagram_urls("G/B") == chord_diagram_urls("G")
+    assert chord_diagram_urls("Am7/G") == chord_diagram_urls("Am7")
+
+
+@pytest.mark.parametrize("chord", ["N.C.", "x", "Cadd11", "H7", ""])
+def test_chords_without_a_diagram(chord):
+    assert chord_diagram_urls(chord) == NO_DIAGRAM
+
+
+def test_the_catalog_covers_every_spelling_and_suffix():
+    assert len(diagram_catalog) == len(pitch_classes) * len(SUFFIX_ALIASES)
+
+    for guitar, ukulele in diagram_catalog.values():
+        assert guitar is not None
+        assert ukulele is None or ukulele.startswith(f"{BASE}/ukulele/")
+
+
+def test_ukulele_suffixes_are_a_subset_of_guitar():
+    assert DIAGRAM_SUFFIXES["ukulele"] <= DIAGRAM_SUFFIXES["guitar"]
+
+
+def test_get_chord_diagrams_lists_each_chord_once_in_order():
+    guitar, ukulele = get_chord_diagrams(["Am", "G/B", "Am", "N.C.", "C", "G/B"])
+
+    assert [diagram["name"] for diagram in guitar] == ["Am", "G/B", "N.C.", "C"]
+    assert [diagram["name"] for diagram in ukulele] == ["Am", "G/B", "N.C.", "C"]
+    assert guitar[2]["url"] is None
+    assert ukulele[0]["url"] == f"{BASE}/ukulele/chords/A/minor/1.svg"
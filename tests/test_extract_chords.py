@@ -0,0 +1,74 @@
+import json
+import random
+import re
+
+import pytest
+
+from conftest import ROOT
+from helpers import extract_chords
+
+
+def reference_extract_chords(text):
+    """extract_chords as it was before the tokenizer: regexes over each section's slice."""
+    sections = re.findall(r"(?<!\[ch\])(\[[^\]]*\])", text)
+    new_sections = [section for section in sections if section not in ["[tab]", "[/tab]", "[ch]", "[/ch]"]]
+
+    final_sections = {}
+    start_idx = 0
+
+    for i in range(len(new_sections)):
+        section = new_sections[i]
+        start_idx = text.find(section, start_idx)
+
+        if i < len(new_sections) - 1:
+            end_idx = text.find(new_sections[i + 1], start_idx)
+        else:
+            end_idx = len(text)
+
+        chords = re.findall(r"\[ch\](.*?)\[/ch\]", text[start_idx:end_idx])
+
+        if len(chords) == 0:
+            chords = re.findall(r"\b[CDEFGAB](?:#{1,2}|b{1,2})?(?:maj7?|min7?|sus2?)\b", text[start_idx:end_idx])
+
+        final_sections[section.replace("[", "").replace("]", "")] = chords
+        start_idx = end_idx
+
+    return final_sections
+
+
+PIECES = [
+    "[Verse]", "[Chorus]", "[Intro]", "[Verse 2]", "[Intro Csus2]", "[ch]Am[/ch]", "[ch]C#m7[/ch]",
+    "[ch]G[/ch]", "[tab]", "[/tab]", " Asus2 ", "Bbmaj7", "Gmin", "\n", " lyrics ",
+]
+
+
+def random_tabs(count, seed=1):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 25)))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "[Verse]\n[ch]Am[/ch] [ch]C[/ch]\n[Chorus]\nAsus2 Cmaj7 foo\n[Chorus]\n[ch]G[/ch]\n[Bridge Dsus2]\n words Emin7",
+        # An immediately repeated header leaves an empty section behind
+        "[Intro]\n[Intro]\n[ch]D[/ch]\n[Verse]\n[ch]E[/ch][Intro][ch]F[/ch]",
+        "no sections at all [ch]Am[/ch]",
+        "",
+    ],
+)
+def test_extract_chords_matches_the_reference(text):
+    assert extract_chords(text) == reference_extract_chords(text)
+
+
+def test_extract_chords_matches_the_reference_on_song_json():
+    content = json.loads((ROOT / "song.json").read_text())["store"]["page"]["data"]["tab_view"]["wiki_tab"]["content"]
+
+    assert extract_chords(content) == reference_extract_chords(content)
+
+
+def test_extract_chords_matches_the_reference_on_random_tabs():
+    mismatches = [text for text in random_tabs(5000) if extract_chords(text) != reference_extract_chords(text)]
+
+    assert mismatches == []
@@ -0,0 +1,69 @@
+import html
+import json
+import random
+
+import pytest
+
+from conftest import ROOT
+from helpers import extract_store, extract_store_fast, extract_store_soup, unescape_attribute
+from scripts.stub_server import build_tab_page
+
+
+@pytest.fixture(scope="module")
+def store():
+    return json.loads((ROOT / "song.json").read_text())
+
+
+def test_search_page_matches_the_soup_parse():
+    page = (ROOT / "test.html").read_text()
+
+    assert extract_store_fast(page) == extract_store_soup(page)
+
+
+def test_tab_page_matches_the_soup_parse(store):
+    page = build_tab_page(store)
+
+    assert extract_store_fast(page) == extract_store_soup(page)
+    assert json.loads(extract_store_fast(page)) == store
+
+
+def test_other_tags_data_content_is_not_taken():
+    page = '<div data-content="{}"></div><div class="js-store"></div>'
+
+    assert extract_store_fast(page) is None
+
+
+def test_pages_without_a_store():
+    assert extract_store_fast("<html><body>Nothing here</body></html>") is None
+
+
+def test_unexpected_markup_falls_back_to_the_soup_parse():
+    # Single-quoted attribute: not what the fast path slices
+    page = "<div class=\"js-store\" data-content='{&quot;a&quot;: 1}'></div>"
+
+    assert extract_store_fast(page) is None
+    assert extract_store(page) == '{"a": 1}'
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "plain",
+        "&quot;Don&#039;t&quot; &lt;stop&gt;",
+        "rock &amp;amp; roll",
+        "&amp;quot; stays escaped once",
+        "caf&eacute; &#x27;x&#x27; &hellip;",
+        "a lone & ampersand",
+    ],
+)
+def test_unescape_attribute_matches_html_unescape(value):
+    assert unescape_attribute(value) == html.unescape(value)
+
+
+def test_unescape_attribute_matches_html_unescape_on_random_text():
+    pieces = ["&quot;", "&#039;", "&lt;", "&gt;", "&amp;", "&eacute;", "&#x27;", "&", "amp;", "a", " ", "\\"]
+    rng = random.Random(0)
+
+    for _ in range(5000):
+        value = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+        assert unescape_attribute(value) == html.unescape(value), value
@@ -0,0 +1,50 @@
+import asyncio
+import re
+
+import main
+from conftest import SONG_NAME, TAB
+
+
+def shown_chords(chords):
+    return re.findall(r"\[ch\](.*?)\[/ch\]", chords)
+
+
+def test_get_chords_without_a_key(client):
+    response = client.get("/get_chords", params={"song_name": SONG_NAME, "username": "nobody@example.com"})
+
+    assert response.status_code == 200
+    body = response.json()
+
+    assert body["chords"] == TAB
+    assert body["original_key"] == "Am"
+    assert body["transposed_key"] is None
+    assert body["song_name"] == "Neon"
+    assert body["artist_name"] == "John Mayer"
+    assert [diagram["name"] for diagram in body["guitar_chord_diagrams"]] == ["Am", "G/B", "Cmaj7", "F", "C", "G"]
+    assert response.headers["ETag"]
+
+
+def test_get_chords_in_the_users_key(client):
+    asyncio.run(main.storage.set_user_key("keyed@example.com", "C"))
+
+    response = client.get("/get_chords", params={"song_name": SONG_NAME, "username": "keyed@example.com"})
+
+    assert response.status_code == 200
+    body = response.json()
+
+    # Am to C is three semitones up, spelled with flats as C prefers
+    assert shown_chords(body["chords"]) == ["Cm", "Bb/D", "Ebmaj7", "Cm", "Ab", "Eb", "Bb"]
+    assert "Hello there" in body["chords"]
+    assert body["original_key"] == "Am"
+    assert body["transposed_key"] == "C"
+    assert [diagram["name"] for diagram in body["ukulele_chord_diagrams"]] == ["Cm", "Bb/D", "Ebmaj7", "Ab", "Eb", "Bb"]
+
+
+def test_get_chords_for_an_unknown_tab(client):
+    response = client.get(
+        "/get_chords", params={"song_name": "harry-styles-watermelon-sugar-8675309", "username": "nobody@example.com"}
+    )
+
+    assert response.status_code == 400
+    assert "Song not found" in response.json()["error"]
+
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+import main
+from conftest import SONG_NAME
+from http_cache import etag_matches, make_etag
+
+CHORDS = {"song_name": SONG_NAME, "username": "nobody@example.com"}
+
+
+def test_make_etag_is_weak_and_stable():
+    etag = make_etag(2895911, "abc", None, "chords")
+
+    assert etag.startswith('W/"')
+    assert etag == make_etag(2895911, "abc", None, "chords")
+    assert etag != make_etag(2895911, "abc", "C", "chords")
+
+
+@pytest.mark.parametrize(
+    "if_none_match, matches",
+    [
+        (None, False),
+        ("", False),
+        ("*", True),
+        ('W/"abc"', True),
+        ('"abc"', True),
+        ('"xyz", W/"abc"', True),
+        ('"xyz"', False),
+    ],
+)
+def test_etag_matches(if_none_match, matches):
+    assert etag_matches(if_none_match, 'W/"abc"') is matches
+
+
+def test_get_chords_revalidates_with_the_etag(client):
+    response = client.get("/get_chords", params=CHORDS)
+    etag = response.headers["ETag"]
+
+    assert response.headers["Cache-Control"] == main.CHORDS_CACHE_CONTROL
+
+    revalidated = client.get("/get_chords", params=CHORDS, headers={"If-None-Match": etag})
+
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert revalidated.content == b""
+
+
+def test_the_etag_follows_the_key_and_capo(client):
+    asyncio.run(main.storage.set_user_key("etag@example.com", "D"))
+
+    plain = client.get("/get_chords", params=CHORDS).headers["ETag"]
+    keyed = client.get("/get_chords", params={**CHORDS, "username": "etag@example.com"}).headers["ETag"]
+    capo = client.get("/get_chords", params={**CHORDS, "capo": True}).headers["ETag"]
+
+    assert len({plain, keyed, capo}) == 3
+
+
+def test_search_results_revalidate_with_the_etag(client):
+    params = {"song_name": "watermelon sugar"}
+    response = client.get("/search_results", params=params)
+
+    assert response.headers["Cache-Control"] == main.SEARCH_CACHE_CONTROL
+
+    revalidated = client.get("/search_results", params=params, headers={"If-None-Match": response.headers["ETag"]})
+
+    assert revalidated.status_code == 304
+
+
+def test_large_bodies_are_gzipped(client):
+    response = client.get("/get_chords_all_keys", params={"song_name": SONG_NAME}, headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.json()["original_key"] == "Am"
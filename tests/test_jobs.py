@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+from jobs import CANCELLED, QUEUED, RUNNING, TIMED_OUT, InProcessJobQueue
+
+
+class StubEngine(object):
+    """Stands in for the process pool: answers every analysis with `key`, or never when None."""
+
+    def __init__(self, key="Em"):
+        self.key = key
+        self.submitted = 0
+
+    async def submit(self, fn, *args, salvage=None):
+        self.submitted += 1
+
+        if self.key is None:
+            await asyncio.Event().wait()
+
+        return {"key": self.key, "confidence": 1.0, "seconds": 1.0}
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = StubEngine()
+    monkeypatch.setattr(main, "analysis_engine", engine)
+    return engine
+
+
+def upload(client, email, data, mode="async"):
+    return client.post(
+        "/user_recording",
+        params={"user_email": email, "mode": mode},
+        files={"file": ("take.wav", data, "audio/wav")},
+    )
+
+
+def wait_for(client, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+
+    while True:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] == status or time.monotonic() > deadline:
+            return job
+        time.sleep(0.01)
+
+
+def test_async_upload_runs_to_completion(client, engine):
+    response = upload(client, "jobs@example.com", b"recording one")
+
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    assert wait_for(client, job_id, "succeeded")["status"] == "succeeded"
+
+    result = client.get(f"/jobs/{job_id}/result")
+    assert result.status_code == 200
+    assert result.json() == {"key": "Em"}
+    assert client.get("/get_user_key", params={"user_email": "jobs@example.com"}).json() == {"key": "Em"}
+
+    # The same recording again is answered from the result cache
+    job_id = upload(client, "jobs@example.com", b"recording one").json()["job_id"]
+    assert wait_for(client, job_id, "succeeded")["status"] == "succeeded"
+    assert engine.submitted == 1
+
+
+def test_pending_job_result_answers_202(client, engine):
+    engine.key = None
+    job_id = upload(client, "pending@example.com", b"recording two").json()["job_id"]
+
+    assert wait_for(client, job_id, "running")["status"] == "running"
+    assert client.get(f"/jobs/{job_id}/result").status_code == 202
+
+    assert client.delete(f"/jobs/{job_id}").status_code == 200
+
+
+def test_cancelled_job(client, engine):
+    engine.key = None
+    job_id = upload(client, "cancel@example.com", b"recording three").json()["job_id"]
+
+    response = client.delete(f"/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.json() == {"job_id": job_id, "cancelled": True}
+
+    job = wait_for(client, job_id, "cancelled")
+    assert job["status"] == "cancelled"
+    assert job["finished_at"] is not None
+
+    assert client.get(f"/jobs/{job_id}/result").status_code == 409
+    assert client.delete(f"/jobs/{job_id}").status_code == 409
+    assert client.get("/get_user_key", params={"user_email": "cancel@example.com"}).status_code == 400
+
+
+def test_failed_job(client, engine):
+    async def silent(fn, *args, salvage=None):
+        return {"key": None, "confidence": 0.0, "seconds": 1.0}
+
+    engine.submit = silent
+    job_id = upload(client, "silent@example.com", b"recording four").json()["job_id"]
+
+    job = wait_for(client, job_id, "failed")
+    assert job["status"] == "failed"
+    assert job["error"] == "No key could be detected in the recording"
+    assert client.get(f"/jobs/{job_id}/result").status_code == 409
+
+
+def test_unknown_job(client):
+    assert client.get("/jobs/nope").status_code == 404
+    assert client.get("/jobs/nope/result").status_code == 404
+    assert client.delete("/jobs/nope").status_code == 404
+
+
+def test_unknown_upload_mode(client, engine):
+    assert upload(client, "jobs@example.com", b"recording five", mode="later").status_code == 400
+    assert engine.submitted == 0
+
+
+def test_jobs_over_their_timeout():
+    queue = InProcessJobQueue(concurrency=1, timeout=0.05)
+
+    async def scenario():
+        job = queue.submit(lambda: asyncio.sleep(10))
+        await job.task
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert job.status == TIMED_OUT
+    assert job.error == "Job did not finish within 0.05 seconds"
+
+
+def test_shutdown_cancels_queued_and_running_jobs():
+    queue = InProcessJobQueue(concurrency=1, timeout=10)
+
+    async def scenario():
+        jobs = [queue.submit(lambda: asyncio.sleep(10)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert [job.status for job in jobs] == [RUNNING, QUEUED]
+
+        await queue.shutdown()
+        return jobs
+
+    assert [job.status for job in asyncio.run(scenario())] == [CANCELLED, CANCELLED]
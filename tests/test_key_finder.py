@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from key_finder import (
+    Streaming_Tonal_Fragment,
+    Tonal_Fragment,
+    keys,
+    maj_profile,
+    min_profile,
+    pitches,
+    score_chroma,
+    sliding_window_keys,
+)
+
+
+def reference_scores(chroma_vals):
+    """Tonal_Fragment's scoring as it was before key_correlations: one np.corrcoef per key."""
+    keyfreqs = {pitches[i]: chroma_vals[i] for i in range(12)}
+    maj_key_corrs, min_key_corrs = [], []
+
+    for i in range(12):
+        key_test = [keyfreqs.get(pitches[(i + m) % 12]) for m in range(12)]
+        maj_key_corrs.append(round(np.corrcoef(maj_profile, key_test)[1, 0], 3))
+        min_key_corrs.append(round(np.corrcoef(min_profile, key_test)[1, 0], 3))
+
+    key_dict = {**{keys[i]: maj_key_corrs[i] for i in range(12)}, **{keys[i + 12]: min_key_corrs[i] for i in range(12)}}
+    key = max(key_dict, key=key_dict.get)
+    bestcorr = max(key_dict.values())
+
+    altkey = None
+    for name, corr in key_dict.items():
+        if corr > bestcorr * 0.9 and corr != bestcorr:
+            altkey = name
+
+    return key_dict, key, altkey
+
+
+@pytest.fixture(scope="module")
+def random_chroma():
+    return np.random.default_rng(0).random((2000, 12)) * 100
+
+
+def test_tonal_fragment_matches_the_reference(random_chroma):
+    for chroma_vals in random_chroma:
+        fragment = Tonal_Fragment.from_chroma(chroma_vals)
+        key_dict, key, altkey = reference_scores(list(chroma_vals))
+
+        assert fragment.key_dict == key_dict
+        assert (fragment.key, fragment.altkey) == (key, altkey)
+
+
+def test_score_chroma_matches_tonal_fragment(random_chroma):
+    scores = score_chroma(random_chroma[:500])
+
+    for chroma_vals, score in zip(random_chroma[:500], scores):
+        fragment = Tonal_Fragment.from_chroma(chroma_vals)
+        assert (score["key"], score["altkey"]) == (fragment.key, fragment.altkey)
+        assert score["bestcorr"] == fragment.bestcorr
+
+
+def test_sliding_window_keys_match_the_summed_windows():
+    chromagram = np.random.default_rng(1).random((12, 200))
+
+    scores = sliding_window_keys(chromagram, window=50, hop=25)
+
+    assert len(scores) == 7
+    for start, score in zip(range(0, 151, 25), scores):
+        fragment = Tonal_Fragment.from_chroma(chromagram[:, start:start + 50].sum(axis=1))
+        assert score["key"] == fragment.key
+
+
+def test_streaming_fragment_settles_on_a_clear_key():
+    fragment = Streaming_Tonal_Fragment(sr=22050, patience=3, min_seconds=2.0)
+    a_minor = np.roll(min_profile, 9)
+
+    done = [fragment.add_chroma(a_minor, 1.0) for _ in range(5)]
+
+    assert fragment.result()["key"] == "Am"
+    assert done.index(True) == 2
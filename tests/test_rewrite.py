@@ -0,0 +1,82 @@
+import random
+
+from helpers import replace_chords_with_transposed
+from tokenizer import BARE_CHORD, CHORD, compile_tab, value_span
+
+TAGGED = ["Am", "C#m7", "G", "D/F#", "C", "D", "E"]
+BARE = ["Asus2", "Bbmaj7", "Gmin", "C#min7", "Esus"]
+PIECES = ["[Verse]", "[Chorus]", "[Intro Csus2]", "[tab]", "[/tab]", "\n", " lyrics ", " Cold ", " Do "]
+
+
+def random_tab(rng):
+    pieces = PIECES + [f"[ch]{chord}[/ch]" for chord in TAGGED] + [f" {chord} " for chord in BARE]
+    return "".join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+
+
+def without_chords(text):
+    """The text with every chord name blanked out, i.e. everything rewrite() must leave alone."""
+    pieces, position = [], 0
+    for token in compile_tab(text).chords():
+        start, end = value_span(token)
+        pieces.append(text[position:start])
+        pieces.append("\0")
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def test_chained_replacements_apply_once():
+    tab = compile_tab("[Verse]\n[ch]C[/ch] [ch]D[/ch] [ch]E[/ch]\n")
+
+    assert tab.rewrite({"C": "D", "D": "E", "E": "F#"}) == "[Verse]\n[ch]D[/ch] [ch]E[/ch] [ch]F#[/ch]\n"
+
+
+def test_lyrics_that_spell_a_chord_are_left_alone():
+    text = "[Verse]\n[ch]C[/ch] Cold Carolina, Do it\n[Chorus]\nAsus2 and Amin played\n"
+
+    assert compile_tab(text).rewrite({"C": "D", "Do": "X", "Asus2": "Bsus2", "Amin": "Bmin"}) == (
+        "[Verse]\n[ch]D[/ch] Cold Carolina, Do it\n[Chorus]\nBsus2 and Bmin played\n"
+    )
+
+
+def test_nothing_to_replace_returns_the_text():
+    text = "[Verse]\n[ch]C[/ch]\n"
+
+    assert compile_tab(text).rewrite({"G": "A"}) is text
+
+
+def test_rewrite_replaces_every_chord_exactly_once_on_random_tabs():
+    rng = random.Random(0)
+
+    for _ in range(3000):
+        text = random_tab(rng)
+        tab = compile_tab(text)
+        # Tagged chords map onto tagged chords and bare onto bare, so the rewritten
+        # text tokenizes into the same chords
+        replacements = {
+            **dict(zip(TAGGED, rng.sample(TAGGED, len(TAGGED)))),
+            **{chord: rng.choice(BARE) for chord in rng.sample(BARE, 3)},
+        }
+
+        rewritten = tab.rewrite(replacements)
+        chords = compile_tab(rewritten).chords()
+
+        assert [token.value for token in chords] == [replacements.get(token.value, token.value) for token in tab.chords()]
+        assert [token.kind for token in chords] == [token.kind for token in tab.chords()]
+        assert without_chords(rewritten) == without_chords(text)
+
+
+def test_replace_chords_with_transposed_pairs_chords_by_position():
+    text = "[Verse]\n[ch]Am[/ch] [ch]G[/ch]\n[Chorus]\nAsus2 Cmaj7\n"
+    original = {"Verse": ["Am", "G"], "Chorus": ["Asus2", "Cmaj7"]}
+    transposed = {"Verse": ["Bm", "A"], "Chorus": ["Bsus2", "Dmaj7"]}
+
+    assert replace_chords_with_transposed(text, original, transposed) == (
+        "[Verse]\n[ch]Bm[/ch] [ch]A[/ch]\n[Chorus]\nBsus2 Dmaj7\n"
+    )
+
+
+def test_token_kinds():
+    kinds = {token.kind for token in compile_tab("[Verse]\n[ch]Am[/ch] Asus2\n").chords()}
+
+    assert kinds == {CHORD, BARE_CHORD}
@@ -0,0 +1,173 @@
+import pytest
+
+import main
+import search_index
+from conftest import stub_requests
+from fetcher import UG_TABS_PREFIX
+from helpers import SEARCH_RESULTS
+from search_index import EXPIRE_INTERVAL, SearchIndex, link_result, normalise_query
+from song import Song
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(search_index, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def index(tmp_path, clock):
+    index = SearchIndex(str(tmp_path / "search_index.db"), ttl=100, query_ttl=10)
+    yield index
+    index.close()
+
+
+def result(tab_id, artist, song, type="Chords", rating=4.5, votes=100):
+    slug = f"{song}-{'chords' if type == 'Chords' else 'tabs'}-{tab_id}".lower().replace(" ", "-")
+    url = f"{UG_TABS_PREFIX}{artist.lower().replace(' ', '-')}/{slug}"
+    return {"id": tab_id, "url": url, "artist": artist, "song": song, "type": type, "rating": rating, "votes": votes}
+
+
+RESULTS = [
+    result(1, "Harry Styles", "Watermelon Sugar"),
+    result(2, "Harry Styles", "Adore You"),
+    result(3, "John Mayer", "Neon"),
+    result(4, "Beyoncé", "Halo"),
+]
+
+
+def ids(results):
+    return [result["id"] for result in results]
+
+
+def test_every_word_matches_as_a_prefix(index):
+    index.add_results(RESULTS)
+
+    assert ids(index.lookup("harr wat")) == [1]
+    assert ids(index.lookup("Harry")) == [1, 2]
+    assert ids(index.lookup("mayer neo")) == [3]
+    assert index.lookup("harry neon") == []
+
+
+def test_diacritics_and_tab_ids_match(index):
+    index.add_results(RESULTS)
+
+    assert ids(index.lookup("beyonce")) == [4]
+    assert ids(index.lookup("3")) == [3]
+
+
+def test_misspelt_words_are_corrected(index):
+    index.add_results(RESULTS)
+
+    assert ids(index.lookup("watermelom sugr")) == [1]
+    assert ids(index.lookup("harry stiles adore")) == [2]
+    assert index.lookup("xqzvw") == []
+
+
+def test_equally_good_matches_are_ranked_like_search_results(index):
+    index.add_results(
+        [
+            result(10, "Harry Styles", "Watermelon Sugar", type="Tabs", rating=5, votes=1000),
+            result(11, "Harry Styles", "Watermelon Sugar", rating=4.0, votes=10),
+            result(12, "Harry Styles", "Watermelon Sugar", rating=4.8, votes=2000),
+        ]
+    )
+
+    assert ids(index.lookup("watermelon sugar")) == [12, 11, 10]
+
+
+def test_results_are_limited(index):
+    index.add_results([result(i, "Harry Styles", f"Song {i}") for i in range(1, 21)])
+
+    assert len(index.lookup("harry", limit=5)) == 5
+
+
+def test_links_are_named_after_their_slugs(index):
+    url = f"{UG_TABS_PREFIX}harry-styles/watermelon-sugar-ukulele-2958225"
+
+    assert index.add_links([url, "https://example.com/nope"]) == 1
+    assert index.lookup("watermelon") == [link_result(url)]
+    assert link_result(url)["type"] == "Ukulele Chords"
+    assert index.url_for(2958225) == url
+
+
+def test_tabs_expire(index, clock):
+    index.add_results(RESULTS)
+
+    clock.now += 101
+    assert index.lookup("harry") == []
+
+    index.add_results(RESULTS[:1])
+    assert ids(index.lookup("harry")) == [1]
+
+
+def test_fetching_a_tab_does_not_refresh_it(index, clock):
+    index.add_results(RESULTS)
+
+    clock.now += 60
+    song = Song(3, RESULTS[2]["url"], "Neon", "John Mayer", 0, "")
+    index.add_song(song)
+
+    clock.now += 60
+    assert index.lookup("neon") == []
+
+
+def test_expired_rows_are_deleted(index, clock):
+    index.add_results(RESULTS)
+    assert index.count() == 4
+
+    clock.now += EXPIRE_INTERVAL + 1
+    index.add_results(RESULTS[:1])
+
+    assert index.count() == 1
+
+
+def test_queries_answered_upstream_are_remembered(index, clock):
+    index.add_results(RESULTS[:1], "Harry  Styles!")
+
+    assert normalise_query("Harry  Styles!") == "harry styles"
+    assert index.answered("harry styles")
+    assert not index.answered("harry")
+
+    clock.now += 11
+    assert not index.answered("harry styles")
+
+
+def search(client, term):
+    del stub_requests[:]
+    response = client.get("/search_results", params={"song_name": term})
+
+    assert response.status_code == 200
+    return response.json()["results"], [path for path in stub_requests if path.startswith("/search.php")]
+
+
+def test_a_short_answer_goes_upstream_until_upstream_has_answered(client):
+    # The only tab of this artist the index has seen; a full page may have more
+    main.search_index.add_results([result(800001, "Zyzzyva", "Quux")])
+
+    results, upstream = search(client, "zyzzyva")
+    assert len(upstream) == 1
+    # The stub's search page is for Watermelon Sugar whatever the query
+    assert "Zyzzyva" not in [result["artist"] for result in results]
+
+    results, upstream = search(client, "Zyzzyva")
+    assert upstream == []
+    assert [result["id"] for result in results] == ["800001"]
+
+
+def test_a_full_page_is_answered_from_the_index(client):
+    search(client, "watermelon sugar")
+
+    results, upstream = search(client, "waterm sugar")
+
+    assert upstream == []
+    assert len(results) == SEARCH_RESULTS
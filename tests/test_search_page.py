@@ -0,0 +1,110 @@
+import json
+import time
+
+import pytest
+
+import main
+from conftest import ROOT, stub_requests
+from helpers import extract_store_soup, search_page_links, search_page_results
+from search_index import SearchIndex, link_result
+from song import CHORD_TYPES, rank_results, result_rank
+
+
+@pytest.fixture(scope="module")
+def page():
+    return (ROOT / "test.html").read_text()
+
+
+def test_results_come_from_the_store(page):
+    store = json.loads(extract_store_soup(page))
+    # Adverts and other entries that aren't tabs have no id, type or link
+    expected = [
+        result
+        for result in store["store"]["page"]["data"]["results"]
+        if result.get("id") and result.get("type") and result.get("tab_url")
+    ]
+
+    results = search_page_results(page)
+
+    assert [result["id"] for result in results] == [result["id"] for result in expected]
+    assert results[0] == {
+        "id": expected[0]["id"],
+        "url": expected[0]["tab_url"],
+        "artist": expected[0]["artist_name"],
+        "song": expected[0]["song_name"],
+        "type": expected[0]["type"],
+        "rating": expected[0]["rating"],
+        "votes": expected[0]["votes"],
+    }
+
+
+def test_pages_without_results():
+    assert search_page_results("<html><body>Nothing here</body></html>") == []
+    assert search_page_results('<div class="js-store" data-content="{&quot;store&quot;: {}}"></div>') == []
+
+
+def test_links_are_the_fallback(page):
+    links = search_page_links(page)
+
+    assert links
+    assert all(link_result(link) is not None for link in links)
+
+
+def test_results_are_ranked_chords_first(page):
+    ranked = rank_results(search_page_results(page))
+
+    assert [result_rank(result) for result in ranked] == sorted(result_rank(result) for result in ranked)
+    assert ranked[0]["type"] in CHORD_TYPES
+
+
+def test_slugs_do_not_rename_indexed_tabs(tmp_path):
+    index = SearchIndex(str(tmp_path / "search_index.db"))
+    url = "https://tabs.ultimate-guitar.com/tab/beyonce/halo-chords-1"
+    index.add_results([{"id": 1, "url": url, "artist": "Beyoncé", "song": "Halo", "type": "Chords", "rating": 5, "votes": 9}])
+
+    index.add_links([url])
+
+    assert index.lookup("halo")[0]["artist"] == "Beyoncé"
+    index.close()
+
+
+def wait_for_prefetches(timeout=5):
+    deadline = time.monotonic() + timeout
+    while main.prefetches and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def top_chords(page):
+    results = rank_results(search_page_results(page))
+    return [str(result["id"]) for result in results if result["type"] in CHORD_TYPES][:main.SEARCH_PREFETCH]
+
+
+def test_a_click_after_a_search_is_a_cache_hit(client, page):
+    for tab_id in top_chords(page):
+        main.song_cache.delete(tab_id)
+
+    # A query the index can't answer, so it goes upstream
+    results = client.get("/search_results", params={"song_name": "watermelon prefetched"}).json()["results"]
+    wait_for_prefetches()
+
+    assert all(tab_id in main.song_cache for tab_id in top_chords(page))
+
+    del stub_requests[:]
+    response = client.get("/get_chords", params={"song_name": results[0]["url"], "username": "nobody@example.com"})
+
+    assert response.status_code == 200
+    assert stub_requests == []
+
+
+def test_searches_the_index_answers_prefetch_nothing(client, page):
+    client.get("/search_results", params={"song_name": "watermelon sugar"})
+    wait_for_prefetches()
+    for tab_id in top_chords(page):
+        main.song_cache.delete(tab_id)
+
+    del stub_requests[:]
+    client.get("/search_results", params={"song_name": "watermelon sug"})
+    wait_for_prefetches()
+
+    assert stub_requests == []
+    assert not any(tab_id in main.song_cache for tab_id in top_chords(page))
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import main
+from conftest import SONG_NAME
+
+
+def setlist(client, song_names, username="nobody@example.com"):
+    response = client.get("/get_setlist_chords", params={"song_names": song_names, "username": username})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return sorted(lines, key=lambda line: line["index"])
+
+
+def test_one_line_per_song(client, cached_song):
+    other = cached_song("[Verse]\n[ch]D[/ch] [ch]A[/ch]\n")
+
+    lines = setlist(client, [SONG_NAME, other, SONG_NAME])
+
+    assert [line["requested_song"] for line in lines] == [SONG_NAME, other, SONG_NAME]
+    assert [line["status_code"] for line in lines] == [200, 200, 200]
+    assert [line["original_key"] for line in lines] == ["Am", "D", "Am"]
+
+
+def test_a_bad_song_does_not_fail_the_others(client, cached_song):
+    without_chords = cached_song("Just lyrics\n")
+
+    lines = setlist(client, [without_chords, SONG_NAME, "harry-styles-watermelon-sugar-8675309"])
+
+    assert [line["status_code"] for line in lines] == [400, 200, 400]
+    assert "Song not found" in lines[0]["error"]
+    assert "Song not found" in lines[2]["error"]
+
+
+def test_a_song_that_fails_to_load(client, cached_song):
+    # A record without content can't be processed: only its own entry fails
+    broken = cached_song(None)
+
+    lines = setlist(client, [SONG_NAME, broken])
+
+    assert [line["status_code"] for line in lines] == [200, 500]
+    assert lines[1]["error"].startswith("Could not load song: ")
+
+
+def test_songs_the_users_key_cant_be_applied_to(client, cached_song):
+    asyncio.run(main.storage.set_user_key("setlist@example.com", "C"))
+    no_chord = cached_song("[Intro]\n[ch]N.C.[/ch]\n[Verse]\n[ch]Am[/ch]\n")
+
+    lines = setlist(client, [SONG_NAME, no_chord], username="setlist@example.com")
+
+    assert [line["status_code"] for line in lines] == [200, 400]
+    assert lines[0]["transposed_key"] == "C"
+    assert "'N.C.'" in lines[1]["error"]
+
+
+def test_too_many_songs(client):
+    response = client.get(
+        "/get_setlist_chords",
+        # SETLIST_MAX_SONGS is 100 by default
+        params={"song_names": [SONG_NAME] * 101, "username": "nobody@example.com"},
+    )
+
+    assert response.status_code == 400
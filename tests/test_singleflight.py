@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_fetch():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["Neon"]
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do("neon", fetch) for _ in range(5)))
+        assert len(flight) == 0
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert results == [["Neon"]] * 5
+    assert len(calls) == 1
+
+
+def test_different_keys_fetch_separately():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def scenario():
+        return await asyncio.gather(flight.do("a", lambda: fetch("a")), flight.do("b", lambda: fetch("b")))
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_every_caller_gets_the_same_exception():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream is down")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("neon", fetch) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+
+    assert [str(error) for error in errors] == ["upstream is down"] * 3
+    assert len(calls) == 1
+
+
+def test_a_finished_call_is_not_reused():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def scenario():
+        return [await flight.do("neon", fetch), await flight.do("neon", fetch)]
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "Neon"
+
+    async def scenario():
+        leaving = asyncio.ensure_future(flight.do("neon", fetch))
+        staying = asyncio.ensure_future(flight.do("neon", fetch))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+
+        return await staying
+
+    assert asyncio.run(scenario()) == "Neon"
+
+
+def test_cancel_abandoned_cancels_once_every_caller_has_left():
+    flight = SingleFlight(cancel_abandoned=True)
+    started = []
+
+    async def fetch():
+        started.append(asyncio.current_task())
+        await asyncio.sleep(10)
+
+    async def scenario():
+        callers = [asyncio.ensure_future(flight.do("neon", fetch)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+
+        callers[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not started[0].cancelled()
+
+        callers[1].cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        return started[0]
+
+    assert asyncio.run(scenario()).cancelled()
+    assert len(flight) == 0
+
+
+def test_without_cancel_abandoned_the_call_runs_on():
+    flight = SingleFlight()
+    finished = []
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        finished.append(1)
+
+    async def scenario():
+        caller = asyncio.ensure_future(flight.do("neon", fetch))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.03)
+
+    asyncio.run(scenario())
+    assert finished == [1]
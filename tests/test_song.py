@@ -0,0 +1,118 @@
+import copy
+import json
+import random
+
+import pytest
+
+from conftest import ROOT
+from song import Song, select_json
+
+
+def reference_select(value, spec):
+    """What select_json returns, worked out from the fully decoded document."""
+    if spec is True:
+        return value
+
+    if isinstance(value, dict):
+        return {key: reference_select(value[key], sub) for key, sub in spec.items() if key in value}
+
+    if isinstance(value, list):
+        return {
+            key: reference_select(value[key], sub)
+            for key, sub in spec.items()
+            if isinstance(key, int) and key < len(value)
+        }
+
+    return {}
+
+
+STRINGS = ["", "a", 'quo"te', "back\\slash", "{[brackets]}", "comma, colon:", "ünïcödé", "\n\t", " "]
+KEYS = ["a", "b", "content", "{", '"', "data"]
+
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(6 if depth < 4 else 3)
+    if kind == 0:
+        return rng.choice(STRINGS)
+    if kind == 1:
+        return rng.choice([0, -1, 2.5, 1e20, True, False, None])
+    if kind == 2:
+        return rng.choice(STRINGS) + str(rng.random())
+    if kind in (3, 4):
+        return {rng.choice(KEYS): random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+    return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+
+
+def random_spec(rng, value, depth=0):
+    if depth > 3 or rng.random() < 0.3:
+        return True
+
+    if isinstance(value, dict):
+        keys = rng.sample(KEYS, rng.randint(1, 3))
+    elif isinstance(value, list):
+        keys = rng.sample(range(5), rng.randint(1, 3))
+    else:
+        keys = rng.sample(KEYS, 1)
+
+    spec = {}
+    for key in keys:
+        try:
+            child = value[key]
+        except (KeyError, IndexError, TypeError):
+            child = None
+        spec[key] = random_spec(rng, child, depth + 1)
+
+    return spec
+
+
+def test_select_json_matches_the_full_decode_on_random_documents():
+    rng = random.Random(0)
+
+    for _ in range(3000):
+        value = random_value(rng)
+        spec = random_spec(rng, value)
+        text = json.dumps(value, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 1]))
+
+        assert select_json(text, spec) == reference_select(value, spec), (text, spec)
+
+
+def test_select_json_reads_only_what_the_spec_names():
+    text = '{"skip": {"deep": [1, {"x": "}]"}]}, "keep": {"a": 1, "b": [10, 20, 30]}, "after": 1}'
+
+    assert select_json(text, {"keep": {"b": {1: True}}}) == {"keep": {"b": {1: 20}}}
+
+
+def test_select_json_stops_after_the_last_selected_field():
+    # Everything after "keep" is never looked at, malformed or not
+    assert select_json('{"keep": 1, "broken": ', {"keep": True}) == {"keep": 1}
+
+
+@pytest.fixture(scope="module")
+def store():
+    return json.loads((ROOT / "song.json").read_text())
+
+
+def test_song_from_json(store):
+    song = Song.from_json((ROOT / "song.json").read_text())
+    data = store["store"]["page"]["data"]
+
+    assert song.tab_id == data["tab"]["id"]
+    assert song.tab_url == data["tab"]["tab_url"]
+    assert song.song_name == "Neon"
+    assert song.artist_name == "John Mayer"
+    assert song.capo == data["tab_view"]["meta"].get("capo", 0)
+    assert song.content == data["tab_view"]["wiki_tab"]["content"]
+
+
+def test_song_from_store_matches_from_json(store):
+    expected = Song.from_json(json.dumps(store))
+    song = Song.from_store(store)
+
+    assert [getattr(song, name) for name in Song.__slots__] == [getattr(expected, name) for name in Song.__slots__]
+
+
+def test_song_without_content_is_none(store):
+    store = copy.deepcopy(store)
+    del store["store"]["page"]["data"]["tab_view"]["wiki_tab"]
+
+    assert Song.from_store(store) is None
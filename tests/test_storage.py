@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from storage import SQLiteBackend, Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = Storage(SQLiteBackend(str(tmp_path / "autochords.db")), pool_size=2)
+    yield storage
+    storage.close()
+
+
+def test_user_key_round_trip(storage):
+    async def scenario():
+        assert await storage.get_user_key("ann@example.com") is None
+
+        await storage.set_user_key("ann@example.com", "Am")
+        assert await storage.get_user_key("ann@example.com") == "Am"
+
+        await storage.set_user_key("ann@example.com", "F#")
+        assert await storage.get_user_key("ann@example.com") == "F#"
+
+    asyncio.run(scenario())
+
+
+def test_saved_songs_round_trip(storage):
+    url = "https://tabs.ultimate-guitar.com/tab/john-mayer/neon-chords-667823"
+
+    async def scenario():
+        await storage.set_user_key("ann@example.com", "Am")
+        assert await storage.get_saved_songs("ann@example.com") == []
+
+        await storage.save_song("Neon", url, "ann@example.com")
+        # Saving the same song again leaves a single row
+        await storage.save_song("Neon", url, "ann@example.com")
+
+        assert await storage.get_saved_songs("ann@example.com") == [("Neon", url, "ann@example.com")]
+        assert await storage.get_saved_songs("bob@example.com") == []
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_queries_share_the_pool(storage):
+    async def scenario():
+        emails = [f"user{i}@example.com" for i in range(20)]
+        await asyncio.gather(*(storage.set_user_key(email, "C") for email in emails))
+
+        return await asyncio.gather(*(storage.get_user_key(email) for email in emails))
+
+    assert asyncio.run(scenario()) == ["C"] * 20
@@ -0,0 +1,59 @@
+import asyncio
+
+import numpy as np
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from analysis import STREAM_CHUNK_SECONDS
+from key_finder import min_profile
+
+SAMPLE_RATE = 8000
+
+
+class ChromaEngine(object):
+    """Stands in for the process pool: every chunk has the chroma of A minor."""
+
+    async def submit(self, fn, *args, salvage=None):
+        return np.roll(min_profile, 9)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(main, "analysis_engine", ChromaEngine())
+
+
+def connect(client, email, sample_rate=SAMPLE_RATE):
+    return client.websocket_connect(f"/user_recording/stream?user_email={email}&sample_rate={sample_rate}")
+
+
+def test_streams_until_the_key_is_stable(client, engine):
+    chunk = np.zeros(int(STREAM_CHUNK_SECONDS * SAMPLE_RATE), dtype="<f4").tobytes()
+    updates = []
+
+    with connect(client, "stream@example.com") as websocket:
+        while not updates or not updates[-1]["done"]:
+            websocket.send_bytes(chunk)
+            updates.append(websocket.receive_json())
+
+    assert updates[-1]["key"] == "Am"
+    assert all(not update["done"] for update in updates[:-1])
+    assert asyncio.run(main.storage.get_user_key("stream@example.com")) == "Am"
+
+
+def test_a_partial_sample_closes_with_1007(client, engine):
+    with connect(client, "partial@example.com") as websocket:
+        websocket.send_bytes(b"\0" * 6)
+
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+
+    assert closed.value.code == 1007
+
+
+def test_unsupported_sample_rate_closes_with_1008(client, engine):
+    with connect(client, "rate@example.com", sample_rate=100) as websocket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+
+    assert closed.value.code == 1008
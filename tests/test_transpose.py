@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from transpose import (
+    Chord,
+    get_all_keys,
+    get_transponation_steps,
+    is_key,
+    key_list,
+    transpose_chord,
+    transpose_progressions,
+    transpose_to_keys,
+)
+
+CHORDS = ["Am", "G/B", "Cmaj7", "F#m7b5", "Bbsus4", "D/F#", "Ebdim", "Gaug", "C7sus4", "Dbm9", "E", "N.C.", "x"]
+ALL_KEYS = [name for names in key_list for name in names]
+
+
+def test_parse_splits_the_chord():
+    chord = Chord.parse("C#m7/G#")
+
+    assert (chord.root, chord.quality, chord.extensions, chord.suffix, chord.bass) == (1, "m", "7", "m7", 8)
+    assert Chord.parse("Cmaj7").quality == ""
+    assert Chord.parse("Csus4").quality == "sus"
+
+
+def test_parse_interns_chords():
+    assert Chord.parse("F#m7b5") is Chord.parse("F#m7b5")
+
+
+def test_parse_rejects_names_that_are_not_chords():
+    with pytest.raises(Exception):
+        Chord.parse("N.C.")
+
+
+@pytest.mark.parametrize(
+    "name, steps, accidental, expected",
+    [
+        ("Am", 3, "b", "Cm"),
+        ("Am", 1, "#", "A#m"),
+        ("Am", 1, "b", "Bbm"),
+        ("G/B", 5, "#", "C/E"),
+        ("F#m7b5", 2, "b", "Abm7b5"),
+        ("Bb", 14, "#", "C"),
+        ("Cmaj7", -1, "#", "Bmaj7"),
+    ],
+)
+def test_transpose(name, steps, accidental, expected):
+    assert Chord.parse(name).transpose(steps, accidental) == expected
+
+
+def test_transpose_chord_leaves_other_names_alone():
+    assert transpose_chord("N.C.", 2, "#") == "N.C."
+    assert transpose_chord("Am", 2, "#") == "Bm"
+
+
+def test_transposition_steps():
+    assert get_transponation_steps("Am", "C") == 3
+    assert get_transponation_steps("C", "Am") == 9
+    assert get_transponation_steps("F#m7", "Gb") == 0
+
+
+def test_get_all_keys_uses_the_preferred_spellings():
+    assert get_all_keys() == ["A", "Bb", "B", "C", "Db", "D", "Eb", "E", "F", "F#", "G", "Ab"]
+    assert get_all_keys(minor=True) == ["Am", "Bbm", "Bm", "Cm", "Dbm", "Dm", "Ebm", "Em", "Fm", "F#m", "Gm", "Abm"]
+
+
+def test_transpose_to_keys_matches_transposing_each_key():
+    rng = random.Random(0)
+
+    for _ in range(200):
+        chords = rng.sample(CHORDS, rng.randint(1, len(CHORDS)))
+        from_key = rng.choice([chord for chord in chords if chord[0] in "ABCDEFG"] or ["C"])
+        keys = rng.sample(ALL_KEYS, rng.randint(1, 6))
+
+        progressions = {"Verse": chords}
+        expected = [
+            dict(zip(chords, transpose_progressions(progressions, from_key, key)["Verse"])) for key in keys
+        ]
+
+        assert transpose_to_keys(chords, from_key, keys) == expected
+
+
+def test_transposing_into_the_same_key_keeps_the_spelling():
+    progressions = {"Verse": ["A#m", "Gb", "F#"]}
+
+    assert transpose_progressions(progressions, "A#m", "Bbm") == progressions
+    assert transpose_progressions(progressions, "A#m", "Bbm")["Verse"] is not progressions["Verse"]
+
+
+def test_is_key():
+    assert all(is_key(name) for name in ALL_KEYS)
+    assert not any(is_key(name) for name in ("Cx", "Chello", "H", "", "c", "Cmaj7"))
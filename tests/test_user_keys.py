@@ -0,0 +1,149 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from user_keys import InvalidationLog, UserKeyCache
+
+
+class CountingStorage(object):
+    def __init__(self):
+        self.keys = {}
+        self.reads = 0
+
+    async def get_user_key(self, email):
+        self.reads += 1
+        return self.keys.get(email)
+
+    async def set_user_key(self, email, key):
+        self.keys[email] = key
+
+
+def publish_from_another_process(path, *emails, max_bytes=1024 * 1024):
+    """Publishes emails the way another worker would, from its own pid."""
+    code = (
+        "import sys\n"
+        "from user_keys import InvalidationLog\n"
+        "log = InvalidationLog(sys.argv[1], max_bytes=int(sys.argv[2]))\n"
+        "for email in sys.argv[3:]:\n"
+        "    log.publish(email)\n"
+    )
+    subprocess.run([sys.executable, "-c", code, str(path), str(max_bytes), *emails], cwd=ROOT, check=True)
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / "user-keys.log"
+
+
+def test_reads_through_once():
+    storage = CountingStorage()
+    storage.keys["a@example.com"] = "G"
+    cache = UserKeyCache(storage)
+
+    async def scenario():
+        return [await cache.get("a@example.com"), await cache.get("a@example.com"), await cache.get("b@example.com")]
+
+    assert asyncio.run(scenario()) == ["G", "G", None]
+    assert storage.reads == 2
+
+
+def test_users_without_a_key_are_cached_too():
+    storage = CountingStorage()
+    cache = UserKeyCache(storage)
+
+    async def scenario():
+        await cache.get("a@example.com")
+        await cache.get("a@example.com")
+
+    asyncio.run(scenario())
+    assert storage.reads == 1
+
+
+def test_set_writes_through():
+    storage = CountingStorage()
+    cache = UserKeyCache(storage)
+
+    async def scenario():
+        await cache.get("a@example.com")
+        await cache.set("a@example.com", "D")
+        return await cache.get("a@example.com")
+
+    assert asyncio.run(scenario()) == "D"
+    assert storage.keys == {"a@example.com": "D"}
+
+
+def test_other_workers_invalidate_users(log_path):
+    storage = CountingStorage()
+    storage.keys["a@example.com"] = "G"
+    cache = UserKeyCache(storage, invalidation_log=InvalidationLog(log_path))
+
+    assert asyncio.run(cache.get("a@example.com")) == "G"
+
+    storage.keys["a@example.com"] = "E"
+    publish_from_another_process(log_path, "a@example.com")
+
+    assert asyncio.run(cache.get("a@example.com")) == "E"
+
+
+def test_a_workers_own_lines_are_skipped(log_path):
+    log = InvalidationLog(log_path)
+    log.publish("a@example.com")
+
+    assert log.poll() == []
+
+
+def test_poll_returns_other_workers_lines_once(log_path):
+    log = InvalidationLog(log_path)
+
+    publish_from_another_process(log_path, "a@example.com", "b@example.com")
+
+    assert log.poll() == ["a@example.com", "b@example.com"]
+    assert log.poll() == []
+
+
+def test_a_partial_line_waits_for_the_next_poll(log_path):
+    log = InvalidationLog(log_path)
+
+    with open(log_path, "ab") as f:
+        f.write(b"1\ta@example.com\n1\tb@exa")
+    assert log.poll() == ["a@example.com"]
+
+    with open(log_path, "ab") as f:
+        f.write(b"mple.com\n")
+    assert log.poll() == ["b@example.com"]
+
+
+def test_the_log_rotates_past_max_bytes(log_path):
+    log = InvalidationLog(log_path, max_bytes=100)
+
+    for i in range(10):
+        log.publish(f"user{i}@example.com")
+
+        assert log_path.stat().st_size <= 100
+
+
+def test_rotation_drops_the_whole_cache(log_path):
+    storage = CountingStorage()
+    storage.keys["a@example.com"] = "G"
+    cache = UserKeyCache(storage, invalidation_log=InvalidationLog(log_path))
+
+    asyncio.run(cache.get("a@example.com"))
+    storage.keys["a@example.com"] = "E"
+
+    # The lines naming a@example.com are gone with the old file
+    publish_from_another_process(log_path, *(f"user{i}@example.com" for i in range(10)), "a@example.com", max_bytes=100)
+
+    assert asyncio.run(cache.get("a@example.com")) == "E"
+
+
+def test_poll_after_rotation_starts_from_the_new_file(log_path):
+    log = InvalidationLog(log_path)
+
+    publish_from_another_process(log_path, *(f"user{i}@example.com" for i in range(10)), max_bytes=100)
+    assert log.poll() is None
+
+    publish_from_another_process(log_path, "a@example.com")
+    assert log.poll() == ["a@example.com"]
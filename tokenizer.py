@@ -0,0 +1,165 @@
+import re
+from bisect import bisect_left
+from collections import namedtuple
+from functools import lru_cache
+
+SECTION = "section"
+CHORD = "chord"
+BARE_CHORD = "bare_chord"
+TEXT = "text"
+
+# Markup that looks like a section header but is not one
+NOT_SECTIONS = ("[tab]", "[/tab]", "[ch]", "[/ch]")
+
+# A chord name never spans brackets or lines, so a stray [ch] cannot swallow a section header
+_CH_TAG = r"\[ch\](?P<chord>[^\[\]\n]*)\[/ch\]"
+# Chords outside [ch] tags, like Asus2 or C#min7
+_BARE = r"\b[CDEFGAB](?:#{1,2}|b{1,2})?(?:maj7?|min7?|sus2?)\b"
+
+# One scan finds [ch] chords, bracketed headers and bare chords, in that order of preference
+_token_regex = re.compile(
+    _CH_TAG + r"|(?<!\[ch\])(?P<bracket>\[[^\]]*\])|(?P<bare>" + _BARE + ")"
+)
+_bare_regex = re.compile(_BARE)
+
+# kind is one of SECTION, CHORD, BARE_CHORD or TEXT; start and end are offsets into the text.
+# value is the section name or chord name, or None for text.
+Token = namedtuple("Token", ["kind", "start", "end", "value"])
+
+
+def value_span(token):
+    """Offsets of the chord name itself, i.e. inside the [ch] tags for tagged chords."""
+    if token.kind == CHORD:
+        return token.start + 4, token.end - 5
+
+    return token.start, token.end
+
+
+def tokenize(text):
+    """Splits tab text into SECTION, CHORD, BARE_CHORD and TEXT tokens in one pass."""
+    tokens = []
+    text_start = 0
+
+    for match in _token_regex.finditer(text):
+        bracket = match.group("bracket")
+
+        if bracket in NOT_SECTIONS:
+            # [tab] markup and unclosed [ch] tags stay part of the surrounding text
+            continue
+
+        if match.start() > text_start:
+            tokens.append(Token(TEXT, text_start, match.start(), None))
+        text_start = match.end()
+
+        if bracket is not None:
+            tokens.append(Token(SECTION, match.start(), match.end(), bracket[1:-1]))
+            # Bare chords named in the header itself, e.g. [Intro Asus2]
+            tokens.extend(
+                Token(BARE_CHORD, bare.start(), bare.end(), bare.group())
+                for bare in _bare_regex.finditer(text, match.start() + 1, match.end() - 1)
+            )
+        elif match.group("bare") is not None:
+            tokens.append(Token(BARE_CHORD, match.start(), match.end(), match.group()))
+        else:
+            tokens.append(Token(CHORD, match.start(), match.end(), match.group("chord")))
+
+    if text_start < len(text):
+        tokens.append(Token(TEXT, text_start, len(text), None))
+
+    return tokens
+
+
+class Tab(object):
+    """A tokenized tab: the token stream plus the chord tokens that belong to each section."""
+
+    __slots__ = ("text", "tokens", "sections")
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.sections = self._sections()
+
+    def _sections(self):
+        """
+        Returns [(name, chord tokens)] in header order, bounding each section the way
+        extract_chords always has: from its header up to the first later header with
+        the next section's name, which is empty when a header is immediately repeated.
+        """
+        headers = [token for token in self.tokens if token.kind == SECTION]
+        starts = [token.start for token in self.tokens]
+        sections = []
+        current = 0
+
+        for i, header in enumerate(headers):
+            start = next(j for j in range(current, len(headers)) if headers[j].value == header.value)
+
+            if i < len(headers) - 1:
+                end = next(j for j in range(start, len(headers)) if headers[j].value == headers[i + 1].value)
+                end_offset = headers[end].start
+            else:
+                end = len(headers)
+                end_offset = len(self.text)
+
+            start_offset = headers[start].start
+            in_section = [
+                token
+                for token in self.tokens[bisect_left(starts, start_offset):bisect_left(starts, end_offset)]
+                if token.end <= end_offset
+            ]
+
+            chords = [token for token in in_section if token.kind == CHORD]
+            if len(chords) == 0:
+                chords = [token for token in in_section if token.kind == BARE_CHORD]
+
+            sections.append((header.value, chords))
+            current = end
+
+        return sections
+
+    def chords(self):
+        """Every CHORD and BARE_CHORD token in text order."""
+        return [token for token in self.tokens if token.kind in (CHORD, BARE_CHORD)]
+
+    def rewrite(self, replacements):
+        """
+        Returns the text with every chord token whose name is in replacements swapped
+        for its replacement, in one pass over the token offsets. Each occurrence is
+        rewritten exactly once and everything else is copied through untouched.
+        """
+        pieces = []
+        position = 0
+
+        for token in self.tokens:
+            if token.kind != CHORD and token.kind != BARE_CHORD:
+                continue
+
+            replacement = replacements.get(token.value)
+            if replacement is None:
+                continue
+
+            start, end = value_span(token)
+            pieces.append(self.text[position:start])
+            pieces.append(replacement)
+            position = end
+
+        if position == 0:
+            return self.text
+
+        pieces.append(self.text[position:])
+
+        return "".join(pieces)
+
+    def progressions(self):
+        """{section name: [chord names]}, the shape extract_chords returns."""
+        progressions = {}
+
+        for name, chords in self.sections:
+            progressions[name] = [token.value for token in chords]
+
+        return progressions
+
+
+@lru_cache(maxsize=256)
+def compile_tab(text):
+    """Returns the cached Tab for text."""
+    return Tab(text)
@@ -1,5 +1,7 @@
 import re
 
+import numpy as np
+
 key_list = [
     ("A",),
     ("A#", "Bb"),
@@ -67,86 +69,185 @@ sharp_flat_preferences = {
 
 key_regex = re.compile(r"[ABCDEFG][#b]?")
 
+# root, the verbatim suffix (quality and extensions), optional slash bass
+chord_regex = re.compile(r"([A-G][#b]?)(.*?)(?:/([A-G][#b]?))?")
+# maj and M are left in the extensions (maj7, M7), the triad itself is major
+quality_regex = re.compile(r"min|m(?!aj)|dim|aug|sus")
+
+# Pitch classes with C = 0
+pitch_classes = {
+    "B#": 0, "C": 0, "C#": 1, "Db": 1, "D": 2, "D#": 3, "Eb": 3, "E": 4, "Fb": 4,
+    "E#": 5, "F": 5, "F#": 6, "Gb": 6, "G": 7, "G#": 8, "Ab": 8, "A": 9, "A#": 10,
+    "Bb": 10, "B": 11, "Cb": 11,
+}
+note_names = {
+    "#": ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"),
+    "b": ("C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B"),
+}
+qualities = {"": "", "m": "m", "min": "m", "dim": "dim", "aug": "aug", "sus": "sus"}
+
+# Chords interned at import; tabs may add up to MAX_INTERNED more
+common_suffixes = ["", "m", "7", "m7", "maj7", "sus2", "sus4", "dim", "aug", "6", "9", "add9", "m6", "m9", "7sus4"]
+MAX_INTERNED = 4096
+
+accidental_index = {"#": 0, "b": 1}
+
+_key_index = {name: index for index, key_names in enumerate(key_list) for name in key_names}
+
+
+class Chord(object):
+    """
+    A parsed, interned chord name. transpositions[accidental][steps] holds the name of
+    this chord moved up by steps semitones, spelled with sharps ("#") or flats ("b").
+    """
+
+    __slots__ = ("name", "root", "quality", "extensions", "suffix", "bass", "transpositions")
+
+    _interned = {}
+
+    def __init__(self, name, root, quality, extensions, suffix, bass):
+        self.name = name
+        self.root = root
+        self.quality = quality
+        self.extensions = extensions
+        self.suffix = suffix
+        self.bass = bass
+        self.transpositions = {
+            accidental: tuple(self._spell(steps, names) for steps in range(12))
+            for accidental, names in note_names.items()
+        }
+
+    def __repr__(self):
+        return f"Chord({self.name!r})"
+
+    def _spell(self, steps, names):
+        name = names[(self.root + steps) % 12] + self.suffix
+        if self.bass is not None:
+            name += "/" + names[(self.bass + steps) % 12]
+        return name
+
+    @classmethod
+    def parse(cls, name):
+        chord = cls._interned.get(name)
+        if chord is not None:
+            return chord
+
+        match = chord_regex.fullmatch(name)
+        if match is None:
+            raise Exception("Invalid chord: %s" % name)
+
+        root, suffix, bass = match.groups()
+        quality = quality_regex.match(suffix)
+        quality = quality.group() if quality else ""
+
+        chord = cls(
+            name,
+            pitch_classes[root],
+            qualities[quality],
+            suffix[len(quality):],
+            suffix,
+            pitch_classes[bass] if bass else None,
+        )
+
+        if len(cls._interned) < MAX_INTERNED:
+            cls._interned[name] = chord
+
+        return chord
+
+    def transpose(self, steps, accidental="#"):
+        return self.transpositions[accidental][steps % 12]
 
-def get_index_from_key(source_key):
-    source_key = source_key.replace("M", "")
-    for key_names in key_list:
-        if source_key in key_names:
-            return key_list.index(key_names)
-    raise Exception("Invalid key: %s" % source_key)
 
+for _root in pitch_classes:
+    for _suffix in common_suffixes:
+        Chord.parse(_root + _suffix)
 
-def get_key_from_index(index, to_key):
-    key_names = key_list[index % len(key_list)]
-    if len(key_names) > 1:
-        sharp_or_flat = sharp_flat.index(sharp_flat_preferences[to_key])
-        return key_names[sharp_or_flat]
-    return key_names[0]
+
+def is_key(name):
+    """Whether name is one of the key names in key_list, e.g. "Bb" or "F#m"."""
+    return name in _key_index
+
+
+def get_accidental(to_key):
+    """Whether to spell chords in to_key with sharps or flats."""
+    return sharp_flat_preferences.get(to_key, "#")
 
 
 def get_transponation_steps(source_key, target_key):
     """Gets the number of half tones to transpose"""
-    print("source and target ", source_key, target_key)
     root_source = key_regex.match(source_key).group()
     root_target = key_regex.match(target_key).group()
 
-    source_index = get_index_from_key(root_source)
-    target_index = get_index_from_key(root_target)
-    return target_index - source_index
+    return (pitch_classes[root_target] - pitch_classes[root_source]) % 12
 
-def normalise_chords(progressions):
-    """
-    normalises chords to their most common form using regex
-    like Em7 to Em
-    Cadd9 to C
-    DSus4 to D
 
-    for 7th chords, add chords, sus chords, etc
-    """
+def transpose_chord(chord, steps, accidental):
+    """Transposes one chord name, leaving anything that is not a chord untouched."""
+    try:
+        return Chord.parse(chord).transpositions[accidental][steps]
+    except Exception:
+        return chord
 
-    final_sections = {}
-
-    # Define a list of regex patterns to search for and their replacements
-    patterns = [
-        (r'(?i)maj7', 'M'),  # major 7th chord e.g., CMaj7 to CM
-        (r'(?i)7', ''),  # 7th chord e.g., G7 to G
-        (r'(?i)add\d+', ''),  # add chords e.g., Cadd9 to C
-        (r'(?i)sus\d+', ''),  # sus chords e.g., DSus4 to D
-        (r'(?i)dim\d*', 'dim'),  # diminished chords e.g., Bdim7 to Bdim
-        (r'(?i)aug\d*', 'aug'),  # augmented chords e.g., Gaug9 to Gaug
-        (r'(?i)6', ''),  # 6th chords e.g., A6 to A
-        (r'(?i)9', ''),  # 9th chords e.g., E9 to E
-        (r'(?i)11', ''),  # 11th chords e.g., F11 to F
-        (r'(?i)13', ''),  # 13th chords e.g., G13 to G
-    ]
 
-    # if it is lke  D/F#, then remove the /F#
+def transpose_progressions(progressions, from_key, to_key):
+    """
+    Transposes every chord, keeping its quality, extensions and slash bass. Transposing
+    into the same key leaves the chords spelled as they were.
+    """
+    steps = get_transponation_steps(from_key, to_key)
+    accidental = get_accidental(to_key)
 
+    if steps == 0:
+        return {section: list(chords) for section, chords in progressions.items()}
+
+    transposed_progressions = {}
     for section, chords in progressions.items():
-        normalized_chords = []
+        transposed_progressions[section] = [
+            transpose_chord(chord, steps, accidental) for chord in chords
+        ]
+    return transposed_progressions
 
-        for chord in chords:
-            for pattern, replacement in patterns:
-                chord = re.sub(pattern, replacement, chord)
-                chord = chord.split("/")[0]
-            normalized_chords.append(chord)
 
-        final_sections[section] = normalized_chords
+def get_all_keys(minor=False):
+    """The twelve major (or minor) keys, each spelled the way sharp_flat_preferences prefers."""
+    key_names = key_list[12:] if minor else key_list[:12]
 
-    return final_sections
+    return [
+        names[sharp_flat.index(sharp_flat_preferences[names[0]])] if len(names) > 1 else names[0]
+        for names in key_names
+    ]
 
 
-def transpose_progressions(progressions, from_key, to_key):
-    chords = normalise_chords(progressions)
-    direction = get_transponation_steps(from_key, to_key)
-    transposed_progressions = {}
-    for section, chords in chords.items():
-        transposed_chords = [transpose(chord, direction, to_key) for chord in chords]
-        transposed_progressions[section] = transposed_chords
-    return transposed_progressions
+def transposition_table(chords):
+    """
+    Stacks the precomputed transpositions of chords into an (N, 2, 12) array of names,
+    indexed by chord, accidental and steps. Names that are not chords map to themselves.
+    """
+    table = np.empty((len(chords), 2, 12), dtype=object)
 
+    for i, name in enumerate(chords):
+        try:
+            transpositions = Chord.parse(name).transpositions
+            table[i, 0] = transpositions["#"]
+            table[i, 1] = transpositions["b"]
+        except Exception:
+            table[i] = name
+
+    return table
+
+
+def transpose_to_keys(chords, from_key, to_keys):
+    """
+    Transposes the chord vector into every key of to_keys with one gather over the
+    transposition table. Returns one {chord: transposed chord} dict per key. Keys the
+    chords are already in leave them spelled as they were, as transpose_progressions does.
+    """
+    chords = list(dict.fromkeys(chords))
+    steps = np.array([get_transponation_steps(from_key, to_key) for to_key in to_keys], dtype=int)
+    accidentals = np.array([accidental_index[get_accidental(to_key)] for to_key in to_keys], dtype=int)
 
-def transpose(source_chord, direction, to_key):
-    source_index = get_index_from_key(source_chord)
-    return get_key_from_index(source_index + direction, to_key)
+    # (N, K) names: chord n written in key k
+    transposed = transposition_table(chords)[:, accidentals, steps]
+    transposed[:, steps == 0] = np.array(chords, dtype=object)[:, None]
 
+    return [dict(zip(chords, column)) for column in transposed.T.tolist()]
@@ -0,0 +1,159 @@
+import os
+
+from cache import TieredCache
+
+
+class InvalidationLog(object):
+    """
+    Append-only file shared by the workers on one host. Every line names a user whose key
+    changed; each worker tails the file and drops those users from its own cache.
+
+    Once the file passes max_bytes, the worker whose line took it there swaps in an
+    empty one. Workers notice the new file and drop their whole cache, as they can't
+    know which lines they missed.
+    """
+
+    def __init__(self, path, max_bytes=1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._pid = str(os.getpid())
+
+        with open(self.path, "ab"):
+            pass
+
+        self._file = None
+        self._open()
+
+    def _open(self):
+        # Held open so the file's inode can't be reused by a later rotation, which would
+        # make a rotated log look like the one this worker was tailing
+        if self._file is not None:
+            self._file.close()
+
+        self._file = open(self.path, "rb")
+        stat = os.fstat(self._file.fileno())
+        self._inode = stat.st_ino
+        self._offset = stat.st_size
+
+    def publish(self, email):
+        line = f"{self._pid}\t{email}\n".encode()
+
+        # A single O_APPEND write keeps concurrent writers' lines whole
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+
+        if size > self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        # Replaced rather than truncated, so readers see a new inode even if the new
+        # file has grown past their offset by the time they look
+        tmp_path = f"{self.path}.{self._pid}.tmp"
+        with open(tmp_path, "wb"):
+            pass
+        os.replace(tmp_path, self.path)
+
+    def poll(self):
+        """
+        Returns the emails other processes invalidated since the last poll, or None when
+        the log was rotated or truncated and everything should be dropped. Costs one
+        stat() when idle.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return []
+
+        size = stat.st_size
+
+        if stat.st_ino != self._inode:
+            self._open()
+            return None
+
+        if size < self._offset:
+            self._offset = size
+            return None
+
+        if size == self._offset:
+            return []
+
+        self._file.seek(self._offset)
+        data = self._file.read(size - self._offset)
+
+        # Leave a partially written last line for the next poll
+        complete = data.rfind(b"\n") + 1
+        self._offset += complete
+
+        emails = []
+        for line in data[:complete].decode().splitlines():
+            pid, _, email = line.partition("\t")
+            if pid != self._pid:
+                emails.append(email)
+
+        return emails
+
+
+class UserKeyCache(object):
+    """
+    Read-through cache of user keys in front of Storage, bounded in entries and TTL.
+    set() writes through to storage and invalidates the user in the other workers.
+    """
+
+    def __init__(self, storage, max_entries=10000, ttl=300, invalidation_log=None):
+        self.storage = storage
+        self.invalidation_log = invalidation_log
+        # Values are 1-tuples so users without a key are cached too
+        self.cache = TieredCache(max_bytes=max_entries, ttl=ttl, sizeof=lambda value: 1)
+        self._generation = 0
+
+    def _invalidate(self, email):
+        self._generation += 1
+        self.cache.delete(email)
+
+    def _sync(self):
+        if self.invalidation_log is None:
+            return
+
+        emails = self.invalidation_log.poll()
+
+        if emails is None:
+            self._generation += 1
+            self.cache = TieredCache(
+                max_bytes=self.cache.max_bytes, ttl=self.cache.ttl, sizeof=self.cache.sizeof
+            )
+            return
+
+        for email in emails:
+            self._invalidate(email)
+
+    async def get(self, email):
+        self._sync()
+
+        value, state = self.cache.get(email)
+        if state is not None:
+            return value[0]
+
+        generation = self._generation
+        key = await self.storage.get_user_key(email)
+
+        # Don't cache a read that raced with an invalidation
+        if generation == self._generation:
+            self.cache.set(email, (key,))
+
+        return key
+
+    async def set(self, email, key):
+        await self.storage.set_user_key(email, key)
+
+        self._invalidate(email)
+        self.cache.set(email, (key,))
+
+        if self.invalidation_log is not None:
+            self.invalidation_log.publish(email)
+
+    def stats(self):
+        return self.cache.stats()